@@ -12,18 +12,28 @@ Ce fichier contient toutes les routes API pour :
 - Génération de PDF et exports
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, Response
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Response, File, UploadFile, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+import json
 import uuid
+from pymongo.errors import DuplicateKeyError
 from .server import (
-    db, require_role, RoleEnum, get_current_user,
+    db, require_role, RoleEnum, get_current_user, invalidate_principal,
     get_password_hash, verify_password,
     UserCreate, StudentCreate, TeacherCreate, UserResponse, StudentResponse, TeacherResponse,
     SubjectCreate, SubjectResponse, ClassCreate, ClassResponse,
-    GradeCreate, GradeUpdate, GradeResponse, EnrollmentCreate,
-    TranscriptResponse, TranscriptStatusEnum
+    GradeCreate, GradeUpdate, GradeResponse, EnrollmentCreate, EnrollmentResponse,
+    UserBulkDeleteRequest, TranscriptResponse, TranscriptStatusEnum
 )
+from .enrollments import class_student_ids
+from .user_deletion import enqueue_user_deletion
+from .user_import import ImportFileError, open_import_file, import_users
+from .pagination import PageParams, fetch_page, projection_for
+from .response_cache import response_cache
+from .services import to_response, create_student, create_teacher, get_user, list_users
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,52 +54,7 @@ async def register_student(
     Enregistrer un nouvel étudiant (équivalent à registerStudent)
     Accessible uniquement aux administrateurs
     """
-    # Vérifier l'unicité du nom d'utilisateur et email
-    if db.users.find_one({"username": student_request.username}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce nom d'utilisateur existe déjà"
-        )
-    
-    if db.users.find_one({"email": student_request.email}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cette adresse email existe déjà"
-        )
-    
-    if db.users.find_one({"student_id_num": student_request.student_id_num}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce numéro étudiant existe déjà"
-        )
-    
-    # Créer l'étudiant
-    student_id = str(uuid.uuid4())
-    student_data = {
-        "_id": student_id,
-        "username": student_request.username,
-        "password": get_password_hash(student_request.password),
-        "firstname": student_request.firstname,
-        "lastname": student_request.lastname,
-        "email": student_request.email,
-        "role": RoleEnum.STUDENT.value,
-        "student_id_num": student_request.student_id_num,
-        "created_at": datetime.utcnow()
-    }
-    
-    db.users.insert_one(student_data)
-    logger.info(f"Nouvel étudiant créé : {student_request.username}")
-    
-    return StudentResponse(
-        id=student_id,
-        username=student_request.username,
-        firstname=student_request.firstname,
-        lastname=student_request.lastname,
-        email=student_request.email,
-        role=RoleEnum.STUDENT,
-        student_id_num=student_request.student_id_num,
-        created_at=datetime.utcnow()
-    )
+    return await create_student(student_request)
 
 @router.post("/api/admin/users/teachers", response_model=TeacherResponse)
 async def register_teacher(
@@ -100,52 +65,44 @@ async def register_teacher(
     Enregistrer un nouvel enseignant (équivalent à registerTeacher)
     Accessible uniquement aux administrateurs
     """
-    # Vérifier l'unicité
-    if db.users.find_one({"username": teacher_request.username}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce nom d'utilisateur existe déjà"
-        )
+    return await create_teacher(teacher_request)
+
+@router.post("/api/admin/users/import")
+async def import_users_file(
+    file: UploadFile = File(...),
+    role: RoleEnum = Query(RoleEnum.STUDENT),
+    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
+):
+    """
+    Importer des étudiants ou des enseignants depuis un fichier CSV ou XLSX
+    Accessible uniquement aux administrateurs
     
-    if db.users.find_one({"email": teacher_request.email}):
+    Colonnes (première ligne) : username, firstname, lastname, email,
+    password et student_id_num (ou teacher_id_num avec role=TEACHER).
+    La réponse est diffusée en NDJSON au fil de l'import : une ligne par
+    ligne du fichier (created ou error avec le détail), puis un résumé.
+    Voir user_import.py.
+    """
+    if role not in (RoleEnum.STUDENT, RoleEnum.TEACHER):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cette adresse email existe déjà"
+            detail="Seuls les étudiants et les enseignants peuvent être importés"
         )
-    
-    if db.users.find_one({"teacher_id_num": teacher_request.teacher_id_num}):
+    try:
+        records, close = await run_in_threadpool(open_import_file, file.file, file.filename, role)
+    except ImportFileError as exc:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce numéro enseignant existe déjà"
+            detail=str(exc)
         )
     
-    # Créer l'enseignant
-    teacher_id = str(uuid.uuid4())
-    teacher_data = {
-        "_id": teacher_id,
-        "username": teacher_request.username,
-        "password": get_password_hash(teacher_request.password),
-        "firstname": teacher_request.firstname,
-        "lastname": teacher_request.lastname,
-        "email": teacher_request.email,
-        "role": RoleEnum.TEACHER.value,
-        "teacher_id_num": teacher_request.teacher_id_num,
-        "created_at": datetime.utcnow()
-    }
+    logger.info(f"Import de comptes {role.value} : {file.filename}")
     
-    db.users.insert_one(teacher_data)
-    logger.info(f"Nouvel enseignant créé : {teacher_request.username}")
+    async def stream_results():
+        async for result in import_users(records, close, role):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
     
-    return TeacherResponse(
-        id=teacher_id,
-        username=teacher_request.username,
-        firstname=teacher_request.firstname,
-        lastname=teacher_request.lastname,
-        email=teacher_request.email,
-        role=RoleEnum.TEACHER,
-        teacher_id_num=teacher_request.teacher_id_num,
-        created_at=datetime.utcnow()
-    )
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 @router.get("/api/admin/users/{user_id}", response_model=UserResponse)
 async def find_user_by_id(
@@ -156,22 +113,7 @@ async def find_user_by_id(
     Rechercher un utilisateur par ID (équivalent à findById)
     Accessible uniquement aux administrateurs
     """
-    user = db.users.find_one({"_id": user_id})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Utilisateur non trouvé"
-        )
-    
-    return UserResponse(
-        id=str(user["_id"]),
-        username=user["username"],
-        firstname=user["firstname"],
-        lastname=user["lastname"],
-        email=user["email"],
-        role=user["role"],
-        created_at=user["created_at"]
-    )
+    return await get_user({"_id": user_id})
 
 @router.get("/api/admin/users/username/{username}", response_model=UserResponse)
 async def find_user_by_username(
@@ -181,44 +123,22 @@ async def find_user_by_username(
     """
     Rechercher un utilisateur par nom d'utilisateur (équivalent à findByUsername)
     """
-    user = db.users.find_one({"username": username})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Utilisateur non trouvé"
-        )
-    
-    return UserResponse(
-        id=str(user["_id"]),
-        username=user["username"],
-        firstname=user["firstname"],
-        lastname=user["lastname"],
-        email=user["email"],
-        role=user["role"],
-        created_at=user["created_at"]
-    )
+    return await get_user({"username": username})
 
 @router.get("/api/admin/users", response_model=List[UserResponse])
 async def get_all_users(
+    response: Response,
+    role: Optional[RoleEnum] = None,
+    page: PageParams = Depends(),
     current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
 ):
     """
     Obtenir tous les utilisateurs (équivalent à getAllUsers)
     Accessible uniquement aux administrateurs
+    
+    Résultat paginé (limit / after, voir pagination.py), filtrable par rôle
     """
-    users = list(db.users.find({}))
-    return [
-        UserResponse(
-            id=str(user["_id"]),
-            username=user["username"],
-            firstname=user["firstname"],
-            lastname=user["lastname"],
-            email=user["email"],
-            role=user["role"],
-            created_at=user["created_at"]
-        )
-        for user in users
-    ]
+    return await list_users(role, page, response)
 
 @router.delete("/api/admin/users/delete/{user_id}")
 async def delete_user(
@@ -228,19 +148,96 @@ async def delete_user(
     """
     Supprimer un utilisateur (équivalent à deleteUserById)
     Accessible uniquement aux administrateurs
+    
+    Le compte est supprimé immédiatement ; ses notes, inscriptions,
+    relevés et moyennes le sont en tâche de fond (user_deletion.py),
+    avancement sur /api/admin/deletions/{deletion_id}
     """
-    result = db.users.delete_one({"_id": user_id})
+    result = await db.users.delete_one({"_id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Utilisateur non trouvé"
         )
+    invalidate_principal(user_id=user_id)
     
-    # Supprimer aussi les notes associées si c'est un étudiant
-    db.grades.delete_many({"student_id": user_id})
+    deletion = await enqueue_user_deletion([user_id], {"user_id": user_id}, str(current_user["_id"]))
     
     logger.info(f"Utilisateur supprimé : {user_id}")
-    return {"message": "Utilisateur supprimé avec succès"}
+    return {"message": "Utilisateur supprimé avec succès", "deletion_id": deletion["_id"]}
+
+@router.post("/api/admin/users/bulk-delete", status_code=status.HTTP_202_ACCEPTED)
+async def delete_users_bulk(
+    delete_request: UserBulkDeleteRequest,
+    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
+):
+    """
+    Supprimer un ensemble d'utilisateurs (ex. une promotion diplômée)
+    Accessible uniquement aux administrateurs
+    
+    Cible : une liste d'utilisateurs, les étudiants inscrits dans une classe
+    ou ceux inscrits dans les classes d'une année universitaire. Les comptes
+    administrateurs ne sont jamais supprimés. Les comptes et leurs données
+    sont supprimés en tâche de fond, par lots.
+    """
+    if delete_request.user_ids:
+        user_ids = delete_request.user_ids
+    elif delete_request.class_id:
+        if not await db.classes.find_one({"_id": delete_request.class_id}, {"_id": 1}):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Classe non trouvée"
+            )
+        user_ids = await class_student_ids([delete_request.class_id])
+    elif delete_request.academic_year:
+        class_ids = await db.classes.distinct("_id", {"academic_year": delete_request.academic_year})
+        user_ids = await class_student_ids(class_ids)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indiquer des utilisateurs, une classe ou une année universitaire"
+        )
+    
+    user_ids = await db.users.distinct(
+        "_id", {"_id": {"$in": user_ids}, "role": {"$ne": RoleEnum.ADMIN.value}}
+    )
+    if not user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Aucun utilisateur à supprimer"
+        )
+    
+    deletion = await enqueue_user_deletion(
+        user_ids,
+        delete_request.model_dump(exclude={"user_ids"}),
+        str(current_user["_id"])
+    )
+    
+    logger.info(f"Suppression groupée demandée : {len(user_ids)} utilisateurs ({deletion['_id']})")
+    return {"deletion_id": deletion["_id"], "status": deletion["status"], "total_users": len(user_ids)}
+
+@router.get("/api/admin/deletions/{deletion_id}")
+async def get_deletion_status(
+    deletion_id: str,
+    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
+):
+    """Suivre l'avancement d'une suppression en cascade"""
+    deletion = await db.user_deletions.find_one({"_id": deletion_id}, {"user_ids": 0})
+    if not deletion:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Suppression non trouvée"
+        )
+    
+    return {
+        "deletion_id": deletion["_id"],
+        "status": deletion["status"],
+        "step": deletion["step"],
+        "deleted": deletion["deleted"],
+        "created_at": deletion["created_at"],
+        "completed_at": deletion.get("completed_at"),
+        "error": deletion.get("error")
+    }
 
 # ===========================
 # ROUTES GESTION MATIÈRES
@@ -255,13 +252,6 @@ async def create_subject(
     Créer une nouvelle matière
     Accessible uniquement aux administrateurs
     """
-    # Vérifier l'unicité du code matière
-    if db.subjects.find_one({"subject_code": subject_request.subject_code}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce code de matière existe déjà"
-        )
-    
     subject_id = str(uuid.uuid4())
     subject_data = {
         "_id": subject_id,
@@ -272,58 +262,57 @@ async def create_subject(
         "created_at": datetime.utcnow()
     }
     
-    db.subjects.insert_one(subject_data)
+    # L'unicité du code matière est garantie par l'index subject_code_unique
+    try:
+        await db.subjects.insert_one(subject_data)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ce code de matière existe déjà"
+        )
+    await response_cache.invalidate("subjects")
+    
     logger.info(f"Nouvelle matière créée : {subject_request.name}")
     
-    return SubjectResponse(
-        id=subject_id,
-        subject_code=subject_request.subject_code,
-        name=subject_request.name,
-        coefficient=subject_request.coefficient,
-        description=subject_request.description,
-        created_at=datetime.utcnow()
-    )
+    return to_response(SubjectResponse, subject_data)
 
 @router.get("/api/subjects", response_model=List[SubjectResponse])
-async def get_all_subjects(current_user: dict = Depends(get_current_user)):
+async def get_all_subjects(
+    request: Request,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
     """
     Obtenir toutes les matières
     Accessible à tous les utilisateurs connectés
+    Résultat paginé (limit / after), mis en cache (ETag)
     """
-    subjects = list(db.subjects.find({}))
-    return [
-        SubjectResponse(
-            id=str(subject["_id"]),
-            subject_code=subject["subject_code"],
-            name=subject["name"],
-            coefficient=subject["coefficient"],
-            description=subject.get("description"),
-            created_at=subject["created_at"]
-        )
-        for subject in subjects
-    ]
+    async def load_subjects(response: Response):
+        subjects = await fetch_page(db.subjects, {}, projection_for(SubjectResponse), page, response)
+        return [to_response(SubjectResponse, subject) for subject in subjects]
+    
+    return await response_cache.respond(
+        request, "subjects", f"list:{page.limit}:{page.after or ''}", load_subjects
+    )
 
 @router.get("/api/subjects/{subject_id}", response_model=SubjectResponse)
 async def get_subject_by_id(
     subject_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Obtenir une matière par ID"""
-    subject = db.subjects.find_one({"_id": subject_id})
-    if not subject:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Matière non trouvée"
-        )
+    """Obtenir une matière par ID (mis en cache, ETag)"""
+    async def load_subject(response: Response):
+        subject = await db.subjects.find_one({"_id": subject_id})
+        if not subject:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Matière non trouvée"
+            )
+        
+        return to_response(SubjectResponse, subject)
     
-    return SubjectResponse(
-        id=str(subject["_id"]),
-        subject_code=subject["subject_code"],
-        name=subject["name"],
-        coefficient=subject["coefficient"],
-        description=subject.get("description"),
-        created_at=subject["created_at"]
-    )
+    return await response_cache.respond(request, "subjects", f"item:{subject_id}", load_subject)
 
 # ===========================
 # ROUTES GESTION CLASSES
@@ -346,31 +335,153 @@ async def create_class(
         "created_at": datetime.utcnow()
     }
     
-    db.classes.insert_one(class_data)
+    await db.classes.insert_one(class_data)
+    await response_cache.invalidate("classes")
     logger.info(f"Nouvelle classe créée : {class_request.name}")
     
-    return ClassResponse(
-        id=class_id,
-        name=class_request.name,
-        academic_year=class_request.academic_year,
-        created_at=datetime.utcnow()
-    )
+    return to_response(ClassResponse, class_data)
 
 @router.get("/api/classes", response_model=List[ClassResponse])
-async def get_all_classes(current_user: dict = Depends(get_current_user)):
+async def get_all_classes(
+    request: Request,
+    academic_year: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
     """
     Obtenir toutes les classes
     Accessible à tous les utilisateurs connectés
+    Résultat paginé (limit / after), filtrable par année universitaire,
+    mis en cache (ETag)
+    """
+    query = {"academic_year": academic_year} if academic_year else {}
+    
+    async def load_classes(response: Response):
+        classes = await fetch_page(db.classes, query, projection_for(ClassResponse), page, response)
+        return [to_response(ClassResponse, class_) for class_ in classes]
+    
+    return await response_cache.respond(
+        request, "classes", f"list:{academic_year or ''}:{page.limit}:{page.after or ''}", load_classes
+    )
+
+# ===========================
+# ROUTES GESTION INSCRIPTIONS
+# ===========================
+
+@router.post("/api/enrollments", response_model=EnrollmentResponse)
+async def create_enrollment(
+    enrollment_request: EnrollmentCreate,
+    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
+):
+    """
+    Inscrire un étudiant à une matière, dans une classe, pour un semestre
+    Accessible uniquement aux administrateurs
     """
-    classes = list(db.classes.find({}))
-    return [
-        ClassResponse(
-            id=str(class_["_id"]),
-            name=class_["name"],
-            academic_year=class_["academic_year"],
-            created_at=class_["created_at"]
+    student = await db.users.find_one(
+        {"_id": enrollment_request.student_id, "role": "STUDENT"}, {"_id": 1}
+    )
+    if not student:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Étudiant non trouvé"
         )
-        for class_ in classes
-    ]
+    if not await db.subjects.find_one({"_id": enrollment_request.subject_id}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Matière non trouvée"
+        )
+    if not await db.classes.find_one({"_id": enrollment_request.class_id}, {"_id": 1}):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Classe non trouvée"
+        )
+    
+    enrollment_data = {
+        "_id": str(uuid.uuid4()),
+        "student_id": enrollment_request.student_id,
+        "subject_id": enrollment_request.subject_id,
+        "class_id": enrollment_request.class_id,
+        "semester": enrollment_request.semester,
+        "enrollment_date": datetime.utcnow()
+    }
+    
+    # Unicité (étudiant, matière, semestre) garantie par l'index student_subject_semester_unique
+    try:
+        await db.enrollments.insert_one(enrollment_data)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="L'étudiant est déjà inscrit à cette matière pour ce semestre"
+        )
+    
+    logger.info(
+        f"Inscription : étudiant {enrollment_request.student_id}, matière "
+        f"{enrollment_request.subject_id}, semestre {enrollment_request.semester}"
+    )
+    return to_response(EnrollmentResponse, enrollment_data)
+
+@router.get("/api/enrollments/student/{student_id}", response_model=List[EnrollmentResponse])
+async def get_student_enrollments(
+    student_id: str,
+    response: Response,
+    semester: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Obtenir les inscriptions d'un étudiant (éventuellement pour un semestre)
+    Accessible à l'étudiant lui-même, aux enseignants et à l'admin
+    Résultat paginé (limit / after)
+    """
+    if current_user["role"] == "STUDENT" and str(current_user["_id"]) != student_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès non autorisé à ces inscriptions"
+        )
+    
+    query: Dict[str, Any] = {"student_id": student_id}
+    if semester:
+        query["semester"] = semester
+    enrollments = await fetch_page(db.enrollments, query, projection_for(EnrollmentResponse), page, response)
+    return [to_response(EnrollmentResponse, enrollment) for enrollment in enrollments]
+
+@router.get("/api/classes/{class_id}/enrollments", response_model=List[EnrollmentResponse])
+async def get_class_enrollments(
+    class_id: str,
+    response: Response,
+    semester: Optional[str] = None,
+    page: PageParams = Depends(),
+    current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
+):
+    """
+    Obtenir les inscriptions d'une classe (éventuellement pour un semestre)
+    Accessible aux enseignants et à l'admin
+    Résultat paginé (limit / after)
+    """
+    query: Dict[str, Any] = {"class_id": class_id}
+    if semester:
+        query["semester"] = semester
+    enrollments = await fetch_page(db.enrollments, query, projection_for(EnrollmentResponse), page, response)
+    return [to_response(EnrollmentResponse, enrollment) for enrollment in enrollments]
+
+@router.delete("/api/enrollments/{enrollment_id}")
+async def delete_enrollment(
+    enrollment_id: str,
+    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
+):
+    """
+    Supprimer une inscription
+    Accessible uniquement aux administrateurs ; les notes déjà saisies
+    conservent leur semestre
+    """
+    result = await db.enrollments.delete_one({"_id": enrollment_id})
+    if result.deleted_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Inscription non trouvée"
+        )
+    
+    logger.info(f"Inscription supprimée : {enrollment_id}")
+    return {"message": "Inscription supprimée avec succès"}
 
 # Ce fichier sera continué dans api_routes_part2.py pour éviter la limite de tokens
\ No newline at end of file
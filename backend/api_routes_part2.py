@@ -5,29 +5,51 @@ Routes API complètes - Partie 2
 Gestion des notes, calculs de moyennes, génération PDF
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, Response
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Response, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
-import statistics
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 import io
+import os
+import csv
 import base64
+import tempfile
+import logging
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import get_column_letter
 
 # Import depuis le fichier principal
 from .server import (
     db, require_role, RoleEnum, get_current_user,
-    GradeCreate, GradeUpdate, GradeResponse, EnrollmentCreate,
-    TranscriptResponse, TranscriptStatusEnum
+    GradeCreate, GradeUpdate, GradeResponse, GradeBulkCreate,
+    TranscriptStatusEnum, TranscriptBulkRequest
+)
+from .transcript_jobs import get_or_render_transcript, enqueue_transcript, enqueue_transcript_batch
+from .enrollments import enrollment_semesters, class_student_ids
+from .transcript_cache import invalidate_student_transcripts
+from .pagination import PageParams, fetch_page
+from .file_responses import ranged_file_response
+from .metrics import RENDER_DURATION
+from .grade_statistics import subject_statistics, cohort_statistics
+from .services import GRADE_PROJECTION, hydrate_grades, grade_list
+from .grade_events import (
+    EVENT_CREATED, EVENT_UPDATED, EVENT_DELETED, publish_grade_events,
+    stream_grade_events
+)
+from .student_averages import (
+    record_grade_added, record_grades_added, record_grade_changed, record_grade_removed,
+    get_average_report
 )
 
+logger = logging.getLogger(__name__)
+
 # Routeur pour les routes de notes
 grades_router = APIRouter()
 
@@ -45,7 +67,7 @@ async def create_grade(
     Équivalent au contrôleur de création de notes Spring Boot
     """
     # Vérifier que l'étudiant existe
-    student = db.users.find_one({"_id": grade_request.student_id, "role": "STUDENT"})
+    student = await db.users.find_one({"_id": grade_request.student_id, "role": "STUDENT"})
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,13 +75,19 @@ async def create_grade(
         )
     
     # Vérifier que la matière existe
-    subject = db.subjects.find_one({"_id": grade_request.subject_id})
+    subject = await db.subjects.find_one({"_id": grade_request.subject_id})
     if not subject:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Matière non trouvée"
         )
     
+    # Semestre de la note : explicite, sinon celui de l'inscription
+    semester = grade_request.semester
+    if semester is None:
+        pair = (grade_request.student_id, grade_request.subject_id)
+        semester = (await enrollment_semesters([pair])).get(pair)
+    
     # Créer la note
     grade_id = str(uuid.uuid4())
     grade_data = {
@@ -69,39 +97,124 @@ async def create_grade(
         "value": grade_request.value,
         "comment": grade_request.comment,
         "recorded_by_teacher_id": grade_request.recorded_by_teacher_id or str(current_user["_id"]),
+        "semester": semester,
         "date": datetime.utcnow()
     }
     
-    db.grades.insert_one(grade_data)
-    
-    # Préparer la réponse
-    teacher_name = ""
-    if grade_data["recorded_by_teacher_id"]:
-        teacher = db.users.find_one({"_id": grade_data["recorded_by_teacher_id"]})
-        if teacher:
-            teacher_name = f"{teacher['firstname']} {teacher['lastname']}"
-    
-    return GradeResponse(
-        id=grade_id,
-        value=grade_request.value,
-        date=datetime.utcnow(),
-        comment=grade_request.comment,
-        student_id=grade_request.student_id,
-        student_name=f"{student['firstname']} {student['lastname']}",
-        subject_id=grade_request.subject_id,
-        subject_name=subject["name"],
-        subject_coefficient=subject["coefficient"],
-        recorded_by=teacher_name
+    await db.grades.insert_one(grade_data)
+    await record_grade_added(grade_data, subject)
+    await invalidate_student_transcripts(grade_data["student_id"])
+    publish_grade_events(EVENT_CREATED, [grade_data])
+    
+    return (await hydrate_grades([grade_data]))[0]
+
+@grades_router.post("/api/grades/bulk")
+async def create_grades_bulk(
+    bulk_request: GradeBulkCreate,
+    current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
+):
+    """
+    Saisir un lot de notes en une seule requête
+    
+    Les étudiants et matières sont vérifiés par deux requêtes $in, les notes
+    valides sont écrites par un seul insert_many. Le résultat indique pour
+    chaque ligne (index dans la liste envoyée) la note créée ou l'erreur.
+    Avec ordered=true, le traitement s'arrête à la première ligne en erreur.
+    """
+    rows = bulk_request.grades
+    student_ids = await db.users.distinct(
+        "_id", {"_id": {"$in": list({row.student_id for row in rows})}, "role": "STUDENT"}
+    )
+    students = set(student_ids)
+    subjects = {
+        subject["_id"]: subject
+        async for subject in db.subjects.find(
+            {"_id": {"$in": list({row.subject_id for row in rows})}}, {"name": 1, "coefficient": 1}
+        )
+    }
+    
+    # Semestres d'inscription des lignes sans semestre explicite (une requête)
+    semesters = await enrollment_semesters(
+        (row.student_id, row.subject_id) for row in rows if row.semester is None
     )
+    
+    results: List[Dict[str, Any]] = [None] * len(rows)
+    to_insert = []  # (index de la ligne, document)
+    now = datetime.utcnow()
+    for index, row in enumerate(rows):
+        error = None
+        if row.student_id not in students:
+            error = "Étudiant non trouvé"
+        elif row.subject_id not in subjects:
+            error = "Matière non trouvée"
+        
+        if error:
+            results[index] = {"index": index, "status": "error", "detail": error}
+            if bulk_request.ordered:
+                break
+            continue
+        
+        to_insert.append((index, {
+            "_id": str(uuid.uuid4()),
+            "student_id": row.student_id,
+            "subject_id": row.subject_id,
+            "value": row.value,
+            "comment": row.comment,
+            "recorded_by_teacher_id": row.recorded_by_teacher_id or str(current_user["_id"]),
+            "semester": row.semester or semesters.get((row.student_id, row.subject_id)),
+            "date": now
+        }))
+    
+    # Écriture groupée ; les erreurs d'écriture sont rapportées par ligne
+    failed_positions = {}
+    if to_insert:
+        try:
+            await db.grades.insert_many(
+                [document for _, document in to_insert], ordered=bulk_request.ordered
+            )
+        except BulkWriteError as exc:
+            for write_error in exc.details.get("writeErrors", []):
+                failed_positions[write_error["index"]] = write_error.get("errmsg", "Erreur d'écriture")
+            if bulk_request.ordered and failed_positions:
+                # Les lignes suivant la première erreur ne sont pas écrites
+                first_failure = min(failed_positions)
+                for position in range(first_failure + 1, len(to_insert)):
+                    failed_positions.setdefault(position, "Non traitée (arrêt sur erreur)")
+    
+    inserted = []
+    for position, (index, document) in enumerate(to_insert):
+        if position in failed_positions:
+            results[index] = {"index": index, "status": "error", "detail": failed_positions[position]}
+        else:
+            inserted.append(document)
+            results[index] = {"index": index, "status": "created", "grade_id": document["_id"]}
+    
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = {"index": index, "status": "skipped", "detail": "Non traitée (arrêt sur erreur)"}
+    
+    await record_grades_added(inserted, subjects)
+    await invalidate_student_transcripts(*(grade["student_id"] for grade in inserted))
+    publish_grade_events(EVENT_CREATED, inserted)
+    logger.info(f"Saisie groupée : {len(inserted)} notes créées sur {len(rows)}")
+    
+    return {
+        "inserted": len(inserted),
+        "failed": len(rows) - len(inserted),
+        "results": results
+    }
 
 @grades_router.get("/api/grades/student/{student_id}", response_model=List[GradeResponse])
 async def get_student_grades(
     student_id: str,
+    response: Response,
+    page: PageParams = Depends(),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Obtenir toutes les notes d'un étudiant
     Accessible à l'étudiant lui-même, ses enseignants ou l'admin
+    Résultat paginé (limit / after)
     """
     # Vérification des permissions
     if (current_user["role"] == "STUDENT" and str(current_user["_id"]) != student_id and 
@@ -111,81 +224,67 @@ async def get_student_grades(
             detail="Accès non autorisé à ces notes"
         )
     
-    # Récupérer toutes les notes de l'étudiant
-    grades = list(db.grades.find({"student_id": student_id}))
-    student = db.users.find_one({"_id": student_id})
-    
+    student = await db.users.find_one({"_id": student_id}, {"_id": 1})
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Étudiant non trouvé"
         )
     
-    result = []
-    for grade in grades:
-        subject = db.subjects.find_one({"_id": grade["subject_id"]})
-        teacher_name = ""
-        if grade.get("recorded_by_teacher_id"):
-            teacher = db.users.find_one({"_id": grade["recorded_by_teacher_id"]})
-            if teacher:
-                teacher_name = f"{teacher['firstname']} {teacher['lastname']}"
-        
-        result.append(GradeResponse(
-            id=str(grade["_id"]),
-            value=grade["value"],
-            date=grade["date"],
-            comment=grade.get("comment"),
-            student_id=student_id,
-            student_name=f"{student['firstname']} {student['lastname']}",
-            subject_id=grade["subject_id"],
-            subject_name=subject["name"] if subject else "Matière inconnue",
-            subject_coefficient=subject["coefficient"] if subject else 1.0,
-            recorded_by=teacher_name
-        ))
-    
-    return result
+    # Récupérer les notes de l'étudiant
+    grades = await fetch_page(db.grades, {"student_id": student_id}, GRADE_PROJECTION, page, response)
+    return await grade_list(grades, response)
 
 @grades_router.get("/api/grades/subject/{subject_id}", response_model=List[GradeResponse])
 async def get_subject_grades(
     subject_id: str,
+    response: Response,
+    page: PageParams = Depends(),
     current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
 ):
     """
     Obtenir toutes les notes d'une matière
     Accessible aux enseignants et administrateurs
+    Résultat paginé (limit / after)
     """
-    grades = list(db.grades.find({"subject_id": subject_id}))
-    subject = db.subjects.find_one({"_id": subject_id})
-    
+    subject = await db.subjects.find_one({"_id": subject_id}, {"_id": 1})
     if not subject:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Matière non trouvée"
         )
     
-    result = []
-    for grade in grades:
-        student = db.users.find_one({"_id": grade["student_id"]})
-        teacher_name = ""
-        if grade.get("recorded_by_teacher_id"):
-            teacher = db.users.find_one({"_id": grade["recorded_by_teacher_id"]})
-            if teacher:
-                teacher_name = f"{teacher['firstname']} {teacher['lastname']}"
-        
-        result.append(GradeResponse(
-            id=str(grade["_id"]),
-            value=grade["value"],
-            date=grade["date"],
-            comment=grade.get("comment"),
-            student_id=grade["student_id"],
-            student_name=f"{student['firstname']} {student['lastname']}" if student else "Étudiant inconnu",
-            subject_id=subject_id,
-            subject_name=subject["name"],
-            subject_coefficient=subject["coefficient"],
-            recorded_by=teacher_name
-        ))
-    
-    return result
+    grades = await fetch_page(db.grades, {"subject_id": subject_id}, GRADE_PROJECTION, page, response)
+    return await grade_list(grades, response)
+
+@grades_router.get("/api/grades/events")
+async def grade_events(
+    student_id: Optional[str] = None,
+    subject_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Flux des changements de notes (Server-Sent Events)
+    
+    Un événement "grade" par note créée, modifiée ou supprimée (delta :
+    type, grade_id, student_id, subject_id, semester, value) ; un événement
+    "resync" si des changements ont été perdus (recharger les données).
+    Un étudiant ne reçoit que ses propres notes ; enseignants et
+    administrateurs peuvent filtrer par étudiant et par matière.
+    """
+    if current_user["role"] == "STUDENT":
+        if student_id is not None and student_id != str(current_user["_id"]):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Accès non autorisé à ces notes"
+            )
+        student_id = str(current_user["_id"])
+    
+    return StreamingResponse(
+        stream_grade_events(student_id, subject_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @grades_router.put("/api/grades/{grade_id}", response_model=GradeResponse)
 async def update_grade(
@@ -197,13 +296,6 @@ async def update_grade(
     Modifier une note existante
     Accessible aux enseignants et administrateurs
     """
-    grade = db.grades.find_one({"_id": grade_id})
-    if not grade:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Note non trouvée"
-        )
-    
     # Préparer les modifications
     update_data = {}
     if grade_update.value is not None:
@@ -214,32 +306,26 @@ async def update_grade(
     update_data["modified_at"] = datetime.utcnow()
     update_data["modified_by"] = str(current_user["_id"])
     
-    # Effectuer la mise à jour
-    db.grades.update_one({"_id": grade_id}, {"$set": update_data})
-    
-    # Récupérer la note mise à jour pour la réponse
-    updated_grade = db.grades.find_one({"_id": grade_id})
-    student = db.users.find_one({"_id": updated_grade["student_id"]})
-    subject = db.subjects.find_one({"_id": updated_grade["subject_id"]})
-    
-    teacher_name = ""
-    if updated_grade.get("recorded_by_teacher_id"):
-        teacher = db.users.find_one({"_id": updated_grade["recorded_by_teacher_id"]})
-        if teacher:
-            teacher_name = f"{teacher['firstname']} {teacher['lastname']}"
-    
-    return GradeResponse(
-        id=grade_id,
-        value=updated_grade["value"],
-        date=updated_grade["date"],
-        comment=updated_grade.get("comment"),
-        student_id=updated_grade["student_id"],
-        student_name=f"{student['firstname']} {student['lastname']}" if student else "Étudiant inconnu",
-        subject_id=updated_grade["subject_id"],
-        subject_name=subject["name"] if subject else "Matière inconnue",
-        subject_coefficient=subject["coefficient"] if subject else 1.0,
-        recorded_by=teacher_name
+    # Effectuer la mise à jour (l'ancienne valeur sert à corriger l'agrégat)
+    previous_grade = await db.grades.find_one_and_update(
+        {"_id": grade_id}, {"$set": update_data}, return_document=ReturnDocument.BEFORE
     )
+    if not previous_grade:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note non trouvée"
+        )
+    
+    updated_grade = {**previous_grade, **update_data}
+    await record_grade_changed(
+        updated_grade["student_id"], updated_grade["subject_id"], updated_grade.get("semester"),
+        previous_grade["value"], updated_grade["value"]
+    )
+    if previous_grade["value"] != updated_grade["value"]:
+        await invalidate_student_transcripts(updated_grade["student_id"])
+    publish_grade_events(EVENT_UPDATED, [updated_grade])
+    
+    return (await hydrate_grades([updated_grade]))[0]
 
 @grades_router.delete("/api/grades/{grade_id}")
 async def delete_grade(
@@ -250,13 +336,19 @@ async def delete_grade(
     Supprimer une note
     Accessible aux enseignants et administrateurs
     """
-    result = db.grades.delete_one({"_id": grade_id})
-    if result.deleted_count == 0:
+    grade = await db.grades.find_one_and_delete(
+        {"_id": grade_id}, projection={"student_id": 1, "subject_id": 1, "semester": 1, "value": 1}
+    )
+    if not grade:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note non trouvée"
         )
     
+    await record_grade_removed(grade["student_id"], grade["subject_id"], grade.get("semester"), grade["value"])
+    await invalidate_student_transcripts(grade["student_id"])
+    publish_grade_events(EVENT_DELETED, [grade])
+    
     return {"message": "Note supprimée avec succès"}
 
 # ===========================
@@ -272,6 +364,8 @@ async def calculate_student_average(
     """
     Calculer la moyenne générale pondérée d'un étudiant
     Équivalent aux calculs de moyenne du backend Spring Boot
+    
+    Avec semester, seules les notes de ce semestre sont prises en compte.
     """
     # Vérification des permissions
     if (current_user["role"] == "STUDENT" and str(current_user["_id"]) != student_id and 
@@ -281,78 +375,104 @@ async def calculate_student_average(
             detail="Accès non autorisé"
         )
     
-    # Récupérer toutes les notes de l'étudiant
-    grades = list(db.grades.find({"student_id": student_id}))
+    # Calcul pondéré par MongoDB sur les agrégats tenus à jour à chaque écriture de note
+    return await get_average_report(student_id, semester)
+
+# ===========================
+# STATISTIQUES
+# ===========================
+
+async def _with_student_names(statistics: Dict[str, Any]) -> Dict[str, Any]:
+    """Ajouter le nom des étudiants au classement (une requête $in)"""
+    ids = [entry["student_id"] for entry in statistics["ranking"]]
+    names = {
+        user["_id"]: f"{user['firstname']} {user['lastname']}"
+        async for user in db.users.find({"_id": {"$in": ids}}, {"firstname": 1, "lastname": 1})
+    }
+    for entry in statistics["ranking"]:
+        entry["student_name"] = names.get(entry["student_id"], "Étudiant inconnu")
+    return statistics
+
+@grades_router.get("/api/statistics/subjects/{subject_id}")
+async def get_subject_statistics(
+    subject_id: str,
+    semester: Optional[str] = None,
+    current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
+):
+    """
+    Statistiques d'une matière : moyenne, médiane, écart-type, histogramme
+    (tranches de 2 points), rang et percentile de chaque étudiant
+    """
+    subject = await db.subjects.find_one({"_id": subject_id}, {"name": 1})
+    if not subject:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Matière non trouvée"
+        )
+    
+    statistics = await _with_student_names(await subject_statistics(subject_id, semester=semester))
+    return {"subject_id": subject_id, "subject_name": subject["name"], "semester": semester, **statistics}
+
+@grades_router.get("/api/statistics/classes/{class_id}")
+async def get_class_statistics(
+    class_id: str,
+    subject_id: Optional[str] = None,
+    semester: Optional[str] = None,
+    current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
+):
+    """
+    Statistiques d'une classe (étudiants inscrits)
     
-    if not grades:
-        return {
-            "student_id": student_id,
-            "general_average": 0,
-            "subject_averages": [],
-            "total_coefficient": 0,
-            "semester": semester
-        }
+    Porte sur les moyennes générales pondérées, ou sur une seule matière
+    si subject_id est précisé ; semester restreint les inscrits et les
+    notes à un semestre.
+    """
+    class_ = await db.classes.find_one({"_id": class_id}, {"name": 1, "academic_year": 1})
+    if not class_:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Classe non trouvée"
+        )
     
-    # Grouper les notes par matière
-    subjects_data = {}
-    for grade in grades:
-        subject_id = grade["subject_id"]
-        if subject_id not in subjects_data:
-            subject = db.subjects.find_one({"_id": subject_id})
-            if subject:
-                subjects_data[subject_id] = {
-                    "subject_name": subject["name"],
-                    "coefficient": subject["coefficient"],
-                    "grades": []
-                }
-        
-        if subject_id in subjects_data:
-            subjects_data[subject_id]["grades"].append(grade["value"])
-    
-    # Calculer les moyennes par matière et la moyenne générale
-    subject_averages = []
-    weighted_sum = 0
-    total_coefficient = 0
-    
-    for subject_id, data in subjects_data.items():
-        if data["grades"]:
-            subject_avg = statistics.mean(data["grades"])
-            subject_averages.append({
-                "subject_id": subject_id,
-                "subject_name": data["subject_name"],
-                "average": round(subject_avg, 2),
-                "coefficient": data["coefficient"],
-                "grade_count": len(data["grades"])
-            })
-            
-            # Calcul pondéré pour la moyenne générale
-            weighted_sum += subject_avg * data["coefficient"]
-            total_coefficient += data["coefficient"]
-    
-    general_average = round(weighted_sum / total_coefficient, 2) if total_coefficient > 0 else 0
+    student_ids = await class_student_ids([class_id], semester)
+    if subject_id:
+        statistics = await subject_statistics(subject_id, student_ids, semester)
+    else:
+        statistics = await cohort_statistics(student_ids, semester)
     
     return {
-        "student_id": student_id,
-        "general_average": general_average,
-        "subject_averages": subject_averages,
-        "total_coefficient": total_coefficient,
+        "class_id": class_id,
+        "class_name": class_["name"],
+        "academic_year": class_["academic_year"],
+        "subject_id": subject_id,
         "semester": semester,
-        "calculation_date": datetime.utcnow()
+        **(await _with_student_names(statistics))
     }
 
 # ===========================
 # GÉNÉRATION DE RELEVÉS PDF
 # ===========================
 
+def _read_file(filepath: str) -> bytes:
+    """Lire un fichier entier (hors boucle d'événements)"""
+    with open(filepath, "rb") as f:
+        return f.read()
+
 @grades_router.get("/api/students/{student_id}/transcript/pdf")
 async def generate_transcript_pdf(
     student_id: str,
+    request: Request,
     semester: Optional[str] = None,
+    format: str = Query("pdf", pattern="^(pdf|json)$"),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Générer un relevé de notes PDF
     Équivalent à la génération PDF du backend Spring Boot
+    
+    Par défaut le PDF est transmis en binaire (application/pdf, requêtes
+    Range acceptées) ; format=json conserve l'ancienne réponse JSON avec
+    le contenu encodé en base64.
     """
     # Vérification des permissions
     if (current_user["role"] == "STUDENT" and str(current_user["_id"]) != student_id and 
@@ -363,7 +483,7 @@ async def generate_transcript_pdf(
         )
     
     # Récupérer les données de l'étudiant
-    student = db.users.find_one({"_id": student_id})
+    student = await db.users.find_one({"_id": student_id}, {"password": 0})
     if not student:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -373,193 +493,409 @@ async def generate_transcript_pdf(
     # Récupérer les notes et calculer les moyennes
     average_data = await calculate_student_average(student_id, semester, current_user)
     
-    # Créer le PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, 
-                           topMargin=72, bottomMargin=18)
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        alignment=1  # Center
-    )
+    # Créer le PDF (rendu dans le pool de processus, sauf s'il est déjà en cache)
+    transcript = await get_or_render_transcript(student, average_data, semester)
+    transcript_id = transcript["_id"]
+    filepath = transcript["filepath"]
     
-    # Contenu du PDF
-    story = []
-    
-    # Titre
-    story.append(Paragraph("RELEVÉ DE NOTES", title_style))
-    story.append(Spacer(1, 12))
-    
-    # Informations étudiant
-    student_info = [
-        ["Nom :", f"{student['lastname']} {student['firstname']}"],
-        ["N° Étudiant :", student.get('student_id_num', 'N/A')],
-        ["Email :", student['email']],
-        ["Date d'édition :", datetime.now().strftime("%d/%m/%Y")]
-    ]
-    
-    if semester:
-        student_info.append(["Semestre :", semester])
-    
-    student_table = Table(student_info, colWidths=[2*inch, 3*inch])
-    student_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(student_table)
-    story.append(Spacer(1, 20))
-    
-    # Tableau des notes par matière
-    notes_data = [["Matière", "Coefficient", "Nombre de notes", "Moyenne"]]
-    
-    for subject in average_data["subject_averages"]:
-        notes_data.append([
-            subject["subject_name"],
-            str(subject["coefficient"]),
-            str(subject["grade_count"]),
-            f"{subject['average']}/20"
-        ])
+    filename = f"releve_notes_{student['lastname']}_{student['firstname']}.pdf"
+    if format == "pdf":
+        response = ranged_file_response(request, filepath, "application/pdf", filename)
+        response.headers["X-Transcript-Id"] = transcript_id
+        return response
     
-    # Ligne de moyenne générale
-    notes_data.append(["", "", "", ""])  # Ligne vide
-    notes_data.append(["MOYENNE GÉNÉRALE", "", "", f"{average_data['general_average']}/20"])
-    
-    notes_table = Table(notes_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
-    notes_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -3), colors.beige),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightblue),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(notes_table)
-    
-    # Construire le PDF
-    doc.build(story)
-    
-    # Préparer la réponse
-    buffer.seek(0)
-    pdf_content = buffer.read()
-    buffer.close()
+    pdf_content = await run_in_threadpool(_read_file, filepath)
     
     # Encoder en base64 pour la réponse JSON
     pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
     
-    # Enregistrer le transcript en base
-    transcript_id = str(uuid.uuid4())
-    transcript_data = {
-        "_id": transcript_id,
-        "student_id": student_id,
-        "generation_date": datetime.utcnow(),
-        "status": TranscriptStatusEnum.GENERATED.value,
-        "filepath": f"transcripts/{transcript_id}.pdf",
-        "semester": semester
-    }
-    db.transcripts.insert_one(transcript_data)
-    
     return {
         "transcript_id": transcript_id,
         "student_id": student_id,
         "pdf_base64": pdf_base64,
-        "filename": f"releve_notes_{student['lastname']}_{student['firstname']}.pdf",
+        "filename": filename,
         "generation_date": datetime.utcnow()
     }
 
+@grades_router.post("/api/students/{student_id}/transcripts", status_code=status.HTTP_202_ACCEPTED)
+async def request_transcript(
+    student_id: str,
+    semester: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Demander la génération d'un relevé de notes en arrière-plan
+    
+    Retourne immédiatement l'identifiant du relevé (statut PENDING) ;
+    l'avancement se suit sur /api/transcripts/{transcript_id}.
+    """
+    # Vérification des permissions
+    if (current_user["role"] == "STUDENT" and str(current_user["_id"]) != student_id and 
+        current_user["role"] not in ["TEACHER", "ADMIN"]):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès non autorisé"
+        )
+    
+    student = await db.users.find_one({"_id": student_id}, {"password": 0})
+    if not student:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Étudiant non trouvé"
+        )
+    
+    average_data = await calculate_student_average(student_id, semester, current_user)
+    transcript = await enqueue_transcript(student, average_data, semester)
+    
+    return {
+        "transcript_id": transcript["_id"],
+        "student_id": student_id,
+        "status": transcript["status"],
+        "semester": semester
+    }
+
+@grades_router.post("/api/transcripts/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def request_bulk_transcripts(
+    bulk_request: TranscriptBulkRequest,
+    current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
+):
+    """
+    Générer les relevés de toute une classe ou de toute une année
+    
+    Les étudiants sont ceux inscrits (enrollments) dans la classe ou dans
+    les classes de l'année. Le résultat est une archive ZIP (un PDF par
+    étudiant) ou un PDF unique (format=pdf) ; l'avancement se suit sur
+    /api/transcripts/bulk/{batch_id}.
+    """
+    if bulk_request.class_id:
+        if not await db.classes.find_one({"_id": bulk_request.class_id}, {"_id": 1}):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Classe non trouvée"
+            )
+        class_ids = [bulk_request.class_id]
+    elif bulk_request.academic_year:
+        class_ids = await db.classes.distinct("_id", {"academic_year": bulk_request.academic_year})
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indiquer une classe ou une année universitaire"
+        )
+    
+    student_ids = await class_student_ids(class_ids, bulk_request.semester)
+    if not student_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Aucun étudiant inscrit"
+        )
+    
+    batch = await enqueue_transcript_batch(
+        student_ids,
+        {"class_id": bulk_request.class_id, "academic_year": bulk_request.academic_year},
+        bulk_request.semester,
+        bulk_request.format,
+        str(current_user["_id"])
+    )
+    
+    return {
+        "batch_id": batch["_id"],
+        "status": batch["status"],
+        "total": batch["total"],
+        "format": batch["format"]
+    }
+
+@grades_router.get("/api/transcripts/bulk/{batch_id}")
+async def get_bulk_transcripts_status(
+    batch_id: str,
+    current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
+):
+    """Suivre l'avancement d'une génération groupée"""
+    batch = await db.transcript_batches.find_one({"_id": batch_id})
+    if not batch:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Génération groupée non trouvée"
+        )
+    
+    return {
+        "batch_id": batch["_id"],
+        "status": batch["status"],
+        "format": batch["format"],
+        "total": batch["total"],
+        "done": batch["done"],
+        "progress": round(100 * batch["done"] / batch["total"], 1) if batch["total"] else 100.0,
+        "error": batch.get("error")
+    }
+
+@grades_router.get("/api/transcripts/bulk/{batch_id}/file")
+async def download_bulk_transcripts(
+    batch_id: str,
+    current_user: dict = Depends(require_role([RoleEnum.TEACHER, RoleEnum.ADMIN]))
+):
+    """Télécharger le résultat d'une génération groupée (ZIP ou PDF)"""
+    batch = await db.transcript_batches.find_one({"_id": batch_id})
+    if not batch:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Génération groupée non trouvée"
+        )
+    if batch["status"] == TranscriptStatusEnum.PENDING.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Génération en cours"
+        )
+    if batch["status"] != TranscriptStatusEnum.GENERATED.value or not os.path.exists(batch["filepath"]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Fichier indisponible"
+        )
+    
+    return FileResponse(
+        batch["filepath"],
+        media_type="application/zip" if batch["format"] == "zip" else "application/pdf",
+        filename=f"releves_{batch_id}.{batch['format']}"
+    )
+
+async def _get_authorized_transcript(transcript_id: str, current_user: dict) -> Dict[str, Any]:
+    """Charger un relevé en vérifiant que l'utilisateur peut y accéder"""
+    transcript = await db.transcripts.find_one({"_id": transcript_id})
+    if not transcript:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Relevé non trouvé"
+        )
+    
+    if current_user["role"] == "STUDENT" and str(current_user["_id"]) != transcript["student_id"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Accès non autorisé"
+        )
+    return transcript
+
+@grades_router.get("/api/transcripts/{transcript_id}")
+async def get_transcript_status(
+    transcript_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Obtenir le statut d'un relevé de notes"""
+    transcript = await _get_authorized_transcript(transcript_id, current_user)
+    return {
+        "transcript_id": transcript["_id"],
+        "student_id": transcript["student_id"],
+        "status": transcript["status"],
+        "semester": transcript.get("semester"),
+        "generation_date": transcript["generation_date"],
+        "error": transcript.get("error")
+    }
+
+@grades_router.get("/api/transcripts/{transcript_id}/file")
+async def download_transcript(
+    transcript_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Télécharger le PDF d'un relevé généré (requêtes Range acceptées)"""
+    transcript = await _get_authorized_transcript(transcript_id, current_user)
+    
+    if transcript["status"] == TranscriptStatusEnum.PENDING.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Relevé en cours de génération"
+        )
+    if (transcript["status"] != TranscriptStatusEnum.GENERATED.value
+            or not os.path.exists(transcript["filepath"])):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Fichier du relevé indisponible"
+        )
+    
+    return ranged_file_response(
+        request, transcript["filepath"], "application/pdf", f"releve_notes_{transcript_id}.pdf"
+    )
+
 # ===========================
 # EXPORT EXCEL
 # ===========================
 
-@grades_router.get("/api/admin/export/excel")
-async def export_grades_excel(
-    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
-):
+# Taille des lots lus sur le curseur (et jointures $in associées)
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MAX_COLUMN_WIDTH = 50
+EXPORT_HEADERS = ["Étudiant", "N° Étudiant", "Matière", "Note", "Coefficient",
+                  "Date", "Commentaire", "Enseignant"]
+
+async def _export_batch_rows(grades: List[Dict[str, Any]], subjects_cache: Dict[str, Any]) -> List[list]:
+    """Joindre un lot de notes à leurs étudiants, matières et enseignants"""
+    missing_subjects = {grade["subject_id"] for grade in grades} - subjects_cache.keys()
+    if missing_subjects:
+        async for subject in db.subjects.find(
+            {"_id": {"$in": list(missing_subjects)}}, {"name": 1, "coefficient": 1}
+        ):
+            subjects_cache[subject["_id"]] = subject
+    
+    user_ids = {grade["student_id"] for grade in grades}
+    user_ids.update(
+        grade["recorded_by_teacher_id"] for grade in grades
+        if grade.get("recorded_by_teacher_id")
+    )
+    users = {
+        user["_id"]: user
+        async for user in db.users.find(
+            {"_id": {"$in": list(user_ids)}},
+            {"firstname": 1, "lastname": 1, "student_id_num": 1}
+        )
+    }
+    
+    rows = []
+    for grade in grades:
+        student = users.get(grade["student_id"])
+        subject = subjects_cache.get(grade["subject_id"])
+        teacher = users.get(grade.get("recorded_by_teacher_id"))
+        rows.append([
+            f"{student['lastname']} {student['firstname']}" if student else "N/A",
+            student.get('student_id_num', 'N/A') if student else "N/A",
+            subject['name'] if subject else "N/A",
+            grade['value'],
+            subject['coefficient'] if subject else 1.0,
+            grade['date'].strftime("%d/%m/%Y %H:%M"),
+            grade.get('comment') or '',
+            f"{teacher['firstname']} {teacher['lastname']}" if teacher else ""
+        ])
+    return rows
+
+async def iter_export_rows(batch_size: int = EXPORT_BATCH_SIZE):
     """
-    Exporter toutes les notes en Excel
-    Accessible uniquement aux administrateurs
+    Parcourir toutes les notes sous forme de lignes d'export
+    
+    Le curseur est lu par lots : chaque lot coûte une requête $in sur les
+    utilisateurs (les matières, peu nombreuses, sont gardées en cache), et
+    seul le lot courant est conservé en mémoire.
+    """
+    subjects_cache: Dict[str, Any] = {}
+    batch = []
+    async for grade in db.grades.find({}, batch_size=batch_size):
+        batch.append(grade)
+        if len(batch) >= batch_size:
+            for row in await _export_batch_rows(batch, subjects_cache):
+                yield row
+            batch = []
+    if batch:
+        for row in await _export_batch_rows(batch, subjects_cache):
+            yield row
+
+def _append_rows(ws, rows: List[list]):
+    """Écrire des lignes dans la feuille (sérialisation XML, hors boucle d'événements)"""
+    for row in rows:
+        ws.append(row)
+
+async def _write_excel_export(path: str) -> int:
     """
-    # Créer un nouveau workbook Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Notes"
+    Écrire l'export dans un classeur en écriture seule (write_only)
+    
+    En mode write_only les largeurs de colonnes doivent être fixées avant
+    la première ligne : elles sont calculées au fil du premier lot, qui est
+    mis en attente puis écrit ; les lignes suivantes sont écrites au fil du
+    curseur. Le curseur est lu sur la boucle d'événements, les lignes sont
+    écrites par lots de EXPORT_BATCH_SIZE dans le pool de threads.
+    Retourne le nombre de notes exportées.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Notes")
     
     # Style pour l'en-tête
     header_font = Font(bold=True, color="FFFFFF")
     header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
     header_alignment = Alignment(horizontal="center", vertical="center")
     
-    # En-têtes
-    headers = ["Étudiant", "N° Étudiant", "Matière", "Note", "Coefficient", 
-               "Date", "Commentaire", "Enseignant"]
+    rows = iter_export_rows()
+    widths = [len(header) for header in EXPORT_HEADERS]
+    first_batch = []
+    async for row in rows:
+        first_batch.append(row)
+        for col, value in enumerate(row):
+            widths[col] = max(widths[col], len(str(value)))
+        if len(first_batch) >= EXPORT_BATCH_SIZE:
+            break
+    
+    # Ajuster la largeur des colonnes
+    for col, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = min(width + 2, EXPORT_MAX_COLUMN_WIDTH)
     
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
+    # En-têtes
+    header_row = []
+    for header in EXPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
         cell.font = header_font
         cell.fill = header_fill
         cell.alignment = header_alignment
+        header_row.append(cell)
+    await run_in_threadpool(_append_rows, ws, [header_row, *first_batch])
+    
+    total = len(first_batch)
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            await run_in_threadpool(_append_rows, ws, batch)
+            total += len(batch)
+            batch = []
+    await run_in_threadpool(_append_rows, ws, batch)
+    total += len(batch)
+    
+    # La compression du fichier se fait hors de la boucle d'événements
+    await run_in_threadpool(wb.save, path)
+    return total
+
+async def _iter_csv_export():
+    """Produire l'export CSV ligne par ligne (BOM UTF-8 pour Excel)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_HEADERS)
+    count = 0
+    with RENDER_DURATION.labels(kind="csv_export").time():
+        async for row in iter_export_rows():
+            writer.writerow(row)
+            count += 1
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue().encode('utf-8')
+
+@grades_router.get("/api/admin/export/excel")
+async def export_grades_excel(
+    format: str = Query("xlsx", pattern="^(xlsx|csv)$"),
+    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
+):
+    """
+    Exporter toutes les notes en Excel (ou en CSV avec ?format=csv)
+    Accessible uniquement aux administrateurs
     
-    # Récupérer toutes les notes avec les informations associées
-    grades = list(db.grades.find({}))
-    
-    for row, grade in enumerate(grades, 2):
-        student = db.users.find_one({"_id": grade["student_id"]})
-        subject = db.subjects.find_one({"_id": grade["subject_id"]})
-        teacher = None
-        if grade.get("recorded_by_teacher_id"):
-            teacher = db.users.find_one({"_id": grade["recorded_by_teacher_id"]})
-        
-        ws.cell(row=row, column=1, value=f"{student['lastname']} {student['firstname']}" if student else "N/A")
-        ws.cell(row=row, column=2, value=student.get('student_id_num', 'N/A') if student else "N/A")
-        ws.cell(row=row, column=3, value=subject['name'] if subject else "N/A")
-        ws.cell(row=row, column=4, value=grade['value'])
-        ws.cell(row=row, column=5, value=subject['coefficient'] if subject else 1.0)
-        ws.cell(row=row, column=6, value=grade['date'].strftime("%d/%m/%Y %H:%M"))
-        ws.cell(row=row, column=7, value=grade.get('comment', ''))
-        ws.cell(row=row, column=8, value=f"{teacher['firstname']} {teacher['lastname']}" if teacher else "")
+    Le fichier est renvoyé en binaire (pas de base64) : le CSV est diffusé
+    au fil du curseur, le classeur XLSX est écrit sur disque puis diffusé.
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     
-    # Ajuster la largeur des colonnes
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    # Sauvegarder en mémoire
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    excel_content = buffer.read()
-    buffer.close()
-    
-    # Encoder en base64
-    excel_base64 = base64.b64encode(excel_content).decode('utf-8')
+    if format == "csv":
+        return StreamingResponse(
+            _iter_csv_export(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="export_notes_{timestamp}.csv"'}
+        )
     
-    return {
-        "excel_base64": excel_base64,
-        "filename": f"export_notes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-        "export_date": datetime.utcnow(),
-        "total_grades": len(grades)
-    }
\ No newline at end of file
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        with RENDER_DURATION.labels(kind="excel_export").time():
+            total_grades = await _write_excel_export(path)
+    except Exception:
+        os.remove(path)
+        raise
+    
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=f"export_notes_{timestamp}.xlsx",
+        headers={"X-Total-Grades": str(total_grades)},
+        background=BackgroundTask(os.remove, path)
+    )
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bancs d'essai de l'API
+
+- dataset.py : génération d'un jeu de données scolaire synthétique
+  (utilisateurs, matières, classes, inscriptions, notes) aux formes de
+  documents écrites par les routes
+- scenarios.py : scénarios de charge (connexions, listes de notes,
+  moyennes, relevés PDF, export Excel)
+- run.py : exécution des scénarios, rapport débit / p50 / p95 / p99 et
+  comparaison avec un rapport précédent
+
+Exemples (depuis la racine du dépôt) :
+
+    # Base en mémoire (mongomock-motor), application dans le processus
+    python -m backend.benchmarks.run --memory --students 500 --output bench.json
+
+    # mongod local : génération puis serveur lancé à part
+    python -m backend.benchmarks.dataset --students 50000 --subjects 200 \\
+        --grades-per-student 100 --drop
+    python -m backend.benchmarks.run --base-url http://localhost:8001 \\
+        --output bench.json --compare bench_precedent.json
+"""
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Génération d'un jeu de données scolaire synthétique
+
+Les documents ont les formes écrites par les routes (users, subjects,
+classes, enrollments, grades) et les moyennes pré-agrégées
+(student_averages) sont écrites en même temps que les notes. Le
+générateur est déterministe pour une graine donnée : deux exécutions de
+même paramétrage produisent les mêmes identifiants et les mêmes notes.
+
+Tous les comptes générés ont le mot de passe BENCHMARK_PASSWORD (haché
+une seule fois). La base ciblée est celle de database.py (MONGO_URL,
+MONGO_DB_NAME).
+
+    python -m backend.benchmarks.dataset --students 50000 --subjects 200 \\
+        --grades-per-student 100 --drop
+"""
+
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+import argparse
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+from ..database import db
+from ..indexes import ensure_indexes
+from ..password_hashing import pwd_context
+from ..student_averages import AVERAGES_COLLECTION, average_document
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_PASSWORD = "benchmark"
+SEMESTERS = ("S1", "S2")
+GENERATED_COLLECTIONS = ("users", "subjects", "classes", "enrollments", "grades", AVERAGES_COLLECTION)
+
+
+@dataclass
+class DatasetSpec:
+    """Paramètres d'échelle du jeu de données"""
+    students: int = 1000
+    teachers: int = 50
+    subjects: int = 20
+    classes: int = 20
+    subjects_per_class: int = 8
+    grades_per_student: int = 20
+    academic_year: str = "2024-2025"
+    seed: int = 42
+    batch_size: int = 10000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _grade_value(rng: random.Random) -> float:
+    """Note sur 20, au demi-point, centrée sur 12"""
+    return min(20.0, max(0.0, round(rng.gauss(12, 3.5) * 2) / 2))
+
+
+async def _insert_batches(collection: str, documents: Iterator[Dict[str, Any]], batch_size: int) -> int:
+    """Insérer des documents par lots (mémoire bornée quelle que soit l'échelle)"""
+    total = 0
+    batch: List[Dict[str, Any]] = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            await db[collection].insert_many(batch, ordered=False)
+            total += len(batch)
+            batch = []
+    if batch:
+        await db[collection].insert_many(batch, ordered=False)
+        total += len(batch)
+    return total
+
+
+async def generate_dataset(spec: DatasetSpec, drop: bool = False) -> Dict[str, int]:
+    """Remplir la base selon spec ; retourne le nombre de documents par collection"""
+    rng = random.Random(spec.seed)
+    now = datetime.utcnow()
+    password_hash = pwd_context.hash(BENCHMARK_PASSWORD)
+    counts: Dict[str, int] = {}
+
+    if drop:
+        for collection in GENERATED_COLLECTIONS:
+            # Le compte administrateur créé au démarrage est conservé
+            query = {"role": {"$ne": "ADMIN"}} if collection == "users" else {}
+            await db[collection].delete_many(query)
+
+    teachers = [
+        {
+            "_id": _uuid(rng),
+            "username": f"teacher{i:05d}",
+            "password": password_hash,
+            "firstname": f"Prenom{i}",
+            "lastname": f"Enseignant{i}",
+            "email": f"teacher{i:05d}@bench.example.com",
+            "role": "TEACHER",
+            "teacher_id_num": f"T{i:05d}",
+            "created_at": now,
+        }
+        for i in range(spec.teachers)
+    ]
+    subjects = [
+        {
+            "_id": _uuid(rng),
+            "subject_code": f"SUB{i:04d}",
+            "name": f"Matière {i}",
+            "coefficient": rng.choice([1.0, 1.0, 2.0, 2.0, 3.0, 4.0]),
+            "description": None,
+            "created_at": now,
+        }
+        for i in range(spec.subjects)
+    ]
+    classes = [
+        {
+            "_id": _uuid(rng),
+            "name": f"Classe {i}",
+            "academic_year": spec.academic_year,
+            "created_at": now,
+        }
+        for i in range(spec.classes)
+    ]
+    class_subjects = {
+        class_["_id"]: rng.sample(subjects, min(spec.subjects_per_class, len(subjects)))
+        for class_ in classes
+    }
+    students = [
+        {
+            "_id": _uuid(rng),
+            "username": f"student{i:06d}",
+            "password": password_hash,
+            "firstname": f"Prenom{i}",
+            "lastname": f"Etudiant{i}",
+            "email": f"student{i:06d}@bench.example.com",
+            "role": "STUDENT",
+            "student_id_num": f"E{i:06d}",
+            "created_at": now,
+        }
+        for i in range(spec.students)
+    ]
+    student_classes = {student["_id"]: rng.choice(classes)["_id"] for student in students}
+
+    counts["users"] = await _insert_batches("users", iter(teachers + students), spec.batch_size)
+    counts["subjects"] = await _insert_batches("subjects", iter(subjects), spec.batch_size)
+    counts["classes"] = await _insert_batches("classes", iter(classes), spec.batch_size)
+
+    def enrollments():
+        for student in students:
+            class_id = student_classes[student["_id"]]
+            for subject in class_subjects[class_id]:
+                for semester in SEMESTERS:
+                    yield {
+                        "_id": _uuid(rng),
+                        "student_id": student["_id"],
+                        "subject_id": subject["_id"],
+                        "class_id": class_id,
+                        "semester": semester,
+                        "enrollment_date": now,
+                    }
+
+    counts["enrollments"] = await _insert_batches("enrollments", enrollments(), spec.batch_size)
+
+    # Moyennes pré-agrégées calculées au fil de la génération des notes
+    totals: Dict[tuple, List[float]] = {}
+
+    def grades():
+        for student in students:
+            student_subjects = class_subjects[student_classes[student["_id"]]]
+            if not student_subjects:
+                continue
+            for _ in range(spec.grades_per_student):
+                subject = rng.choice(student_subjects)
+                value = _grade_value(rng)
+                semester = rng.choice(SEMESTERS)
+                total = totals.setdefault((student["_id"], subject["_id"], semester), [0.0, 0, subject])
+                total[0] += value
+                total[1] += 1
+                yield {
+                    "_id": _uuid(rng),
+                    "student_id": student["_id"],
+                    "subject_id": subject["_id"],
+                    "value": value,
+                    "semester": semester,
+                    "comment": None,
+                    "recorded_by_teacher_id": rng.choice(teachers)["_id"] if teachers else None,
+                    "date": now - timedelta(days=rng.randrange(240)),
+                }
+
+    counts["grades"] = await _insert_batches("grades", grades(), spec.batch_size)
+    counts[AVERAGES_COLLECTION] = await _insert_batches(
+        AVERAGES_COLLECTION,
+        (
+            average_document(student_id, subject, value_sum, count, semester)
+            for (student_id, _, semester), (value_sum, count, subject) in totals.items()
+        ),
+        spec.batch_size
+    )
+    return counts
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    """Options d'échelle communes au générateur et au banc d'essai"""
+    defaults = DatasetSpec()
+    for field, value in defaults.to_dict().items():
+        parser.add_argument(
+            f"--{field.replace('_', '-')}", type=type(value), default=value,
+            help=f"(défaut {value})"
+        )
+
+
+def spec_from_arguments(args: argparse.Namespace) -> DatasetSpec:
+    return DatasetSpec(**{field: getattr(args, field) for field in DatasetSpec().to_dict()})
+
+
+async def _main(args: argparse.Namespace):
+    spec = spec_from_arguments(args)
+    started = time.perf_counter()
+    db.connect()
+    try:
+        await ensure_indexes()
+        counts = await generate_dataset(spec, drop=args.drop)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - started
+    for collection, count in counts.items():
+        print(f"{collection:20s} {count:>12,d}")
+    print(f"Jeu de données généré en {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Génération d'un jeu de données synthétique")
+    add_dataset_arguments(parser)
+    parser.add_argument("--drop", action="store_true", help="Vider les collections générées au préalable")
+    asyncio.run(_main(parser.parse_args()))
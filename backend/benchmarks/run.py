@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exécution des scénarios de charge et rapport de performances
+
+Cibles possibles :
+- --base-url URL : serveur déjà lancé (jeu de données généré au préalable
+  avec dataset.py sur la même base)
+- par défaut : application chargée dans le processus, sur la base de
+  database.py (--generate pour y générer le jeu de données)
+- --memory : application dans le processus sur une base en mémoire
+  (mongomock-motor, à installer à part) ; le jeu de données est généré
+
+Pour chaque scénario : débit (requêtes/s), latences moyenne, p50, p95 et
+p99, erreurs (statut >= 400). Le rapport JSON (--output) porte le commit
+courant ; --compare affiche l'écart avec un rapport précédent.
+
+Charge de fond (--background SCÉNARIO --background-clients N) : pendant
+la mesure de chaque scénario, N clients enchaînent sans pause le scénario
+de fond (lancé --background-ramp-up secondes avant la mesure) ; le
+rapport indique aussi son débit et ses statuts. Exemple,
+effet du rejet en 503 des connexions (password_hashing.py) sur les
+autres routes :
+
+    python -m backend.benchmarks.run --memory --scenarios subject_list \\
+        --background login_storm --background-clients 50
+
+Balayage (--sweep-concurrency 1,10,50 et/ou --sweep-pool-sizes 10,50,100) :
+les scénarios sont exécutés pour chaque combinaison de concurrence et de
+taille du pool MongoDB (MONGO_MAX_POOL_SIZE, le pool est rouvert à chaque
+taille ; application dans le processus sur MongoDB uniquement, pour un
+serveur lancé c'est sa variable d'environnement qui compte). Le rapport
+donne le débit et le p95 de chaque scénario par niveau.
+"""
+
+from typing import Any, Awaitable, Dict, List, Optional
+from datetime import datetime
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+
+import httpx
+import numpy as np
+
+from .. import database
+from ..database import db
+from .dataset import add_dataset_arguments, generate_dataset, spec_from_arguments
+from .scenarios import SCENARIOS, BenchmarkContext, Scenario
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _in_process_app():
+    """Application complète de server.py (routeurs inclus)"""
+    from .. import server
+    return server
+
+
+async def _open_client(args: argparse.Namespace) -> httpx.AsyncClient:
+    if args.base_url:
+        return httpx.AsyncClient(base_url=args.base_url, timeout=None)
+
+    if args.memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--memory nécessite le paquet mongomock-motor")
+        db.attach(AsyncMongoMockClient())
+
+    server = _in_process_app()
+    await server.create_default_admin()
+    if not args.memory:
+        # Les index partiels ne sont pas pris en charge par mongomock
+        from ..indexes import ensure_indexes
+        await ensure_indexes()
+    if args.memory or args.generate:
+        started = time.perf_counter()
+        counts = await generate_dataset(spec_from_arguments(args), drop=True)
+        print(f"Jeu de données généré en {time.perf_counter() - started:.1f} s : {counts}")
+    return httpx.AsyncClient(app=server.app, base_url="http://benchmark", timeout=None)
+
+
+async def _close_client(client: httpx.AsyncClient, args: argparse.Namespace):
+    await client.aclose()
+    if not args.base_url:
+        from ..password_hashing import shutdown_password_pool
+        from ..transcript_jobs import shutdown_render_pool
+        shutdown_password_pool()
+        shutdown_render_pool()
+        db.close()
+
+
+async def _build_context(client: httpx.AsyncClient, args: argparse.Namespace) -> BenchmarkContext:
+    response = await client.post("/api/auth/signin", json={
+        "username": args.admin_username, "password": args.admin_password
+    })
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.get(
+        "/api/admin/users", params={"role": "STUDENT", "limit": args.sample_students}, headers=headers
+    )
+    response.raise_for_status()
+    students = response.json()
+    if not students:
+        raise SystemExit("Aucun étudiant dans la base : générer le jeu de données (dataset.py)")
+    # Matières notées (d'après les notes du premier étudiant)
+    response = await client.get(f"/api/grades/student/{students[0]['id']}", headers=headers)
+    response.raise_for_status()
+    subject_ids = sorted({grade["subject_id"] for grade in response.json()})
+    return BenchmarkContext(admin_headers=headers, students=students, subject_ids=subject_ids)
+
+
+def _statistics(latencies: List[float], statuses: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    """Débit, latences et erreurs d'une série de requêtes"""
+    latencies_ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if int(status) >= 400),
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(float(latencies_ms.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, context: BenchmarkContext, scenario: Scenario,
+                       requests: int, concurrency: int, warmup: int) -> Dict[str, Any]:
+    """Exécuter un scénario et calculer ses statistiques"""
+    if scenario.max_requests is not None:
+        requests = min(requests, scenario.max_requests)
+        warmup = min(warmup, 1)
+    for _ in range(warmup):
+        await scenario.run(client, context)
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await scenario.run(client, context)
+            latencies.append(time.perf_counter() - started)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    elapsed = time.perf_counter() - started
+    return {"concurrency": min(concurrency, requests), **_statistics(latencies, statuses, elapsed)}
+
+
+async def run_under_load(client: httpx.AsyncClient, context: BenchmarkContext, measured: Awaitable,
+                         background: Scenario, clients: int, ramp_up: float) -> Dict[str, Any]:
+    """
+    Attendre la mesure measured (run_scenario) pendant que clients clients
+    enchaînent le scénario de fond, lancé ramp_up secondes plus tôt ; ses
+    statistiques sont complétées de celles de la charge de fond (clé
+    background)
+    """
+    stop = asyncio.Event()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+
+    async def load():
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = await background.run(client, context)
+            latencies.append(time.perf_counter() - started)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            # Application dans le processus : une 503 immédiate ne rend pas
+            # la main à la boucle, la mesure serait affamée
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    loaders = [asyncio.create_task(load()) for _ in range(clients)]
+    try:
+        await asyncio.sleep(ramp_up)
+        results = await measured
+    finally:
+        stop.set()
+        await asyncio.gather(*loaders)
+    background_stats = _statistics(latencies, statuses, time.perf_counter() - started) if latencies else {}
+    return {**results, "background": {"clients": clients, **background_stats}}
+
+
+async def _run_scenarios(client: httpx.AsyncClient, context: BenchmarkContext, names: List[str],
+                         args: argparse.Namespace, concurrency: int) -> Dict[str, Any]:
+    results = {}
+    for name in names:
+        measured = run_scenario(
+            client, context, SCENARIOS[name], args.requests, concurrency, args.warmup
+        )
+        if args.background:
+            measured = run_under_load(
+                client, context, measured, SCENARIOS[args.background],
+                args.background_clients, args.background_ramp_up
+            )
+        results[name] = await measured
+        print(f"{name} : {results[name]['throughput_rps']} req/s, p95 {results[name]['p95_ms']} ms")
+    return results
+
+
+def _resize_pool(max_pool_size: int):
+    """Rouvrir le pool MongoDB avec une autre taille maximale"""
+    database.MONGO_MAX_POOL_SIZE = max_pool_size
+    db.close()
+
+
+async def run_sweep(client: httpx.AsyncClient, context: BenchmarkContext, names: List[str],
+                    args: argparse.Namespace, pool_sizes: List[Optional[int]],
+                    concurrencies: List[int]) -> List[Dict[str, Any]]:
+    """Exécuter les scénarios pour chaque taille de pool et chaque concurrence"""
+    levels = []
+    for pool_size in pool_sizes:
+        if pool_size is not None:
+            _resize_pool(pool_size)
+        for concurrency in concurrencies:
+            print(f"-- pool {pool_size or 'serveur'}, concurrence {concurrency}")
+            levels.append({
+                "pool_size": pool_size,
+                "concurrency": concurrency,
+                "scenarios": await _run_scenarios(client, context, names, args, concurrency),
+            })
+    return levels
+
+
+def print_sweep(report: Dict[str, Any]):
+    """Afficher le débit et le p95 de chaque scénario par niveau du balayage"""
+    names = list(report["sweep"][0]["scenarios"])
+    print(f"\nCommit {report['commit']} - cible {report['target']} - débit req/s (p95 ms)")
+    header = f"{'pool':>6s} {'conc.':>6s} " + " ".join(f"{name:>22s}" for name in names)
+    print(header)
+    print("-" * len(header))
+    for level in report["sweep"]:
+        cells = [
+            f"{stats['throughput_rps']:.1f} ({stats['p95_ms']:.1f})"
+            for stats in level["scenarios"].values()
+        ]
+        pool_size = str(level["pool_size"] or "-")
+        print(f"{pool_size:>6s} {level['concurrency']:6d} " + " ".join(f"{cell:>22s}" for cell in cells))
+
+
+def print_report(report: Dict[str, Any], previous: Optional[Dict[str, Any]] = None):
+    """Afficher le rapport (et l'écart relatif au rapport précédent)"""
+    print(f"\nCommit {report['commit']} - cible {report['target']}")
+    header = f"{'scénario':16s} {'req/s':>9s} {'moy ms':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'erreurs':>8s}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in report["scenarios"].items():
+        print(
+            f"{name:16s} {stats['throughput_rps']:9.1f} {stats['mean_ms']:9.1f} {stats['p50_ms']:9.1f} "
+            f"{stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} {stats['errors']:8d}"
+        )
+        load = stats.get("background")
+        if load and load.get("requests"):
+            print(
+                f"{'':16s} fond {report['background']} x{load['clients']} : "
+                f"{load['throughput_rps']:.1f} req/s, p95 {load['p95_ms']:.1f} ms, statuts {load['statuses']}"
+            )
+        before = (previous or {}).get("scenarios", {}).get(name)
+        if before:
+            deltas = [
+                f"{key} {(stats[key] - before[key]) / before[key] * 100:+.1f}%"
+                for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms") if before[key]
+            ]
+            print(f"{'':16s} vs {previous['commit']} : " + ", ".join(deltas))
+
+
+async def _main(args: argparse.Namespace):
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if args.background and args.background not in SCENARIOS:
+        unknown.append(args.background)
+    if unknown:
+        raise SystemExit(f"Scénarios inconnus : {', '.join(unknown)} (disponibles : {', '.join(SCENARIOS)})")
+    if args.sweep_pool_sizes and (args.base_url or args.memory):
+        raise SystemExit("--sweep-pool-sizes : application dans le processus sur MongoDB uniquement")
+    sweeping = bool(args.sweep_concurrency or args.sweep_pool_sizes)
+
+    client = await _open_client(args)
+    try:
+        context = await _build_context(client, args)
+        if sweeping:
+            sweep = await run_sweep(
+                client, context, names, args,
+                [int(size) for size in args.sweep_pool_sizes.split(",")] if args.sweep_pool_sizes else [None],
+                [int(level) for level in args.sweep_concurrency.split(",")]
+                if args.sweep_concurrency else [args.concurrency]
+            )
+        else:
+            results = await _run_scenarios(client, context, names, args, args.concurrency)
+    finally:
+        await _close_client(client, args)
+
+    report = {
+        "commit": _git_commit(),
+        "date": datetime.utcnow().isoformat(),
+        "target": args.base_url or ("memory" if args.memory else "in-process"),
+        "dataset": spec_from_arguments(args).to_dict() if (args.memory or args.generate) else None,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "background": args.background,
+    }
+    if sweeping:
+        report["sweep"] = sweep
+        print_sweep(report)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        return
+
+    report["scenarios"] = results
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banc d'essai de l'API")
+    parser.add_argument("--base-url", help="URL d'un serveur lancé (sinon application dans le processus)")
+    parser.add_argument("--memory", action="store_true", help="Base en mémoire (mongomock-motor)")
+    parser.add_argument("--generate", action="store_true", help="Générer le jeu de données avant l'exécution")
+    parser.add_argument("--scenarios", help=f"Liste séparée par des virgules (défaut : {','.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes mesurées par scénario")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requêtes simultanées")
+    parser.add_argument("--warmup", type=int, default=10, help="Requêtes de chauffe non mesurées")
+    parser.add_argument("--background", help="Scénario de charge de fond pendant chaque mesure (ex. login_storm)")
+    parser.add_argument("--background-clients", type=int, default=50, help="Clients de la charge de fond")
+    parser.add_argument("--background-ramp-up", type=float, default=2.0,
+                        help="Secondes de charge de fond avant chaque mesure")
+    parser.add_argument("--sweep-concurrency", help="Niveaux de concurrence à balayer (ex. 1,10,50)")
+    parser.add_argument("--sweep-pool-sizes", help="Tailles maximales du pool MongoDB à balayer (ex. 10,50,100)")
+    parser.add_argument("--sample-students", type=int, default=1000, help="Étudiants ciblés par les scénarios")
+    parser.add_argument("--admin-username", default="admin")
+    parser.add_argument("--admin-password", default="adminpass")
+    parser.add_argument("--output", help="Fichier JSON du rapport")
+    parser.add_argument("--compare", help="Rapport JSON précédent à comparer")
+    add_dataset_arguments(parser)
+    asyncio.run(_main(parser.parse_args()))
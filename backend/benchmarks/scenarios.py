@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scénarios de charge
+
+Chaque scénario exécute une requête HTTP représentative et retourne la
+réponse ; le banc d'essai (run.py) les enchaîne avec la concurrence
+demandée. Les étudiants ciblés sont tirés au hasard (graine fixe) parmi
+ceux du jeu de données.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import random
+
+import httpx
+
+from ..pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from .dataset import BENCHMARK_PASSWORD
+
+
+@dataclass
+class BenchmarkContext:
+    """Données partagées par les scénarios"""
+    admin_headers: Dict[str, str]
+    students: List[Dict[str, Any]]
+    subject_ids: List[str] = field(default_factory=list)
+    rng: random.Random = field(default_factory=lambda: random.Random(0))
+
+    def random_student(self) -> Dict[str, Any]:
+        return self.rng.choice(self.students)
+
+
+async def login_storm(client: httpx.AsyncClient, context: BenchmarkContext) -> httpx.Response:
+    """Connexion d'un étudiant (vérification bcrypt)"""
+    return await client.post("/api/auth/signin", json={
+        "username": context.random_student()["username"],
+        "password": BENCHMARK_PASSWORD,
+    })
+
+
+async def subject_list(client: httpx.AsyncClient, context: BenchmarkContext) -> httpx.Response:
+    """Liste des matières (lecture légère, servie par le cache des réponses)"""
+    return await client.get("/api/subjects", headers=context.admin_headers)
+
+
+async def grade_listing(client: httpx.AsyncClient, context: BenchmarkContext) -> httpx.Response:
+    """Première page des notes d'un étudiant"""
+    student = context.random_student()
+    return await client.get(f"/api/grades/student/{student['id']}", headers=context.admin_headers)
+
+
+async def subject_grades(client: httpx.AsyncClient, context: BenchmarkContext) -> httpx.Response:
+    """Toutes les notes d'une matière, par pages de MAX_PAGE_SIZE (sérialisation des listes)"""
+    subject_id = context.rng.choice(context.subject_ids)
+    params = {"limit": MAX_PAGE_SIZE}
+    while True:
+        response = await client.get(
+            f"/api/grades/subject/{subject_id}", params=params, headers=context.admin_headers
+        )
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if response.status_code >= 400 or not cursor:
+            return response
+        params["after"] = cursor
+
+
+async def averages(client: httpx.AsyncClient, context: BenchmarkContext) -> httpx.Response:
+    """Moyenne générale pondérée d'un étudiant"""
+    student = context.random_student()
+    return await client.get(f"/api/students/{student['id']}/average", headers=context.admin_headers)
+
+
+async def transcript_pdf(client: httpx.AsyncClient, context: BenchmarkContext) -> httpx.Response:
+    """Relevé PDF d'un étudiant (rendu, ou cache si déjà généré)"""
+    student = context.random_student()
+    return await client.get(f"/api/students/{student['id']}/transcript/pdf", headers=context.admin_headers)
+
+
+async def excel_export(client: httpx.AsyncClient, context: BenchmarkContext) -> httpx.Response:
+    """Export de toutes les notes au format XLSX"""
+    return await client.get("/api/admin/export/excel", headers=context.admin_headers)
+
+
+@dataclass
+class Scenario:
+    """Scénario et nombre maximal de requêtes (None : --requests)"""
+    run: Callable[[httpx.AsyncClient, BenchmarkContext], Awaitable[httpx.Response]]
+    max_requests: Optional[int] = None
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "login_storm": Scenario(login_storm),
+    "subject_list": Scenario(subject_list),
+    "grade_listing": Scenario(grade_listing),
+    # Parcours complet des notes d'une matière (--subjects 10 : ~10k notes pour 5000 étudiants)
+    "subject_grades": Scenario(subject_grades, max_requests=10),
+    "averages": Scenario(averages),
+    "transcript_pdf": Scenario(transcript_pdf),
+    # Un export parcourt toutes les notes : quelques exécutions suffisent
+    "excel_export": Scenario(excel_export, max_requests=3),
+}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Coût de sérialisation d'une liste de notes (get_subject_grades)
+
+Mesure, hors base de données, la construction de la réponse d'une page
+de notes déjà jointes (noms d'étudiant, de matière et d'enseignant) :
+- chemin FastAPI : GradeResponse validés (to_response), revalidés contre
+  le response_model de la route puis encodés par JSONResponse
+- chemin direct (FAST_JSON_RESPONSES) : dictionnaires non validés
+  (to_trusted) encodés par ORJSONResponse
+
+Les deux corps produits sont comparés (contenu JSON identique).
+
+    python -m backend.benchmarks.serialization --rows 10000 --repeat 5
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from ..api_routes_part2 import grades_router
+from ..json_responses import trusted_response
+from ..models import GradeResponse
+from ..services import to_response, to_trusted
+
+
+def _grades(rows: int) -> List[Dict[str, Any]]:
+    """Notes jointes, aux formes écrites par les routes"""
+    rng = random.Random(0)
+    now = datetime.utcnow().replace(microsecond=0)
+    return [
+        {
+            "_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "student_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "subject_id": "subject",
+            "value": round(rng.uniform(0, 20) * 2) / 2,
+            "date": now - timedelta(days=rng.randrange(240), seconds=rng.randrange(86400)),
+            "comment": rng.choice([None, "Bon travail"]),
+            "semester": rng.choice(["S1", "S2"]),
+            "recorded_by_teacher_id": "teacher",
+        }
+        for _ in range(rows)
+    ]
+
+
+_JOINED = {
+    "student_name": "Prénom Nom",
+    "subject_name": "Mathématiques",
+    "subject_coefficient": 2.0,
+    "recorded_by": "Enseignant Référent",
+}
+
+
+async def fastapi_path(grades: List[Dict[str, Any]]) -> bytes:
+    route = next(route for route in grades_router.routes if route.path == "/api/grades/subject/{subject_id}")
+    content = [to_response(GradeResponse, grade, **_JOINED) for grade in grades]
+    serialized = await serialize_response(field=route.response_field, response_content=content)
+    return JSONResponse(content=serialized).body
+
+
+async def direct_path(grades: List[Dict[str, Any]]) -> bytes:
+    return trusted_response([to_trusted(GradeResponse, grade, **_JOINED) for grade in grades]).body
+
+
+async def _measure(path: Callable, grades: List[Dict[str, Any]], repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await path(grades)
+        durations.append(time.perf_counter() - started)
+    return min(durations) * 1000
+
+
+async def _main(args: argparse.Namespace):
+    grades = _grades(args.rows)
+    if json.loads(await fastapi_path(grades)) != json.loads(await direct_path(grades)):
+        raise SystemExit("Les deux chemins produisent des contenus différents")
+
+    baseline = await _measure(fastapi_path, grades, args.repeat)
+    direct = await _measure(direct_path, grades, args.repeat)
+    print(f"{args.rows} notes (meilleur de {args.repeat})")
+    print(f"  FastAPI (validation + response_model + JSONResponse) : {baseline:8.1f} ms")
+    print(f"  direct (to_trusted + ORJSONResponse)                 : {direct:8.1f} ms")
+    print(f"  gain : x{baseline / direct:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="Nombre de notes sérialisées")
+    parser.add_argument("--repeat", type=int, default=5, help="Répétitions (meilleur temps retenu)")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
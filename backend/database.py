@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Couche d'accès MongoDB asynchrone (Motor)
+
+Remplace le client pymongo synchrone partagé : chaque requête attend
+ses opérations en base sans bloquer la boucle d'événements uvicorn.
+
+Paramètres (variables d'environnement) :
+- MONGO_URL : URL de connexion (défaut mongodb://localhost:27017)
+- MONGO_DB_NAME : nom de la base (défaut gestion_notes)
+- MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE : taille du pool de connexions
+- MONGO_MAX_IDLE_TIME_MS : durée max d'inactivité d'une connexion
+- MONGO_WAIT_QUEUE_TIMEOUT_MS : attente max d'une connexion libre
+"""
+
+from typing import Optional
+import os
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from .metrics import mongo_command_listener
+
+logger = logging.getLogger(__name__)
+
+# Configuration MongoDB
+MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
+MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'gestion_notes')
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '60000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '10000'))
+
+
+class Database:
+    """
+    Point d'accès unique à MongoDB
+
+    Le client Motor est créé à la première utilisation (ou par connect()
+    au démarrage) et fermé par close() à l'arrêt de l'application.
+    Les collections s'obtiennent comme avec pymongo : db.users, db.grades...
+    """
+
+    def __init__(self):
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._database: Optional[AsyncIOMotorDatabase] = None
+
+    def connect(self) -> AsyncIOMotorDatabase:
+        """Ouvrir le pool de connexions (idempotent)"""
+        if self._client is None:
+            self._client = AsyncIOMotorClient(
+                MONGO_URL,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                event_listeners=[mongo_command_listener],
+            )
+            self._database = self._client[MONGO_DB_NAME]
+            logger.info(
+                f"Pool MongoDB ouvert ({MONGO_DB_NAME}, "
+                f"min={MONGO_MIN_POOL_SIZE}, max={MONGO_MAX_POOL_SIZE})"
+            )
+        return self._database
+
+    def attach(self, client, database_name: str = MONGO_DB_NAME) -> AsyncIOMotorDatabase:
+        """Utiliser un client déjà créé (bancs d'essai, base en mémoire)"""
+        self.close()
+        self._client = client
+        self._database = client[database_name]
+        return self._database
+
+    def close(self):
+        """Fermer le pool de connexions"""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._database = None
+            logger.info("Pool MongoDB fermé")
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        self.connect()
+        return self._client
+
+    @property
+    def database(self) -> AsyncIOMotorDatabase:
+        return self.connect()
+
+    def __getattr__(self, name: str):
+        # Accès aux collections : db.users, db.grades, ...
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.database[name]
+
+    def __getitem__(self, name: str):
+        return self.database[name]
+
+
+db = Database()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inscriptions des étudiants (collection enrollments)
+
+Une inscription rattache un étudiant à une matière, dans une classe et
+pour un semestre ; le triplet (étudiant, matière, semestre) est unique.
+Les inscriptions donnent le semestre des notes saisies sans semestre
+explicite et la liste des étudiants d'une classe.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .database import db
+
+
+async def enrollment_semesters(pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+    """
+    Semestre d'inscription de chaque couple (étudiant, matière)
+
+    Une requête pour tous les couples ; si un étudiant est inscrit à la
+    matière sur plusieurs semestres, l'inscription la plus récente l'emporte.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return {}
+    semesters: Dict[Tuple[str, str], str] = {}
+    async for enrollment in db.enrollments.find(
+        {
+            "student_id": {"$in": list({student_id for student_id, _ in pairs})},
+            "subject_id": {"$in": list({subject_id for _, subject_id in pairs})},
+        },
+        {"student_id": 1, "subject_id": 1, "semester": 1}
+    ).sort("enrollment_date", 1):
+        key = (enrollment["student_id"], enrollment["subject_id"])
+        if key in pairs:
+            semesters[key] = enrollment["semester"]
+    return semesters
+
+
+async def class_student_ids(class_ids: List[str], semester: Optional[str] = None) -> List[str]:
+    """Étudiants inscrits dans les classes données (éventuellement pour un semestre)"""
+    query: Dict[str, Any] = {"class_id": {"$in": class_ids}}
+    if semester is not None:
+        query["semester"] = semester
+    return await db.enrollments.distinct("student_id", query)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Réponses binaires servies depuis un fichier sur disque
+
+Le fichier est transmis par blocs (jamais chargé entier en mémoire) avec
+Content-Length, Content-Disposition et Accept-Ranges. Une requête Range
+portant sur un intervalle unique (bytes=debut-fin, bytes=debut-,
+bytes=-suffixe) reçoit une réponse 206 partielle, ce qui permet la
+reprise d'un téléchargement interrompu et l'affichage progressif des PDF
+par les navigateurs.
+
+La réponse porte un ETag (date de modification et taille du fichier) et
+Last-Modified. Une reprise accompagnée de If-Range n'obtient l'intervalle
+que si ce validateur correspond toujours au fichier (comparaison forte) ;
+sinon le fichier entier est servi, pour ne pas raccorder deux versions.
+"""
+
+from email.utils import formatdate
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+import hashlib
+import os
+import re
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    """En-tête Content-Disposition (encodage RFC 5987 des noms non ASCII)"""
+    quoted = quote(filename)
+    if quoted == filename:
+        return f'{disposition}; filename="{filename}"'
+    return f"{disposition}; filename*=utf-8''{quoted}"
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpréter un en-tête Range à intervalle unique
+
+    Retourne (début, fin) inclusifs, ou None si l'en-tête est ignoré
+    (plusieurs intervalles, syntaxe inconnue : le fichier entier est servi).
+    """
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # Suffixe : les N derniers octets
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Intervalle demandé invalide",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _validators(stat: os.stat_result) -> Tuple[str, str]:
+    """ETag et Last-Modified d'un fichier"""
+    version = f"{stat.st_mtime_ns}-{stat.st_size}".encode()
+    return f'"{hashlib.sha1(version).hexdigest()}"', formatdate(stat.st_mtime, usegmt=True)
+
+
+def _if_range_matches(if_range: Optional[str], etag: str, last_modified: str) -> bool:
+    """Un en-tête If-Range absent, ou égal à l'ETag ou à la date de modification"""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        # Un ETag faible ne valide jamais un intervalle
+        return if_range == etag
+    return if_range == last_modified
+
+
+def _iter_file(filepath: str, start: int, length: int) -> Iterator[bytes]:
+    """Lire length octets à partir de start, par blocs"""
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request: Request, filepath: str, media_type: str,
+                         filename: str, disposition: str = "attachment") -> StreamingResponse:
+    """Servir un fichier par blocs, en tenant compte des en-têtes Range et If-Range"""
+    stat = os.stat(filepath)
+    size = stat.st_size
+    etag, last_modified = _validators(stat)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(filename, disposition),
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    }
+
+    byte_range = None
+    if "range" in request.headers and _if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        byte_range = _parse_range(request.headers["range"], size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_iter_file(filepath, 0, size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        _iter_file(filepath, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Flux des changements de notes (Server-Sent Events)
+
+Les tableaux de bord s'abonnent à GET /api/grades/events au lieu
+d'interroger périodiquement les listes de notes et les moyennes : chaque
+création, modification ou suppression de note est poussée sous forme d'un
+delta compact (type, grade_id, student_id, subject_id, semester, value).
+
+Le bus est en mémoire, propre au processus. Il est alimenté :
+- par défaut, par les routes de notes (publish_grade_events) : un abonné ne
+  reçoit que les changements écrits par le worker auquel il est connecté
+- avec GRADE_EVENTS_CHANGE_STREAM=true, par un change stream MongoDB sur
+  grades (replica set requis) : les écritures de tous les workers sont
+  diffusées et les routes ne publient plus. Sans pré-images
+  (changeStreamPreAndPostImages, MongoDB 6+), une suppression ne porte que
+  grade_id et n'est reçue que par les abonnés sans filtre.
+
+Chaque abonné dispose d'une file bornée : s'il ne lit pas assez vite, ses
+événements en attente sont abandonnés et un événement resync lui demande
+de recharger ses données (de même après une interruption du change stream).
+
+Paramètres (variables d'environnement) :
+- GRADE_EVENTS_CHANGE_STREAM : source change stream (défaut false)
+- GRADE_EVENTS_QUEUE_SIZE : événements en attente par abonné (défaut 1000)
+- GRADE_EVENTS_KEEPALIVE_SECONDS : intervalle des commentaires de maintien
+  de la connexion (défaut 15)
+"""
+
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+import asyncio
+import json
+import logging
+import os
+
+from pymongo.errors import PyMongoError
+
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+GRADE_EVENTS_CHANGE_STREAM = os.getenv('GRADE_EVENTS_CHANGE_STREAM', 'false').lower() in ('1', 'true', 'yes')
+GRADE_EVENTS_QUEUE_SIZE = int(os.getenv('GRADE_EVENTS_QUEUE_SIZE', '1000'))
+GRADE_EVENTS_KEEPALIVE_SECONDS = float(os.getenv('GRADE_EVENTS_KEEPALIVE_SECONDS', '15'))
+
+EVENT_CREATED = "created"
+EVENT_UPDATED = "updated"
+EVENT_DELETED = "deleted"
+
+_CHANGE_TYPES = {
+    "insert": EVENT_CREATED,
+    "update": EVENT_UPDATED,
+    "replace": EVENT_UPDATED,
+    "delete": EVENT_DELETED,
+}
+
+
+def grade_delta(event_type: str, grade: Dict[str, Any]) -> Dict[str, Any]:
+    """Delta diffusé pour une note"""
+    return {
+        "type": event_type,
+        "grade_id": str(grade["_id"]),
+        "student_id": grade.get("student_id"),
+        "subject_id": grade.get("subject_id"),
+        "semester": grade.get("semester"),
+        "value": grade.get("value"),
+    }
+
+
+class GradeSubscriber:
+    """Abonné au flux, filtré par étudiant et/ou matière"""
+
+    def __init__(self, student_id: Optional[str] = None, subject_id: Optional[str] = None):
+        self.student_id = student_id
+        self.subject_id = subject_id
+        self.queue: asyncio.Queue = asyncio.Queue(GRADE_EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, delta: Dict[str, Any]) -> bool:
+        return (
+            (self.student_id is None or delta["student_id"] == self.student_id)
+            and (self.subject_id is None or delta["subject_id"] == self.subject_id)
+        )
+
+
+class GradeEventBus:
+    """Diffusion en mémoire des deltas aux abonnés du processus"""
+
+    def __init__(self):
+        self.subscribers = set()
+
+    def subscribe(self, student_id: Optional[str] = None,
+                  subject_id: Optional[str] = None) -> GradeSubscriber:
+        subscriber = GradeSubscriber(student_id, subject_id)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: GradeSubscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, deltas: List[Dict[str, Any]]):
+        """Remettre les deltas aux abonnés concernés (sans attente)"""
+        for subscriber in self.subscribers:
+            for delta in deltas:
+                if subscriber.overflowed or not subscriber.matches(delta):
+                    continue
+                try:
+                    subscriber.queue.put_nowait(delta)
+                except asyncio.QueueFull:
+                    subscriber.overflowed = True
+
+
+grade_event_bus = GradeEventBus()
+
+# Change stream ouvert : les routes ne publient plus
+_change_stream_active = False
+_watcher_task: Optional[asyncio.Task] = None
+
+
+def publish_grade_events(event_type: str, grades: Iterable[Dict[str, Any]]):
+    """Publier les changements écrits par une route (sauf si le change stream les diffuse)"""
+    if _change_stream_active or not grade_event_bus.subscribers:
+        return
+    grade_event_bus.publish([grade_delta(event_type, grade) for grade in grades])
+
+
+async def stream_grade_events(student_id: Optional[str] = None,
+                              subject_id: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Messages SSE d'un nouvel abonné, jusqu'à la déconnexion du client
+
+    L'abonnement n'est pris qu'au premier message envoyé : un client déconnecté
+    avant le début de la réponse ne laisse pas d'abonné orphelin.
+    """
+    subscriber = grade_event_bus.subscribe(student_id, subject_id)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            if subscriber.overflowed:
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.overflowed = False
+                yield "event: resync\ndata: {}\n\n"
+                continue
+            try:
+                delta = await asyncio.wait_for(subscriber.queue.get(), GRADE_EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: grade\ndata: {json.dumps(delta)}\n\n"
+    finally:
+        grade_event_bus.unsubscribe(subscriber)
+
+
+async def _watch_grade_changes():
+    """Alimenter le bus depuis le change stream de grades"""
+    global _change_stream_active
+    pipeline = [{"$match": {"operationType": {"$in": list(_CHANGE_TYPES)}}}]
+    opened = False
+    while True:
+        try:
+            async with db.grades.watch(
+                pipeline, full_document="updateLookup", full_document_before_change="whenAvailable"
+            ) as stream:
+                # Flux ouvert : les routes cessent de publier
+                _change_stream_active = opened = True
+                while stream.alive:
+                    change = await stream.try_next()
+                    if change is None:
+                        continue
+                    grade = (
+                        change.get("fullDocument") or change.get("fullDocumentBeforeChange")
+                        or change["documentKey"]
+                    )
+                    grade_event_bus.publish([grade_delta(_CHANGE_TYPES[change["operationType"]], grade)])
+            _change_stream_active = False
+        except PyMongoError as exc:
+            # Flux fermé : les routes publient de nouveau jusqu'à sa réouverture
+            _change_stream_active = False
+            if not opened:
+                logger.warning(f"Change stream indisponible, publication par les routes : {exc}")
+                return
+            logger.warning(f"Change stream des notes interrompu, réouverture : {exc}")
+        # Des changements ont pu être manqués : les abonnés rechargent leurs données
+        for subscriber in grade_event_bus.subscribers:
+            subscriber.overflowed = True
+        await asyncio.sleep(1)
+
+
+def start_grade_events():
+    """Démarrer la lecture du change stream si elle est activée"""
+    global _watcher_task
+    if GRADE_EVENTS_CHANGE_STREAM and _watcher_task is None:
+        _watcher_task = asyncio.create_task(_watch_grade_changes())
+
+
+def stop_grade_events():
+    """Arrêter la lecture du change stream"""
+    global _watcher_task, _change_stream_active
+    if _watcher_task is not None:
+        _watcher_task.cancel()
+        _watcher_task = None
+    _change_stream_active = False
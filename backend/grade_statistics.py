@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Statistiques de notes par classe et par matière
+
+Les moyennes de chaque étudiant sont calculées par des pipelines
+d'agrégation sur student_averages (somme et nombre de notes par matière
+et par semestre, cumulés par matière sauf si un semestre est demandé ;
+moyennes générales pondérées par weighted_average_pipeline) : une valeur
+par étudiant transite sur le réseau. Les calculs de classe (dispersion,
+histogramme, rang, percentile) sont vectorisés avec NumPy.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .database import db
+from .student_averages import AVERAGES_COLLECTION, get_general_averages
+
+# Histogramme sur l'échelle 0-20, par tranches de 2 points
+HISTOGRAM_BINS = np.linspace(0, 20, 11)
+
+
+def compute_statistics(student_ids: List[str], averages: np.ndarray) -> Dict[str, Any]:
+    """
+    Statistiques descriptives d'un ensemble de moyennes
+
+    Le rang est un rang de compétition (les ex æquo partagent le meilleur
+    rang) ; le percentile est la part des étudiants ayant une moyenne
+    strictement inférieure, les ex æquo comptant pour moitié.
+    """
+    count = len(averages)
+    if count == 0:
+        return {
+            "count": 0, "mean": 0, "median": 0, "std": 0, "min": 0, "max": 0,
+            "histogram": [], "ranking": []
+        }
+
+    histogram, edges = np.histogram(averages, bins=HISTOGRAM_BINS)
+
+    # Rangs et percentiles par recherche dichotomique dans les moyennes triées
+    sorted_averages = np.sort(averages)
+    below = np.searchsorted(sorted_averages, averages, side="left")
+    below_or_equal = np.searchsorted(sorted_averages, averages, side="right")
+    ranks = count - below_or_equal + 1
+    percentiles = (below + 0.5 * (below_or_equal - below)) / count * 100
+
+    order = np.argsort(-averages, kind="stable")
+    ranking = [
+        {
+            "student_id": student_ids[i],
+            "average": round(float(averages[i]), 2),
+            "rank": int(ranks[i]),
+            "percentile": round(float(percentiles[i]), 1),
+        }
+        for i in order
+    ]
+
+    return {
+        "count": count,
+        "mean": round(float(averages.mean()), 2),
+        "median": round(float(np.median(averages)), 2),
+        "std": round(float(averages.std()), 2),
+        "min": round(float(averages.min()), 2),
+        "max": round(float(averages.max()), 2),
+        "histogram": [
+            {"range": f"{int(edges[i])}-{int(edges[i + 1])}", "count": int(histogram[i])}
+            for i in range(len(histogram))
+        ],
+        "ranking": ranking,
+    }
+
+
+async def load_subject_averages(query: Dict[str, Any], semester: Optional[str] = None):
+    """
+    Moyennes d'une matière par étudiant, sous forme de tableaux NumPy
+
+    Les semestres sont cumulés par un $group côté MongoDB ; retourne
+    (student_ids, averages).
+    """
+    if semester is not None:
+        query = {**query, "semester": semester}
+    student_ids = []
+    averages = []
+    async for result in db[AVERAGES_COLLECTION].aggregate([
+        {"$match": {**query, "count": {"$gt": 0}}},
+        {"$group": {"_id": "$student_id", "sum": {"$sum": "$sum"}, "count": {"$sum": "$count"}}},
+        {"$project": {"average": {"$divide": ["$sum", "$count"]}}},
+    ]):
+        student_ids.append(result["_id"])
+        averages.append(result["average"])
+    return student_ids, np.asarray(averages, dtype=np.float64)
+
+
+async def subject_statistics(subject_id: str, student_ids: Optional[List[str]] = None,
+                             semester: Optional[str] = None) -> Dict[str, Any]:
+    """Statistiques des moyennes d'une matière (éventuellement restreintes à des étudiants)"""
+    query: Dict[str, Any] = {"subject_id": subject_id}
+    if student_ids is not None:
+        query["student_id"] = {"$in": student_ids}
+    ids, subject_averages = await load_subject_averages(query, semester)
+    return compute_statistics(ids, subject_averages)
+
+
+async def cohort_statistics(student_ids: List[str], semester: Optional[str] = None) -> Dict[str, Any]:
+    """Statistiques des moyennes générales pondérées d'un groupe d'étudiants"""
+    general_averages = await get_general_averages(student_ids, semester)
+    return compute_statistics(
+        list(general_averages), np.asarray(list(general_averages.values()), dtype=np.float64)
+    )
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gestion des index MongoDB
+
+Déclare les index nécessaires aux requêtes des routes et les crée au
+démarrage (create_indexes est idempotent). Les index uniques remplacent
+les vérifications d'unicité préalables : une insertion en doublon lève
+DuplicateKeyError.
+"""
+
+from typing import Any, Dict, List
+import logging
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+# Index requis, par collection
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel(
+            [("student_id_num", ASCENDING)], name="student_id_num_unique", unique=True,
+            partialFilterExpression={"student_id_num": {"$exists": True}}
+        ),
+        IndexModel(
+            [("teacher_id_num", ASCENDING)], name="teacher_id_num_unique", unique=True,
+            partialFilterExpression={"teacher_id_num": {"$exists": True}}
+        ),
+        IndexModel([("role", ASCENDING), ("_id", ASCENDING)], name="role_id"),
+    ],
+    "subjects": [
+        IndexModel([("subject_code", ASCENDING)], name="subject_code_unique", unique=True),
+    ],
+    "classes": [
+        IndexModel([("academic_year", ASCENDING), ("_id", ASCENDING)], name="academic_year_id"),
+    ],
+    "grades": [
+        # Clés composées avec _id : pagination par curseur des listes de notes
+        IndexModel([("student_id", ASCENDING), ("_id", ASCENDING)], name="student_id_id"),
+        IndexModel([("subject_id", ASCENDING), ("_id", ASCENDING)], name="subject_id_id"),
+        IndexModel([("recorded_by_teacher_id", ASCENDING)], name="recorded_by_teacher_id"),
+    ],
+    "enrollments": [
+        IndexModel(
+            [("student_id", ASCENDING), ("subject_id", ASCENDING), ("semester", ASCENDING)],
+            name="student_subject_semester_unique", unique=True
+        ),
+        # Étudiants d'une classe (statistiques, relevés groupés)
+        IndexModel([("class_id", ASCENDING), ("student_id", ASCENDING)], name="class_id_student_id"),
+    ],
+    "transcripts": [
+        # Préfixe student_id : relevés d'un étudiant ; clé complète : cache des relevés
+        IndexModel([("student_id", ASCENDING), ("content_hash", ASCENDING)], name="student_id_content_hash"),
+    ],
+    "student_averages": [
+        # Moyennes d'un étudiant, éventuellement pour un semestre
+        IndexModel([("student_id", ASCENDING), ("semester", ASCENDING)], name="student_id_semester"),
+        IndexModel([("subject_id", ASCENDING)], name="subject_id"),
+    ],
+}
+
+
+async def ensure_indexes():
+    """Créer les index manquants (sans effet sur les index déjà présents)"""
+    for collection, indexes in REQUIRED_INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as exc:
+                # Ex. : doublons existants empêchant un index unique
+                logger.error(
+                    f"Index {collection}.{index.document['name']} non créé : {exc}"
+                )
+
+
+async def index_report() -> Dict[str, Any]:
+    """
+    Comparer les index présents aux index requis
+
+    Retourne les index requis absents et les index présents jamais utilisés
+    depuis le démarrage du serveur MongoDB ($indexStats).
+    """
+    missing = []
+    unused = []
+    for collection, indexes in REQUIRED_INDEXES.items():
+        existing = {
+            index["name"] async for index in db[collection].list_indexes()
+        }
+        missing.extend(
+            f"{collection}.{index.document['name']}"
+            for index in indexes if index.document["name"] not in existing
+        )
+        try:
+            async for stats in db[collection].aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                    unused.append(f"{collection}.{stats['name']}")
+        except OperationFailure:
+            # $indexStats indisponible (droits insuffisants, moteur de test...)
+            pass
+    return {"missing": missing, "unused": unused}
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sérialisation JSON rapide des réponses (option FAST_JSON_RESPONSES)
+
+Par défaut, FastAPI revalide le contenu retourné par une route contre son
+response_model, le convertit par jsonable_encoder puis le sérialise avec
+json.dumps : pour une liste de notes, chaque GradeResponse est ainsi validé
+deux fois (construction puis sortie) avant d'être encodé.
+
+Avec FAST_JSON_RESPONSES=true (paquet orjson requis) :
+- ORJSONResponse devient la classe de réponse par défaut de l'application
+- les routes de liste construisent directement des dictionnaires aux champs
+  du modèle de réponse, à partir de documents écrits par l'API (donc déjà
+  validés), et les renvoient par trusted_response : pas de revalidation,
+  datetimes sérialisés par orjson (ISO 8601, comme Pydantic)
+
+Le schéma OpenAPI et le contenu des réponses sont inchangés ; sans l'option
+(ou sans orjson), les réponses suivent le chemin FastAPI habituel.
+"""
+
+from typing import Any, Optional
+import logging
+import os
+
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # option indisponible
+    orjson = None
+
+FAST_JSON_RESPONSES = os.getenv('FAST_JSON_RESPONSES', 'false').lower() in ('1', 'true', 'yes')
+
+if FAST_JSON_RESPONSES and orjson is None:
+    logger.warning("FAST_JSON_RESPONSES ignoré : le paquet orjson n'est pas installé")
+    FAST_JSON_RESPONSES = False
+
+# Classe de réponse par défaut de l'application
+DefaultJSONResponse = ORJSONResponse if FAST_JSON_RESPONSES else JSONResponse
+
+
+def fast_responses_enabled() -> bool:
+    """Les routes de liste doivent-elles renvoyer des réponses directes ?"""
+    return FAST_JSON_RESPONSES
+
+
+def trusted_response(content: Any, response: Optional[Response] = None) -> Response:
+    """
+    Réponse JSON construite sans validation par le response_model
+
+    content ne doit contenir que des types JSON, datetimes et énumérations
+    (dictionnaires aux champs du modèle de réponse). Les en-têtes positionnés
+    par la route sur response (ex. X-Next-Cursor) sont repris : FastAPI ne
+    les fusionne pas lorsqu'une route retourne elle-même une Response.
+    """
+    headers = {
+        name: value for name, value in response.headers.items() if name != "content-length"
+    } if response is not None else None
+    if orjson is None:
+        return JSONResponse(content=jsonable_encoder(content), headers=headers)
+    return ORJSONResponse(content=content, headers=headers)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Instrumentation des performances et métriques Prometheus
+
+- MetricsMiddleware (ASGI) : latence par route (gabarit de chemin, pas le
+  chemin réel, pour borner le nombre de séries), requêtes en cours, et
+  nombre / durée des commandes MongoDB émises par chaque requête ; les
+  flux Server-Sent Events (text/event-stream), ouverts pour de longues
+  durées, sont exclus de la latence et des requêtes en cours dès l'envoi
+  de leurs en-têtes et comptés à part (http_event_streams_open)
+- mongo_command_listener : écouteur de commandes pymongo enregistré sur
+  le client Motor ; chaque commande est attribuée à la requête active
+  par une variable de contexte (Motor copie le contexte dans ses threads)
+- PASSWORD_HASH_DURATION, RENDER_DURATION : temps bcrypt et temps de
+  rendu des relevés PDF et des exports
+
+Le détail des commandes par requête (détection des N+1) est décrit dans
+query_diagnostics.py.
+
+Les métriques sont exposées au format texte Prometheus par GET /metrics.
+Avec plusieurs workers, définir PROMETHEUS_MULTIPROC_DIR (répertoire
+partagé, vidé au démarrage) pour agréger les valeurs de tous les processus.
+"""
+
+from contextvars import ContextVar
+from typing import Optional
+import collections
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    generate_latest, multiprocess
+)
+from pymongo import monitoring
+from starlette.responses import Response
+from starlette.routing import Match
+
+from .query_diagnostics import diagnostics_enabled, finish_request, query_shape
+
+# Bornes adaptées aux nombres de commandes par requête (détection des N+1)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Durée de traitement des requêtes HTTP",
+    ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requêtes HTTP en cours de traitement",
+    ["method"], multiprocess_mode="livesum"
+)
+HTTP_EVENT_STREAMS_OPEN = Gauge(
+    "http_event_streams_open", "Flux Server-Sent Events ouverts",
+    ["route"], multiprocess_mode="livesum"
+)
+HTTP_REQUEST_MONGO_COMMANDS = Histogram(
+    "http_request_mongo_commands", "Nombre de commandes MongoDB par requête HTTP",
+    ["method", "route"], buckets=COMMAND_COUNT_BUCKETS
+)
+HTTP_REQUEST_MONGO_DURATION = Histogram(
+    "http_request_mongo_duration_seconds", "Temps cumulé des commandes MongoDB par requête HTTP",
+    ["method", "route"]
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "Durée des commandes MongoDB",
+    ["command"]
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Commandes MongoDB en échec",
+    ["command"]
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Durée des calculs bcrypt (hors attente dans le pool)",
+    ["operation"]
+)
+RENDER_DURATION = Histogram(
+    "render_duration_seconds", "Durée de rendu des documents (relevés PDF, exports)",
+    ["kind"], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    """Commandes MongoDB émises pendant le traitement d'une requête"""
+
+    __slots__ = ("route", "mongo_commands", "mongo_seconds", "shapes")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        # Formes des commandes, en mode diagnostic uniquement (query_diagnostics.py)
+        self.shapes = collections.Counter() if diagnostics_enabled() else None
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Statistiques de la requête HTTP en cours (None hors requête)"""
+    return _current_request.get()
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Mesurer les commandes MongoDB et les attribuer à la requête active"""
+
+    def started(self, event):
+        stats = _current_request.get()
+        if stats is not None and stats.shapes is not None:
+            shape = query_shape(event.command_name, event.command)
+            if shape is not None:
+                stats.shapes[shape] += 1
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_DURATION.labels(command=event.command_name).observe(seconds)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.mongo_commands += 1
+            stats.mongo_seconds += seconds
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        MONGO_COMMAND_FAILURES.labels(command=event.command_name).inc()
+        self._record(event)
+
+
+mongo_command_listener = MongoCommandListener()
+
+
+def _route_template(app, scope) -> str:
+    """Gabarit de la route correspondant à la requête (ex. /api/grades/{grade_id})"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Middleware ASGI de mesure des requêtes HTTP"""
+
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self.fastapi_app = fastapi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(_route_template(self.fastapi_app, scope))
+        status_code = 500
+        event_stream = False
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method=method)
+
+        async def send_wrapper(message):
+            nonlocal status_code, event_stream
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.startswith(b"text/event-stream"):
+                    # Connexion longue : plus une requête en cours de traitement
+                    event_stream = True
+                    in_progress.dec()
+                    HTTP_EVENT_STREAMS_OPEN.labels(route=stats.route).inc()
+            await send(message)
+
+        token = _current_request.set(stats)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if event_stream:
+                HTTP_EVENT_STREAMS_OPEN.labels(route=stats.route).dec()
+            else:
+                HTTP_REQUEST_DURATION.labels(
+                    method=method, route=stats.route, status=str(status_code)
+                ).observe(time.perf_counter() - start)
+                in_progress.dec()
+            HTTP_REQUEST_MONGO_COMMANDS.labels(method=method, route=stats.route).observe(stats.mongo_commands)
+            HTTP_REQUEST_MONGO_DURATION.labels(method=method, route=stats.route).observe(stats.mongo_seconds)
+            _current_request.reset(token)
+            if stats.shapes is not None:
+                finish_request(method, stats.route, stats.shapes)
+
+
+def metrics_response() -> Response:
+    """Métriques au format texte Prometheus (agrégées entre processus si besoin)"""
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
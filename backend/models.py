@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modèles de données et DTO de l'API
+
+Énumérations et modèles Pydantic partagés par les routes (server.py,
+api_routes.py, api_routes_part2.py) et la couche service (services.py) ;
+server.py les réexporte.
+"""
+
+from pydantic import BaseModel, Field, EmailStr
+from typing import List, Optional
+from datetime import datetime
+from enum import Enum
+
+# ===========================
+# MODÈLES DE DONNÉES (Équivalents aux entités Spring Boot)
+# ===========================
+
+class RoleEnum(str, Enum):
+    """Énumération des rôles utilisateur (équivalent à Role.java)"""
+    ADMIN = "ADMIN"
+    STUDENT = "STUDENT"
+    TEACHER = "TEACHER"
+
+class TranscriptStatusEnum(str, Enum):
+    """Statut des relevés de notes"""
+    PENDING = "PENDING"
+    GENERATED = "GENERATED"
+    ARCHIVED = "ARCHIVED"
+    ERROR = "ERROR"
+
+# ===========================
+# MODÈLES PYDANTIC (Équivalents aux DTOs Spring Boot)
+# ===========================
+
+class UserBase(BaseModel):
+    """Modèle de base utilisateur (équivalent à UserRequest.java)"""
+    username: str = Field(..., min_length=3, max_length=50)
+    firstname: str = Field(..., min_length=1, max_length=100)
+    lastname: str = Field(..., min_length=1, max_length=100)
+    email: EmailStr
+
+class UserCreate(UserBase):
+    """Modèle pour création d'utilisateur"""
+    password: str = Field(..., min_length=6, max_length=100)
+    role: RoleEnum
+
+class StudentCreate(UserBase):
+    """Modèle pour création d'étudiant (équivalent à StudentRequest.java)"""
+    password: str = Field(..., min_length=6, max_length=100)
+    student_id_num: str = Field(..., min_length=1, max_length=50)
+
+class TeacherCreate(UserBase):
+    """Modèle pour création d'enseignant (équivalent à TeacherRequest.java)"""
+    password: str = Field(..., min_length=6, max_length=100)
+    teacher_id_num: str = Field(..., min_length=1, max_length=50)
+
+class UserResponse(BaseModel):
+    """Réponse utilisateur (équivalent à UserResponse.java)"""
+    id: str
+    username: str
+    firstname: str
+    lastname: str
+    email: str
+    role: RoleEnum
+    created_at: datetime
+
+class StudentResponse(UserResponse):
+    """Réponse étudiant (équivalent à StudentResponse.java)"""
+    student_id_num: str
+
+class TeacherResponse(UserResponse):
+    """Réponse enseignant (équivalent à TeacherResponse.java)"""
+    teacher_id_num: str
+
+class LoginRequest(BaseModel):
+    """Demande de connexion (équivalent à LoginRequest.java)"""
+    username: str
+    password: str
+
+class LoginResponse(BaseModel):
+    """Réponse de connexion (équivalent à JwtResponse.java)"""
+    access_token: str
+    token_type: str = "bearer"
+    user: UserResponse
+
+class SubjectCreate(BaseModel):
+    """Création de matière (équivalent à SubjectRequest.java)"""
+    subject_code: str = Field(..., min_length=1, max_length=20)
+    name: str = Field(..., min_length=1, max_length=200)
+    coefficient: float = Field(1.0, ge=0.1, le=10.0)
+    description: Optional[str] = None
+
+class SubjectResponse(BaseModel):
+    """Réponse matière (équivalent à SubjectResponse.java)"""
+    id: str
+    subject_code: str
+    name: str
+    coefficient: float
+    description: Optional[str]
+    created_at: datetime
+
+class GradeCreate(BaseModel):
+    """Création de note (équivalent à GradeRequest.java)"""
+    student_id: str
+    subject_id: str
+    value: float = Field(..., ge=0, le=20)
+    comment: Optional[str] = None
+    recorded_by_teacher_id: Optional[str] = None
+    # Semestre de la note ; à défaut, celui de l'inscription de l'étudiant à la matière
+    semester: Optional[str] = Field(None, min_length=1, max_length=20)
+
+class GradeBulkCreate(BaseModel):
+    """Saisie groupée de notes (résultats d'un examen pour toute une classe)"""
+    grades: List[GradeCreate] = Field(..., min_length=1, max_length=1000)
+    ordered: bool = False  # True : arrêt à la première ligne en erreur
+
+class GradeUpdate(BaseModel):
+    """Modification de note (équivalent à GradeUpdateRequest.java)"""
+    value: Optional[float] = Field(None, ge=0, le=20)
+    comment: Optional[str] = None
+
+class GradeResponse(BaseModel):
+    """Réponse note (équivalent à GradeResponse.java)"""
+    id: str
+    value: float
+    date: datetime
+    comment: Optional[str]
+    student_id: str
+    student_name: str
+    subject_id: str
+    subject_name: str
+    subject_coefficient: float
+    recorded_by: Optional[str]
+    semester: Optional[str] = None
+    
+class ClassCreate(BaseModel):
+    """Création de classe (équivalent à ClassRequest.java)"""
+    name: str = Field(..., min_length=1, max_length=100)
+    academic_year: str = Field(..., min_length=7, max_length=9)  # Ex: 2024-2025
+
+class ClassResponse(BaseModel):
+    """Réponse classe (équivalent à ClassResponse.java)"""
+    id: str
+    name: str
+    academic_year: str
+    created_at: datetime
+
+class EnrollmentCreate(BaseModel):
+    """Inscription étudiant à une matière"""
+    student_id: str
+    subject_id: str
+    class_id: str
+    semester: str = Field(..., min_length=1, max_length=20)
+
+class EnrollmentResponse(BaseModel):
+    """Réponse inscription (équivalent à EnrollmentResponse.java)"""
+    id: str
+    student_id: str
+    subject_id: str
+    class_id: str
+    semester: str
+    enrollment_date: datetime
+
+class UserBulkDeleteRequest(BaseModel):
+    """Suppression groupée (liste d'utilisateurs, classe ou promotion d'une année)"""
+    user_ids: Optional[List[str]] = Field(None, min_length=1, max_length=10000)
+    class_id: Optional[str] = None
+    academic_year: Optional[str] = None
+
+class TranscriptBulkRequest(BaseModel):
+    """Génération groupée de relevés (une classe ou toute une année)"""
+    class_id: Optional[str] = None
+    academic_year: Optional[str] = None
+    semester: Optional[str] = None
+    format: str = Field("zip", pattern="^(zip|pdf)$")
+
+class TranscriptResponse(BaseModel):
+    """Réponse relevé de notes (équivalent à TranscriptResponse.java)"""
+    id: str
+    generation_date: datetime
+    status: TranscriptStatusEnum
+    filepath: str
+    student: StudentResponse
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pagination par curseur (keyset) des listes
+
+Contrat commun à toutes les routes de liste :
+- limit : nombre maximal d'éléments renvoyés (1 à MAX_PAGE_SIZE)
+- after : curseur opaque, valeur de l'en-tête X-Next-Cursor de la page
+  précédente ; absent pour la première page
+
+Les documents sont parcourus dans l'ordre de _id (index existant), une
+page coûte donc un parcours d'index borné quelle que soit sa position,
+contrairement à skip/offset. L'en-tête X-Next-Cursor n'est renvoyé que
+s'il reste des éléments.
+"""
+
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import Query, Response
+from pydantic import BaseModel
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """Paramètres de pagination (dépendance FastAPI)"""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None, description="Curseur X-Next-Cursor de la page précédente")
+    ):
+        self.limit = limit
+        self.after = after
+
+
+def projection_for(model: Type[BaseModel], extra: Optional[List[str]] = None) -> Dict[str, int]:
+    """Projection MongoDB limitée aux champs d'un modèle de réponse"""
+    fields = [name for name in model.model_fields if name != "id"]
+    return {field: 1 for field in fields + (extra or [])}
+
+
+async def fetch_page(collection, query: Dict[str, Any], projection: Dict[str, int],
+                     page: PageParams, response: Response) -> List[Dict[str, Any]]:
+    """Lire une page de documents et positionner l'en-tête X-Next-Cursor"""
+    if page.after is not None:
+        query = {**query, "_id": {"$gt": page.after}}
+
+    # Un document de plus que demandé indique l'existence d'une page suivante
+    documents = await collection.find(query, projection).sort("_id", 1).limit(
+        page.limit + 1
+    ).to_list(length=page.limit + 1)
+
+    if len(documents) > page.limit:
+        documents = documents[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = str(documents[-1]["_id"])
+    return documents
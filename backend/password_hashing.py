@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hachage des mots de passe hors de la boucle d'événements
+
+bcrypt coûte 100 à 300 ms de CPU par appel : exécuté directement dans une
+route async, il bloque toutes les autres requêtes. Les calculs sont donc
+confiés à un pool de threads borné (l'extension bcrypt libère le GIL, les
+threads s'exécutent réellement en parallèle). Au-delà d'un nombre de
+demandes en attente, les nouvelles demandes sont refusées immédiatement
+par une 503 avec Retry-After plutôt que d'allonger la file.
+
+Les imports groupés (user_import.py) hachent des milliers de mots de
+passe d'un coup : ils passent par un pool de processus distinct
+(get_password_hashes), réparti sur tous les cœurs, pour ne pas occuper
+le pool des connexions.
+
+Paramètres (variables d'environnement) :
+- PASSWORD_HASH_WORKERS : nombre de threads (défaut : nombre de cœurs)
+- PASSWORD_HASH_MAX_PENDING : demandes en cours ou en attente tolérées
+- PASSWORD_HASH_RETRY_AFTER : valeur de l'en-tête Retry-After (secondes)
+- PASSWORD_IMPORT_WORKERS : processus de hachage des imports groupés
+  (défaut : nombre de cœurs)
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+import asyncio
+import multiprocessing
+import os
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .metrics import PASSWORD_HASH_DURATION
+
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 8)))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', '1'))
+PASSWORD_IMPORT_WORKERS = int(os.getenv('PASSWORD_IMPORT_WORKERS', str(os.cpu_count() or 2)))
+
+# Configuration du hachage des mots de passe
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+_import_executor: Optional[ProcessPoolExecutor] = None
+
+
+async def _run_in_pool(func, *args):
+    """Exécuter un calcul bcrypt dans le pool, ou refuser si la file est pleine"""
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Serveur momentanément surchargé, veuillez réessayer",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+        )
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+
+
+def _timed_verify(plain_password: str, hashed_password: str) -> bool:
+    with PASSWORD_HASH_DURATION.labels(operation="verify").time():
+        return pwd_context.verify(plain_password, hashed_password)
+
+
+def _timed_hash(password: str) -> str:
+    with PASSWORD_HASH_DURATION.labels(operation="hash").time():
+        return pwd_context.hash(password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Vérifier le mot de passe"""
+    return await _run_in_pool(_timed_verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password: str) -> str:
+    """Hasher le mot de passe"""
+    return await _run_in_pool(_timed_hash, password)
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _get_import_pool() -> ProcessPoolExecutor:
+    """Pool de processus des imports groupés, créé à la première utilisation"""
+    global _import_executor
+    if _import_executor is None:
+        _import_executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_IMPORT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _import_executor
+
+
+async def get_password_hashes(passwords: List[str]) -> List[str]:
+    """Hasher un lot de mots de passe, réparti sur les processus du pool d'import"""
+    if not passwords:
+        return []
+    loop = asyncio.get_running_loop()
+    size = -(-len(passwords) // PASSWORD_IMPORT_WORKERS)
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    with PASSWORD_HASH_DURATION.labels(operation="hash_batch").time():
+        results = await asyncio.gather(*(
+            loop.run_in_executor(_get_import_pool(), _hash_passwords, chunk) for chunk in chunks
+        ))
+    return [hashed for chunk in results for hashed in chunk]
+
+
+def pending_hash_count() -> int:
+    """Nombre de calculs bcrypt en cours ou en attente"""
+    return _pending
+
+
+def shutdown_password_pool():
+    """Arrêter les pools de hachage"""
+    global _import_executor
+    _executor.shutdown(wait=False, cancel_futures=True)
+    if _import_executor is not None:
+        _import_executor.shutdown(wait=False, cancel_futures=True)
+        _import_executor = None
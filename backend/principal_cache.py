@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des utilisateurs authentifiés (principal)
+
+get_current_user relisait l'utilisateur en base à chaque requête
+authentifiée. Le document utilisateur (sans le mot de passe) est désormais
+conservé en mémoire, indexé par le sujet du token, avec une durée de vie
+courte et une taille bornée (LRU).
+
+Le cache est propre à chaque processus : delete_user et toute
+modification de rôle doivent appeler invalidate_principal ; dans un
+déploiement à plusieurs workers, la durée de vie borne le délai de
+propagation aux autres processus.
+
+Paramètres (variables d'environnement) :
+- PRINCIPAL_CACHE_TTL_SECONDS : durée de vie d'une entrée (0 = cache désactivé)
+- PRINCIPAL_CACHE_MAX_SIZE : nombre maximal d'entrées
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import os
+import time
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv('PRINCIPAL_CACHE_MAX_SIZE', '10000'))
+
+
+class PrincipalCache:
+    """Cache LRU à durée de vie des utilisateurs authentifiés"""
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._usernames_by_id: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        """Obtenir l'utilisateur en cache, ou None s'il est absent ou expiré"""
+        entry = self._entries.get(username)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(username)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, username: str, user: Dict[str, Any]):
+        """Mettre un utilisateur en cache"""
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[username] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(username)
+        self._usernames_by_id[str(user["_id"])] = username
+        while len(self._entries) > self.max_size:
+            _, (_, oldest_user) = self._entries.popitem(last=False)
+            self._usernames_by_id.pop(str(oldest_user["_id"]), None)
+
+    def invalidate(self, user_id: Optional[str] = None, username: Optional[str] = None):
+        """Retirer un utilisateur du cache (par ID ou par nom d'utilisateur)"""
+        if user_id is not None:
+            username = self._usernames_by_id.get(str(user_id), username)
+        if username is not None:
+            self._remove(username)
+
+    def clear(self):
+        """Vider le cache"""
+        self._entries.clear()
+        self._usernames_by_id.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques d'utilisation du cache"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, username: str):
+        entry = self._entries.pop(username, None)
+        if entry is not None:
+            self._usernames_by_id.pop(str(entry[1]["_id"]), None)
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_SIZE)
+
+
+def invalidate_principal(user_id: Optional[str] = None, username: Optional[str] = None):
+    """Invalider l'utilisateur en cache (suppression, changement de rôle...)"""
+    principal_cache.invalidate(user_id=user_id, username=username)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Détection des requêtes lentes en nombre de commandes et des N+1
+
+En mode diagnostic, chaque commande MongoDB est attribuée à la requête
+HTTP active (voir metrics.py) avec sa « forme » : commande, collection et
+structure du filtre, les valeurs étant remplacées par "?". En fin de
+requête, un avertissement est journalisé avec la route et les formes en
+cause si :
+- le nombre de commandes dépasse QUERY_DIAGNOSTICS_MAX_QUERIES ;
+- une même forme est répétée plus de QUERY_DIAGNOSTICS_MAX_REPEATS fois
+  (symptôme d'un find_one exécuté dans une boucle).
+
+Les lectures de la suite d'un curseur (getMore) et les commandes internes
+du pilote ne sont pas comptées.
+
+Paramètres (variables d'environnement, à activer en développement ou en
+préproduction) :
+- QUERY_DIAGNOSTICS : 1 pour activer le mode diagnostic
+- QUERY_DIAGNOSTICS_MAX_QUERIES : commandes tolérées par requête (défaut 20)
+- QUERY_DIAGNOSTICS_MAX_REPEATS : répétitions tolérées d'une forme (défaut 5)
+
+query_budget() permet aux tests d'échouer si une route régresse :
+
+    with query_budget(max_queries=5, max_repeats=1):
+        client.get("/api/grades/student/...")
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+QUERY_DIAGNOSTICS = os.getenv('QUERY_DIAGNOSTICS', '0') == '1'
+QUERY_DIAGNOSTICS_MAX_QUERIES = int(os.getenv('QUERY_DIAGNOSTICS_MAX_QUERIES', '20'))
+QUERY_DIAGNOSTICS_MAX_REPEATS = int(os.getenv('QUERY_DIAGNOSTICS_MAX_REPEATS', '5'))
+
+# Commandes non significatives pour le diagnostic
+IGNORED_COMMANDS = {
+    "getMore", "killCursors", "endSessions", "hello", "isMaster", "ismaster",
+    "ping", "buildInfo", "saslStart", "saslContinue", "authenticate",
+}
+
+# Champ portant le filtre, par commande
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+# Budgets actifs (query_budget) : chacun reçoit les rapports des requêtes
+_budgets: List[List[Dict[str, Any]]] = []
+
+
+def diagnostics_enabled() -> bool:
+    """Le suivi des formes de requêtes est-il actif ?"""
+    return QUERY_DIAGNOSTICS or bool(_budgets)
+
+
+def _shape(value: Any) -> Any:
+    """Structure d'une valeur de filtre, sans les valeurs elles-mêmes"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [_shape(value[0])]
+    return "?"
+
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> Optional[str]:
+    """Forme d'une commande MongoDB, ou None si elle n'est pas diagnostiquée"""
+    if command_name in IGNORED_COMMANDS:
+        return None
+    collection = command.get(command_name)
+    if command_name in FILTER_FIELDS:
+        detail = _shape(command.get(FILTER_FIELDS[command_name]) or {})
+    elif command_name == "aggregate":
+        detail = [next(iter(stage)) for stage in command.get("pipeline", [])]
+    elif command_name in ("update", "delete"):
+        statements = command.get(f"{command_name}s") or [{}]
+        detail = _shape(statements[0].get("q") or {})
+    else:
+        detail = None
+    return json.dumps([command_name, collection, detail], sort_keys=True, default=str)
+
+
+def analyze(shapes: Counter, max_queries: Optional[int] = None,
+            max_repeats: Optional[int] = None) -> List[str]:
+    """Anomalies d'une requête au regard des seuils donnés"""
+    problems = []
+    total = sum(shapes.values())
+    if max_queries is not None and total > max_queries:
+        problems.append(f"{total} commandes MongoDB (seuil {max_queries})")
+    if max_repeats is not None:
+        problems.extend(
+            f"forme répétée {count} fois (seuil {max_repeats}) : {shape}"
+            for shape, count in shapes.most_common() if count > max_repeats
+        )
+    return problems
+
+
+def finish_request(method: str, route: str, shapes: Counter):
+    """Diagnostiquer une requête terminée (appelé par le middleware de mesure)"""
+    if QUERY_DIAGNOSTICS:
+        problems = analyze(shapes, QUERY_DIAGNOSTICS_MAX_QUERIES, QUERY_DIAGNOSTICS_MAX_REPEATS)
+        if problems:
+            logger.warning(f"Requête {method} {route} : " + " ; ".join(problems))
+    for reports in _budgets:
+        reports.append({"method": method, "route": route, "shapes": shapes})
+
+
+@contextmanager
+def query_budget(max_queries: Optional[int] = None, max_repeats: Optional[int] = 1):
+    """
+    Échouer (AssertionError) si une requête HTTP traitée dans le bloc
+    dépasse le budget de commandes MongoDB
+    """
+    reports: List[Dict[str, Any]] = []
+    _budgets.append(reports)
+    try:
+        yield reports
+    finally:
+        _budgets.remove(reports)
+
+    failures = []
+    for report in reports:
+        problems = analyze(report["shapes"], max_queries, max_repeats)
+        if problems:
+            failures.append(f"{report['method']} {report['route']} : " + " ; ".join(problems))
+    assert not failures, "Budget de requêtes dépassé\n" + "\n".join(failures)
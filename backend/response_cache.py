@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des réponses pour les données de référence (matières, classes)
+
+Les réponses JSON sont conservées sérialisées avec leur ETag : une
+requête dont l'en-tête If-None-Match correspond (liste d'ETags, "*",
+comparaison faible : W/"x" correspond à "x") reçoit une 304 sans corps,
+les autres reçoivent le corps en cache sans interroger MongoDB.
+
+Les clés sont regroupées par espace de noms ("subjects", "classes") ;
+invalidate() incrémente la version de l'espace, ce qui rend toutes ses
+entrées inaccessibles (elles expirent ensuite d'elles-mêmes).
+
+Paramètres (variables d'environnement) :
+- RESPONSE_CACHE_URL : redis://... pour un cache partagé entre processus
+  (tout serveur compatible Redis convient ; nécessite le paquet redis),
+  sinon cache LRU en mémoire du processus
+- RESPONSE_CACHE_TTL_SECONDS : durée de vie des entrées (défaut 300)
+- RESPONSE_CACHE_MAX_ENTRIES : taille du cache en mémoire (défaut 1000)
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL', '')
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '300'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+
+# En-têtes de la réponse d'origine conservés avec le corps
+CACHED_HEADERS = ("X-Next-Cursor",)
+
+
+class InMemoryCache:
+    """Cache LRU à durée de vie, propre au processus"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl_seconds: int):
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    async def bump_version(self, namespace: str):
+        self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+
+class RedisCache:
+    """Cache partagé sur un serveur compatible Redis"""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("RESPONSE_CACHE_URL nécessite le paquet redis") from exc
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: int):
+        await self._client.set(key, value, ex=ttl_seconds)
+
+    async def get_version(self, namespace: str) -> int:
+        version = await self._client.get(f"version:{namespace}")
+        return int(version) if version else 0
+
+    async def bump_version(self, namespace: str):
+        await self._client.incr(f"version:{namespace}")
+
+
+def _create_backend():
+    if RESPONSE_CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+        logger.info("Cache des réponses : serveur Redis")
+        return RedisCache(RESPONSE_CACHE_URL)
+    return InMemoryCache(RESPONSE_CACHE_MAX_ENTRIES)
+
+
+# Un ETag d'une liste If-None-Match (la valeur entre guillemets peut contenir des virgules)
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Vrai si l'en-tête If-None-Match désigne etag
+
+    Comparaison faible (RFC 9110, 13.1.2) : le préfixe W/ est ignoré.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _ENTITY_TAG.fullmatch(etag).group(1)
+    return opaque in _ENTITY_TAG.findall(if_none_match)
+
+
+class ResponseCache:
+    """Cache de réponses JSON avec ETag, par espace de noms"""
+
+    def __init__(self, backend, ttl_seconds: int):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    async def _full_key(self, namespace: str, key: str) -> str:
+        version = await self.backend.get_version(namespace)
+        return f"response:{namespace}:{version}:{key}"
+
+    async def invalidate(self, namespace: str):
+        """Invalider toutes les réponses d'un espace de noms (après écriture)"""
+        await self.backend.bump_version(namespace)
+
+    async def respond(self, request: Request, namespace: str, key: str,
+                      producer: Callable[[Response], Awaitable[Any]]) -> Response:
+        """
+        Servir une réponse depuis le cache, ou la produire et la mettre en cache
+
+        producer reçoit une Response où positionner des en-têtes (ex.
+        X-Next-Cursor) et retourne les données à sérialiser.
+        """
+        full_key = await self._full_key(namespace, key)
+        cached = await self.backend.get(full_key)
+        if cached is not None:
+            self.hits += 1
+            entry = json.loads(cached)
+        else:
+            self.misses += 1
+            produced_headers = Response()
+            payload = await producer(produced_headers)
+            body = json.dumps(jsonable_encoder(payload), ensure_ascii=False)
+            entry = {
+                "body": body,
+                "etag": f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"',
+                "headers": {
+                    name: produced_headers.headers[name]
+                    for name in CACHED_HEADERS if name in produced_headers.headers
+                },
+            }
+            await self.backend.set(full_key, json.dumps(entry).encode("utf-8"), self.ttl_seconds)
+
+        headers = {"ETag": entry["etag"], "Cache-Control": "private, no-cache", **entry["headers"]}
+        if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques d'utilisation du cache"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(_create_backend(), RESPONSE_CACHE_TTL_SECONDS)
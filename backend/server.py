@@ -14,19 +14,15 @@ Fonctionnalités :
 Auteur : Système de Gestion Scolaire
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile
+from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
-from pymongo import MongoClient
-from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 import uuid
 import os
-from enum import Enum
 import logging
 
 # Configuration
@@ -34,13 +30,32 @@ SECRET_KEY = "votre-clé-secrète-jwt-très-sécurisée"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 heures
 
-# Configuration MongoDB
-MONGO_URL = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-client = MongoClient(MONGO_URL)
-db = client.gestion_notes
-
-# Configuration du hachage des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Configuration MongoDB (accès asynchrone, voir database.py)
+from .database import db
+# Modèles de données et DTO (voir models.py), réexportés pour les routeurs
+from .models import (
+    RoleEnum, TranscriptStatusEnum, UserBase, UserCreate, StudentCreate, TeacherCreate,
+    UserResponse, StudentResponse, TeacherResponse, LoginRequest, LoginResponse, SubjectCreate,
+    SubjectResponse, GradeCreate, GradeBulkCreate, GradeUpdate, GradeResponse, ClassCreate,
+    ClassResponse, EnrollmentCreate, EnrollmentResponse, UserBulkDeleteRequest,
+    TranscriptBulkRequest, TranscriptResponse
+)
+from .metrics import MetricsMiddleware, metrics_response
+from .student_averages import (
+    init_student_averages, start_averages_reconciliation, stop_averages_reconciliation
+)
+from .principal_cache import principal_cache, invalidate_principal
+from .response_cache import response_cache
+from .indexes import ensure_indexes, index_report
+from .transcript_jobs import shutdown_render_pool, start_transcript_recovery, stop_transcript_recovery
+from .user_deletion import start_deletion_recovery, stop_deletion_recovery
+from .grade_events import start_grade_events, stop_grade_events
+from .pagination import NEXT_CURSOR_HEADER
+from .json_responses import DefaultJSONResponse
+from .services import to_response
+
+# Configuration du hachage des mots de passe (pool borné, voir password_hashing.py)
+from .password_hashing import verify_password, get_password_hash, shutdown_password_pool
 
 # Configuration de l'authentification
 security = HTTPBearer()
@@ -52,7 +67,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Système de Gestion des Notes - API",
     description="API REST pour la gestion des notes scolaires/universitaires",
-    version="1.0.0"
+    version="1.0.0",
+    # ORJSONResponse si FAST_JSON_RESPONSES (voir json_responses.py)
+    default_response_class=DefaultJSONResponse
 )
 
 # Configuration CORS
@@ -62,160 +79,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Content-Disposition", "X-Transcript-Id"],
 )
 
-# ===========================
-# MODÈLES DE DONNÉES (Équivalents aux entités Spring Boot)
-# ===========================
-
-class RoleEnum(str, Enum):
-    """Énumération des rôles utilisateur (équivalent à Role.java)"""
-    ADMIN = "ADMIN"
-    STUDENT = "STUDENT"
-    TEACHER = "TEACHER"
-
-class TranscriptStatusEnum(str, Enum):
-    """Statut des relevés de notes"""
-    GENERATED = "GENERATED"
-    ARCHIVED = "ARCHIVED"
-    ERROR = "ERROR"
-
-# ===========================
-# MODÈLES PYDANTIC (Équivalents aux DTOs Spring Boot)
-# ===========================
-
-class UserBase(BaseModel):
-    """Modèle de base utilisateur (équivalent à UserRequest.java)"""
-    username: str = Field(..., min_length=3, max_length=50)
-    firstname: str = Field(..., min_length=1, max_length=100)
-    lastname: str = Field(..., min_length=1, max_length=100)
-    email: EmailStr
-
-class UserCreate(UserBase):
-    """Modèle pour création d'utilisateur"""
-    password: str = Field(..., min_length=6, max_length=100)
-    role: RoleEnum
-
-class StudentCreate(UserBase):
-    """Modèle pour création d'étudiant (équivalent à StudentRequest.java)"""
-    password: str = Field(..., min_length=6, max_length=100)
-    student_id_num: str = Field(..., min_length=1, max_length=50)
-
-class TeacherCreate(UserBase):
-    """Modèle pour création d'enseignant (équivalent à TeacherRequest.java)"""
-    password: str = Field(..., min_length=6, max_length=100)
-    teacher_id_num: str = Field(..., min_length=1, max_length=50)
-
-class UserResponse(BaseModel):
-    """Réponse utilisateur (équivalent à UserResponse.java)"""
-    id: str
-    username: str
-    firstname: str
-    lastname: str
-    email: str
-    role: RoleEnum
-    created_at: datetime
-
-class StudentResponse(UserResponse):
-    """Réponse étudiant (équivalent à StudentResponse.java)"""
-    student_id_num: str
-
-class TeacherResponse(UserResponse):
-    """Réponse enseignant (équivalent à TeacherResponse.java)"""
-    teacher_id_num: str
-
-class LoginRequest(BaseModel):
-    """Demande de connexion (équivalent à LoginRequest.java)"""
-    username: str
-    password: str
-
-class LoginResponse(BaseModel):
-    """Réponse de connexion (équivalent à JwtResponse.java)"""
-    access_token: str
-    token_type: str = "bearer"
-    user: UserResponse
-
-class SubjectCreate(BaseModel):
-    """Création de matière (équivalent à SubjectRequest.java)"""
-    subject_code: str = Field(..., min_length=1, max_length=20)
-    name: str = Field(..., min_length=1, max_length=200)
-    coefficient: float = Field(1.0, ge=0.1, le=10.0)
-    description: Optional[str] = None
-
-class SubjectResponse(BaseModel):
-    """Réponse matière (équivalent à SubjectResponse.java)"""
-    id: str
-    subject_code: str
-    name: str
-    coefficient: float
-    description: Optional[str]
-    created_at: datetime
-
-class GradeCreate(BaseModel):
-    """Création de note (équivalent à GradeRequest.java)"""
-    student_id: str
-    subject_id: str
-    value: float = Field(..., ge=0, le=20)
-    comment: Optional[str] = None
-    recorded_by_teacher_id: Optional[str] = None
-
-class GradeUpdate(BaseModel):
-    """Modification de note (équivalent à GradeUpdateRequest.java)"""
-    value: Optional[float] = Field(None, ge=0, le=20)
-    comment: Optional[str] = None
-
-class GradeResponse(BaseModel):
-    """Réponse note (équivalent à GradeResponse.java)"""
-    id: str
-    value: float
-    date: datetime
-    comment: Optional[str]
-    student_id: str
-    student_name: str
-    subject_id: str
-    subject_name: str
-    subject_coefficient: float
-    recorded_by: Optional[str]
-    
-class ClassCreate(BaseModel):
-    """Création de classe (équivalent à ClassRequest.java)"""
-    name: str = Field(..., min_length=1, max_length=100)
-    academic_year: str = Field(..., min_length=7, max_length=9)  # Ex: 2024-2025
-
-class ClassResponse(BaseModel):
-    """Réponse classe (équivalent à ClassResponse.java)"""
-    id: str
-    name: str
-    academic_year: str
-    created_at: datetime
-
-class EnrollmentCreate(BaseModel):
-    """Inscription étudiant à une matière"""
-    student_id: str
-    subject_id: str
-    class_id: str
-    semester: str = Field(..., min_length=1, max_length=20)
-
-class TranscriptResponse(BaseModel):
-    """Réponse relevé de notes (équivalent à TranscriptResponse.java)"""
-    id: str
-    generation_date: datetime
-    status: TranscriptStatusEnum
-    filepath: str
-    student: StudentResponse
+# Mesure des requêtes (latence, commandes MongoDB) exposée sur /metrics
+app.add_middleware(MetricsMiddleware, fastapi_app=app)
 
 # ===========================
 # FONCTIONS UTILITAIRES
 # ===========================
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Vérifier le mot de passe"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    """Hasher le mot de passe"""
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Créer un token JWT"""
     to_encode = data.copy()
@@ -242,9 +115,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise credentials_exception
     
-    user = db.users.find_one({"username": username})
+    user = principal_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await db.users.find_one({"username": username}, {"password": 0})
+        if user is None:
+            raise credentials_exception
+        principal_cache.put(username, user)
     return user
 
 def require_role(required_roles: List[RoleEnum]):
@@ -269,8 +145,8 @@ async def login(login_request: LoginRequest):
     
     Vérifie les informations d'identification et retourne un token JWT
     """
-    user = db.users.find_one({"username": login_request.username})
-    if not user or not verify_password(login_request.password, user["password"]):
+    user = await db.users.find_one({"username": login_request.username})
+    if not user or not await verify_password(login_request.password, user["password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Nom d'utilisateur ou mot de passe incorrect",
@@ -282,188 +158,115 @@ async def login(login_request: LoginRequest):
         data={"sub": user["username"]}, expires_delta=access_token_expires
     )
     
-    user_response = UserResponse(
-        id=str(user["_id"]),
-        username=user["username"],
-        firstname=user["firstname"],
-        lastname=user["lastname"],
-        email=user["email"],
-        role=user["role"],
-        created_at=user["created_at"]
-    )
-    
-    return LoginResponse(access_token=access_token, user=user_response)
+    return LoginResponse(access_token=access_token, user=to_response(UserResponse, user))
 
 @app.get("/api/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Obtenir les informations de l'utilisateur connecté"""
-    return UserResponse(
-        id=str(current_user["_id"]),
-        username=current_user["username"],
-        firstname=current_user["firstname"],
-        lastname=current_user["lastname"],
-        email=current_user["email"],
-        role=current_user["role"],
-        created_at=current_user["created_at"]
-    )
+    return to_response(UserResponse, current_user)
 
 # ===========================
-# ROUTES GESTION UTILISATEURS (Équivalent UserController.java)
+# ROUTES STATISTIQUES DES CACHES
 # ===========================
 
-@app.post("/api/admin/users/students", response_model=StudentResponse)
-async def register_student(
-    student_request: StudentCreate,
+@app.get("/api/admin/cache/principals")
+async def get_principal_cache_stats(
     current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
 ):
-    """
-    Enregistrer un nouvel étudiant (équivalent à registerStudent)
-    Accessible uniquement aux administrateurs
-    """
-    # Vérifier l'unicité du nom d'utilisateur et email
-    if db.users.find_one({"username": student_request.username}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce nom d'utilisateur existe déjà"
-        )
-    
-    if db.users.find_one({"email": student_request.email}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cette adresse email existe déjà"
-        )
-    
-    if db.users.find_one({"student_id_num": student_request.student_id_num}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce numéro étudiant existe déjà"
-        )
-    
-    # Créer l'étudiant
-    student_id = str(uuid.uuid4())
-    student_data = {
-        "_id": student_id,
-        "username": student_request.username,
-        "password": get_password_hash(student_request.password),
-        "firstname": student_request.firstname,
-        "lastname": student_request.lastname,
-        "email": student_request.email,
-        "role": RoleEnum.STUDENT.value,
-        "student_id_num": student_request.student_id_num,
-        "created_at": datetime.utcnow()
-    }
-    
-    db.users.insert_one(student_data)
-    logger.info(f"Nouvel étudiant créé : {student_request.username}")
-    
-    return StudentResponse(
-        id=student_id,
-        username=student_request.username,
-        firstname=student_request.firstname,
-        lastname=student_request.lastname,
-        email=student_request.email,
-        role=RoleEnum.STUDENT,
-        student_id_num=student_request.student_id_num,
-        created_at=datetime.utcnow()
-    )
+    """Statistiques du cache des utilisateurs authentifiés (taux de succès)"""
+    return principal_cache.stats()
 
-@app.post("/api/admin/users/teachers", response_model=TeacherResponse)
-async def register_teacher(
-    teacher_request: TeacherCreate,
+@app.get("/api/admin/cache/responses")
+async def get_response_cache_stats(
     current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
 ):
-    """
-    Enregistrer un nouvel enseignant (équivalent à registerTeacher)
-    Accessible uniquement aux administrateurs
-    """
-    # Vérifier l'unicité
-    if db.users.find_one({"username": teacher_request.username}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce nom d'utilisateur existe déjà"
-        )
-    
-    if db.users.find_one({"email": teacher_request.email}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cette adresse email existe déjà"
-        )
-    
-    if db.users.find_one({"teacher_id_num": teacher_request.teacher_id_num}):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ce numéro enseignant existe déjà"
-        )
-    
-    # Créer l'enseignant
-    teacher_id = str(uuid.uuid4())
-    teacher_data = {
-        "_id": teacher_id,
-        "username": teacher_request.username,
-        "password": get_password_hash(teacher_request.password),
-        "firstname": teacher_request.firstname,
-        "lastname": teacher_request.lastname,
-        "email": teacher_request.email,
-        "role": RoleEnum.TEACHER.value,
-        "teacher_id_num": teacher_request.teacher_id_num,
-        "created_at": datetime.utcnow()
-    }
-    
-    db.users.insert_one(teacher_data)
-    logger.info(f"Nouvel enseignant créé : {teacher_request.username}")
-    
-    return TeacherResponse(
-        id=teacher_id,
-        username=teacher_request.username,
-        firstname=teacher_request.firstname,
-        lastname=teacher_request.lastname,
-        email=teacher_request.email,
-        role=RoleEnum.TEACHER,
-        teacher_id_num=teacher_request.teacher_id_num,
-        created_at=datetime.utcnow()
-    )
-
-@app.get("/api/admin/users", response_model=List[UserResponse])
-async def get_all_users(
-    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
-):
-    """
-    Obtenir tous les utilisateurs (équivalent à getAllUsers)
-    Accessible uniquement aux administrateurs
-    """
-    users = list(db.users.find({}))
-    return [
-        UserResponse(
-            id=str(user["_id"]),
-            username=user["username"],
-            firstname=user["firstname"],
-            lastname=user["lastname"],
-            email=user["email"],
-            role=user["role"],
-            created_at=user["created_at"]
-        )
-        for user in users
-    ]
+    """Statistiques du cache des réponses (matières, classes)"""
+    return response_cache.stats()
 
 # Initialisation de l'admin par défaut
 @app.on_event("startup")
 async def create_default_admin():
     """Créer un administrateur par défaut au démarrage"""
-    admin_exists = db.users.find_one({"username": "admin"})
+    db.connect()
+    admin_exists = await db.users.find_one({"username": "admin"})
     if not admin_exists:
         admin_user = {
             "_id": str(uuid.uuid4()),
             "username": "admin",
-            "password": get_password_hash("adminpass"),
+            "password": await get_password_hash("adminpass"),
             "firstname": "Admin",
             "lastname": "Système",
             "email": "admin@example.com",
             "role": RoleEnum.ADMIN.value,
             "created_at": datetime.utcnow()
         }
-        db.users.insert_one(admin_user)
+        await db.users.insert_one(admin_user)
         logger.info("Administrateur par défaut créé : admin/adminpass")
 
+@app.on_event("startup")
+async def init_indexes():
+    """Créer les index MongoDB requis par les routes"""
+    await ensure_indexes()
+    report = await index_report()
+    if report["missing"]:
+        logger.warning(f"Index manquants : {', '.join(report['missing'])}")
+
+@app.get("/api/admin/indexes")
+async def get_index_report(
+    current_user: dict = Depends(require_role([RoleEnum.ADMIN]))
+):
+    """Rapport des index MongoDB manquants ou inutilisés"""
+    return await index_report()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Métriques de performance au format texte Prometheus"""
+    return metrics_response()
+
+@app.on_event("startup")
+async def init_averages():
+    """Initialiser les moyennes pré-agrégées puis lancer leur réconciliation périodique"""
+    await init_student_averages()
+    start_averages_reconciliation()
+
+@app.on_event("startup")
+async def resume_deletions():
+    """Reprendre les suppressions en cascade abandonnées (bail expiré)"""
+    start_deletion_recovery()
+
+@app.on_event("startup")
+async def resume_transcripts():
+    """Reprendre les générations de relevés interrompues (bail expiré)"""
+    start_transcript_recovery()
+
+@app.on_event("startup")
+async def init_grade_events():
+    """Démarrer le change stream des notes (si GRADE_EVENTS_CHANGE_STREAM)"""
+    start_grade_events()
+
+@app.on_event("shutdown")
+async def close_resources():
+    """Fermer le pool MongoDB et les pools de calcul à l'arrêt"""
+    stop_grade_events()
+    stop_averages_reconciliation()
+    stop_deletion_recovery()
+    stop_transcript_recovery()
+    db.close()
+    shutdown_password_pool()
+    shutdown_render_pool()
+
+# ===========================
+# ROUTEURS (gestion des utilisateurs, matières, notes, relevés)
+# ===========================
+
+# Importés en fin de module : les routeurs dépendent de require_role, db et
+# des modèles définis ci-dessus
+from .api_routes import router
+from .api_routes_part2 import grades_router
+
+app.include_router(router)
+app.include_router(grades_router)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
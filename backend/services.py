@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Couche service partagée par les routes
+
+Les routes de server.py et de api_routes.py / api_routes_part2.py
+délèguent ici la construction des réponses et l'accès aux utilisateurs :
+une seule implémentation à faire évoluer (cache, traitement par lots...).
+
+- to_response : conversion d'un document MongoDB en modèle de réponse,
+  pendant de pagination.projection_for (mêmes champs)
+- dépôt des utilisateurs : insertion avec traduction des doublons d'index,
+  lecture par identifiant ou par page
+- services utilisateurs : création d'étudiants et d'enseignants, listes
+- hydrate_grades : construction des GradeResponse par lots
+
+Les listes passent par la réponse directe de json_responses.py lorsque
+FAST_JSON_RESPONSES est activé (to_trusted au lieu de to_response).
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Type, TypeVar, Union
+from datetime import datetime
+import logging
+import uuid
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
+
+from .database import db
+from .json_responses import fast_responses_enabled, trusted_response
+from .models import (
+    RoleEnum, StudentCreate, TeacherCreate, UserResponse, StudentResponse, TeacherResponse,
+    GradeResponse
+)
+from .pagination import PageParams, fetch_page, projection_for
+from .password_hashing import get_password_hash
+
+logger = logging.getLogger(__name__)
+
+ResponseModel = TypeVar("ResponseModel", bound=BaseModel)
+
+
+# ===========================
+# CONVERSION DOCUMENT → RÉPONSE
+# ===========================
+
+def to_response(model: Type[ResponseModel], document: Dict[str, Any], **values: Any) -> ResponseModel:
+    """
+    Construire un modèle de réponse à partir d'un document
+
+    id reprend _id ; les autres champs du modèle sont lus dans le document
+    (absents : None), sauf ceux fournis dans values (champs calculés).
+    """
+    fields = {
+        name: document.get(name)
+        for name in model.model_fields if name != "id" and name not in values
+    }
+    return model(id=str(document["_id"]), **fields, **values)
+
+
+def to_trusted(model: Type[BaseModel], document: Dict[str, Any], **values: Any) -> Dict[str, Any]:
+    """
+    Même conversion que to_response, sans validation
+
+    Réservé aux documents écrits par l'API (types déjà conformes au modèle) ;
+    le dictionnaire obtenu est sérialisé tel quel (voir json_responses.py).
+    """
+    return {
+        name: str(document["_id"]) if name == "id" else values[name] if name in values else document.get(name)
+        for name in model.model_fields
+    }
+
+
+# ===========================
+# DÉPÔT UTILISATEURS
+# ===========================
+
+# Messages d'erreur des index uniques de la collection users
+DUPLICATE_USER_MESSAGES = {
+    "username": "Ce nom d'utilisateur existe déjà",
+    "email": "Cette adresse email existe déjà",
+    "student_id_num": "Ce numéro étudiant existe déjà",
+    "teacher_id_num": "Ce numéro enseignant existe déjà",
+}
+
+
+def duplicate_key_detail(key_pattern: Dict[str, Any]) -> str:
+    """Message d'erreur correspondant aux champs d'un index unique en doublon"""
+    for field in key_pattern:
+        if field in DUPLICATE_USER_MESSAGES:
+            return DUPLICATE_USER_MESSAGES[field]
+    return "Cet utilisateur existe déjà"
+
+
+def duplicate_user_detail(exc: DuplicateKeyError) -> str:
+    """Message d'erreur correspondant au champ en doublon"""
+    return duplicate_key_detail((exc.details or {}).get("keyPattern", {}))
+
+
+def user_document(request: BaseModel, role: RoleEnum, password_hash: str,
+                  created_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """Document users d'un compte à créer (champs de la requête, mot de passe haché)"""
+    document = request.model_dump(exclude={"password"})
+    document.update({
+        "_id": str(uuid.uuid4()),
+        "password": password_hash,
+        "role": role.value,
+        "created_at": created_at or datetime.utcnow()
+    })
+    return document
+
+
+async def insert_user(document: Dict[str, Any]):
+    """Insérer un compte ; l'unicité est garantie par les index (voir indexes.py)"""
+    try:
+        await db.users.insert_one(document)
+    except DuplicateKeyError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=duplicate_user_detail(exc)
+        )
+
+
+async def find_user(query: Dict[str, Any]) -> Dict[str, Any]:
+    """Lire un utilisateur (404 s'il n'existe pas)"""
+    user = await db.users.find_one(query, projection_for(UserResponse))
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur non trouvé"
+        )
+    return user
+
+
+# ===========================
+# SERVICES UTILISATEURS
+# ===========================
+
+async def _create_account(request: BaseModel, role: RoleEnum,
+                          model: Type[ResponseModel]) -> ResponseModel:
+    document = user_document(request, role, await get_password_hash(request.password))
+    await insert_user(document)
+    logger.info(f"Nouveau compte {role.value} créé : {document['username']}")
+    return to_response(model, document)
+
+
+async def create_student(student_request: StudentCreate) -> StudentResponse:
+    """Créer un compte étudiant"""
+    return await _create_account(student_request, RoleEnum.STUDENT, StudentResponse)
+
+
+async def create_teacher(teacher_request: TeacherCreate) -> TeacherResponse:
+    """Créer un compte enseignant"""
+    return await _create_account(teacher_request, RoleEnum.TEACHER, TeacherResponse)
+
+
+async def get_user(query: Dict[str, Any]) -> UserResponse:
+    """Lire un utilisateur par identifiant ou nom d'utilisateur"""
+    return to_response(UserResponse, await find_user(query))
+
+
+async def list_users(role: Optional[RoleEnum], page: PageParams,
+                     response: Response) -> Union[List[UserResponse], Response]:
+    """Page d'utilisateurs (limit / after, voir pagination.py), filtrable par rôle"""
+    query = {"role": role.value} if role else {}
+    users = await fetch_page(db.users, query, projection_for(UserResponse), page, response)
+    if fast_responses_enabled():
+        return trusted_response([to_trusted(UserResponse, user) for user in users], response)
+    return [to_response(UserResponse, user) for user in users]
+
+
+# ===========================
+# HYDRATATION DES NOTES
+# ===========================
+
+# Champs d'une note nécessaires à la construction d'un GradeResponse
+GRADE_PROJECTION = {
+    "value": 1, "date": 1, "comment": 1, "semester": 1,
+    "student_id": 1, "subject_id": 1, "recorded_by_teacher_id": 1
+}
+
+
+async def hydrate_grades(grades: List[Dict[str, Any]], trusted: bool = False) -> List[Any]:
+    """
+    Construire les GradeResponse d'une liste de notes
+
+    Les étudiants, enseignants et matières référencés sont chargés en une
+    requête $in par collection puis joints en mémoire : le nombre d'allers-
+    retours vers MongoDB reste constant quel que soit le nombre de notes.
+    Avec trusted, les notes sont des dictionnaires non validés (to_trusted).
+    """
+    if not grades:
+        return []
+
+    subject_ids = {grade["subject_id"] for grade in grades}
+    user_ids = {grade["student_id"] for grade in grades}
+    user_ids.update(
+        grade["recorded_by_teacher_id"] for grade in grades
+        if grade.get("recorded_by_teacher_id")
+    )
+
+    subjects = {
+        subject["_id"]: subject
+        async for subject in db.subjects.find(
+            {"_id": {"$in": list(subject_ids)}}, {"name": 1, "coefficient": 1}
+        )
+    }
+    users = {
+        user["_id"]: user
+        async for user in db.users.find(
+            {"_id": {"$in": list(user_ids)}}, {"firstname": 1, "lastname": 1}
+        )
+    }
+
+    build: Callable[..., Any] = to_trusted if trusted else to_response
+    result = []
+    for grade in grades:
+        student = users.get(grade["student_id"])
+        subject = subjects.get(grade["subject_id"])
+        teacher = users.get(grade.get("recorded_by_teacher_id"))
+
+        result.append(build(
+            GradeResponse, grade,
+            student_name=f"{student['firstname']} {student['lastname']}" if student else "Étudiant inconnu",
+            subject_name=subject["name"] if subject else "Matière inconnue",
+            subject_coefficient=float(subject["coefficient"]) if subject else 1.0,
+            recorded_by=f"{teacher['firstname']} {teacher['lastname']}" if teacher else ""
+        ))
+
+    return result
+
+
+async def grade_list(grades: List[Dict[str, Any]], response: Response) -> Union[List[GradeResponse], Response]:
+    """Réponse d'une route de liste de notes (réponse directe si FAST_JSON_RESPONSES)"""
+    if fast_responses_enabled():
+        return trusted_response(await hydrate_grades(grades, trusted=True), response)
+    return await hydrate_grades(grades)
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Moyennes pré-agrégées par étudiant et par matière
+
+La collection student_averages contient un document par triplet
+(étudiant, matière, semestre) : somme des notes, nombre de notes et
+coefficient de la matière. Les routes d'écriture des notes la tiennent à
+jour par des $inc atomiques, ce qui permet de calculer une moyenne en
+O(matières) sans relire la collection grades ; la moyenne d'un semestre
+ne lit que les agrégats de ce semestre. Le calcul pondéré lui-même est
+fait par un pipeline d'agrégation (weighted_average_pipeline) : seul un
+résumé par étudiant transite sur le réseau. Les notes sans semestre ont un
+agrégat de semestre null, pris en compte dans la moyenne globale.
+
+L'écriture d'une note et la mise à jour de son agrégat sont deux écritures
+distinctes (pas de transaction, disponible seulement sur un replica set) :
+une erreur ou un arrêt entre les deux laisse un agrégat faux. Une
+réconciliation périodique (reconcile_student_averages, lancée au démarrage
+puis à intervalle régulier) recalcule les agrégats à partir de grades par
+lots d'étudiants et corrige ceux qui divergent. Un écart n'est corrigé que
+s'il est observé à l'identique lors de deux lectures séparées d'un délai
+de grâce (une écriture en cours entre la note et son $inc n'est pas une
+dérive), et la correction est conditionnée à la valeur lue : un $inc
+concurrent n'est jamais écrasé. Les notes d'une matière ou d'un étudiant
+supprimés n'attendent pas d'agrégat : un agrégat restant est supprimé.
+
+Paramètres (variables d'environnement) :
+- STUDENT_AVERAGES_RECONCILE_INTERVAL_SECONDS : intervalle entre deux
+  réconciliations (défaut 3600, 0 pour désactiver)
+- STUDENT_AVERAGES_RECONCILE_GRACE_SECONDS : délai entre les deux lectures
+  d'un lot divergent (défaut 5)
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import logging
+import os
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+AVERAGES_COLLECTION = "student_averages"
+
+STUDENT_AVERAGES_RECONCILE_INTERVAL_SECONDS = float(
+    os.getenv('STUDENT_AVERAGES_RECONCILE_INTERVAL_SECONDS', '3600')
+)
+STUDENT_AVERAGES_RECONCILE_GRACE_SECONDS = float(os.getenv('STUDENT_AVERAGES_RECONCILE_GRACE_SECONDS', '5'))
+# Étudiants comparés par lot lors d'une réconciliation
+RECONCILE_BATCH_SIZE = 500
+
+_reconcile_task: Optional[asyncio.Task] = None
+
+
+def _average_id(student_id: str, subject_id: str, semester: Optional[str] = None) -> str:
+    """Identifiant du document agrégé d'un triplet (étudiant, matière, semestre)"""
+    return f"{student_id}:{subject_id}:{semester or ''}"
+
+
+def average_document(student_id: str, subject: Dict[str, Any], value_sum: float, count: int,
+                     semester: Optional[str] = None) -> Dict[str, Any]:
+    """Document agrégé complet d'un triplet (étudiant, matière, semestre)"""
+    return {
+        "_id": _average_id(student_id, subject["_id"], semester),
+        "student_id": student_id,
+        "subject_id": subject["_id"],
+        "semester": semester,
+        "subject_name": subject["name"],
+        "coefficient": subject["coefficient"],
+        "sum": value_sum,
+        "count": count,
+    }
+
+
+async def record_grade_added(grade: Dict[str, Any], subject: Dict[str, Any]):
+    """Prendre en compte une nouvelle note"""
+    await db[AVERAGES_COLLECTION].update_one(
+        {"_id": _average_id(grade["student_id"], grade["subject_id"], grade.get("semester"))},
+        {
+            "$inc": {"sum": grade["value"], "count": 1},
+            "$set": {
+                "student_id": grade["student_id"],
+                "subject_id": grade["subject_id"],
+                "semester": grade.get("semester"),
+                "subject_name": subject["name"],
+                "coefficient": subject["coefficient"],
+            },
+        },
+        upsert=True
+    )
+
+
+async def record_grades_added(grades: List[Dict[str, Any]], subjects: Dict[str, Dict[str, Any]]):
+    """Prendre en compte un lot de nouvelles notes (une écriture groupée)"""
+    totals: Dict[tuple, List[float]] = {}
+    for grade in grades:
+        total = totals.setdefault((grade["student_id"], grade["subject_id"], grade.get("semester")), [0.0, 0])
+        total[0] += grade["value"]
+        total[1] += 1
+
+    if not totals:
+        return
+    await db[AVERAGES_COLLECTION].bulk_write([
+        UpdateOne(
+            {"_id": _average_id(student_id, subject_id, semester)},
+            {
+                "$inc": {"sum": value_sum, "count": count},
+                "$set": {
+                    "student_id": student_id,
+                    "subject_id": subject_id,
+                    "semester": semester,
+                    "subject_name": subjects[subject_id]["name"],
+                    "coefficient": subjects[subject_id]["coefficient"],
+                },
+            },
+            upsert=True
+        )
+        for (student_id, subject_id, semester), (value_sum, count) in totals.items()
+    ], ordered=False)
+
+
+async def record_grade_changed(student_id: str, subject_id: str, semester: Optional[str],
+                               old_value: float, new_value: float):
+    """Prendre en compte la modification de la valeur d'une note"""
+    if old_value == new_value:
+        return
+    await db[AVERAGES_COLLECTION].update_one(
+        {"_id": _average_id(student_id, subject_id, semester)},
+        {"$inc": {"sum": new_value - old_value}}
+    )
+
+
+async def record_grade_removed(student_id: str, subject_id: str, semester: Optional[str], value: float):
+    """Retirer une note supprimée de l'agrégat"""
+    average_id = _average_id(student_id, subject_id, semester)
+    await db[AVERAGES_COLLECTION].update_one(
+        {"_id": average_id},
+        {"$inc": {"sum": -value, "count": -1}}
+    )
+    await db[AVERAGES_COLLECTION].delete_one({"_id": average_id, "count": {"$lte": 0}})
+
+
+async def delete_student_averages(student_id: str):
+    """Supprimer les agrégats d'un étudiant (suppression du compte)"""
+    await db[AVERAGES_COLLECTION].delete_many({"student_id": student_id})
+
+
+def weighted_average_pipeline(match: Dict[str, Any], include_subjects: bool = True) -> List[Dict[str, Any]]:
+    """
+    Pipeline de calcul des moyennes générales pondérées sur student_averages
+
+    $match sur les agrégats, $group par couple (étudiant, matière) pour
+    cumuler les semestres, $lookup des matières (nom et coefficient
+    courants ; les matières supprimées sont ignorées), puis $group pondéré
+    par étudiant. Seul un document par étudiant est retourné ; sans
+    include_subjects, le détail par matière n'en fait pas partie.
+    """
+    student_group: Dict[str, Any] = {
+        "_id": "$_id.student_id",
+        "weighted_sum": {"$sum": {"$multiply": ["$average", "$coefficient"]}},
+        "total_coefficient": {"$sum": "$coefficient"},
+    }
+    if include_subjects:
+        student_group["subject_averages"] = {"$push": {
+            "subject_id": "$_id.subject_id",
+            "subject_name": "$subject_name",
+            "average": "$average",
+            "coefficient": "$coefficient",
+            "grade_count": "$count",
+        }}
+    return [
+        {"$match": {**match, "count": {"$gt": 0}}},
+        {"$group": {
+            "_id": {"student_id": "$student_id", "subject_id": "$subject_id"},
+            "sum": {"$sum": "$sum"},
+            "count": {"$sum": "$count"},
+        }},
+        {"$lookup": {
+            "from": "subjects",
+            "localField": "_id.subject_id",
+            "foreignField": "_id",
+            "as": "subject",
+        }},
+        {"$unwind": "$subject"},
+        {"$project": {
+            "count": 1,
+            "subject_name": "$subject.name",
+            "coefficient": "$subject.coefficient",
+            "average": {"$divide": ["$sum", "$count"]},
+        }},
+        {"$sort": {"subject_name": 1}},
+        {"$group": student_group},
+    ]
+
+
+def _averages_match(student_ids: List[str], semester: Optional[str]) -> Dict[str, Any]:
+    match: Dict[str, Any] = {"student_id": {"$in": list(student_ids)}}
+    if semester is not None:
+        match["semester"] = semester
+    return match
+
+
+def _general_average(result: Dict[str, Any]) -> float:
+    if result["total_coefficient"] <= 0:
+        return 0
+    return round(result["weighted_sum"] / result["total_coefficient"], 2)
+
+
+async def get_average_reports(student_ids: List[str],
+                              semester: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Moyennes générales pondérées et moyennes par matière de plusieurs
+    étudiants, calculées par MongoDB (weighted_average_pipeline)
+
+    Avec semester, seuls les agrégats de ce semestre sont pris en compte ;
+    sinon les semestres sont cumulés par matière. Chaque étudiant demandé
+    a un rapport, vide s'il n'a aucune note.
+    """
+    calculation_date = datetime.utcnow()
+    reports: Dict[str, Dict[str, Any]] = {
+        student_id: {
+            "student_id": student_id,
+            "general_average": 0,
+            "subject_averages": [],
+            "total_coefficient": 0,
+            "semester": semester,
+            "calculation_date": calculation_date
+        }
+        for student_id in student_ids
+    }
+    async for result in db[AVERAGES_COLLECTION].aggregate(
+        weighted_average_pipeline(_averages_match(student_ids, semester))
+    ):
+        for subject_average in result["subject_averages"]:
+            subject_average["average"] = round(subject_average["average"], 2)
+        reports[result["_id"]].update({
+            "general_average": _general_average(result),
+            "subject_averages": result["subject_averages"],
+            "total_coefficient": result["total_coefficient"],
+        })
+    return reports
+
+
+async def get_average_report(student_id: str, semester: Optional[str] = None) -> Dict[str, Any]:
+    """Moyenne générale pondérée et moyennes par matière d'un étudiant"""
+    return (await get_average_reports([student_id], semester))[student_id]
+
+
+async def get_general_averages(student_ids: List[str], semester: Optional[str] = None) -> Dict[str, float]:
+    """
+    Moyennes générales pondérées seules (classements) ; les étudiants sans
+    note n'y figurent pas
+    """
+    return {
+        result["_id"]: _general_average(result)
+        async for result in db[AVERAGES_COLLECTION].aggregate(
+            weighted_average_pipeline(_averages_match(student_ids, semester), include_subjects=False)
+        )
+    }
+
+
+async def rebuild_student_averages(student_id: Optional[str] = None):
+    """
+    Reconstruire les agrégats à partir de la collection grades
+
+    Utilisé pour initialiser la collection sur une base existante ; les
+    notes dont la matière n'existe plus sont ignorées, comme dans le calcul
+    de moyenne d'origine.
+    """
+    match = {"student_id": student_id} if student_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "student_id": "$student_id",
+                "subject_id": "$subject_id",
+                "semester": {"$ifNull": ["$semester", None]},
+            },
+            "sum": {"$sum": "$value"},
+            "count": {"$sum": 1},
+        }},
+        {"$lookup": {
+            "from": "subjects",
+            "localField": "_id.subject_id",
+            "foreignField": "_id",
+            "as": "subject",
+        }},
+        {"$unwind": "$subject"},
+        {"$project": {
+            "_id": {"$concat": [
+                "$_id.student_id", ":", "$_id.subject_id", ":", {"$ifNull": ["$_id.semester", ""]}
+            ]},
+            "student_id": "$_id.student_id",
+            "subject_id": "$_id.subject_id",
+            "semester": "$_id.semester",
+            "subject_name": "$subject.name",
+            "coefficient": "$subject.coefficient",
+            "sum": 1,
+            "count": 1,
+        }},
+        {"$merge": {"into": AVERAGES_COLLECTION, "whenMatched": "replace"}},
+    ]
+    if student_id:
+        await delete_student_averages(student_id)
+    await db.grades.aggregate(pipeline).to_list(length=None)
+
+
+async def init_student_averages():
+    """
+    Construire les agrégats au démarrage s'ils n'existent pas encore
+
+    Les agrégats antérieurs au découpage par semestre (sans champ
+    semester) sont reconstruits.
+    """
+    if await db[AVERAGES_COLLECTION].find_one({"semester": {"$exists": True}}, {"_id": 1}):
+        return
+    if not await db.grades.find_one({}, {"_id": 1}):
+        return
+    await db[AVERAGES_COLLECTION].delete_many({})
+    await rebuild_student_averages()
+    logger.info("Moyennes pré-agrégées reconstruites à partir des notes")
+
+
+# ===========================
+# RÉCONCILIATION
+# ===========================
+
+async def _grade_totals(student_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Somme et nombre des notes par triplet (étudiant, matière, semestre)"""
+    return {
+        _average_id(total["_id"]["student_id"], total["_id"]["subject_id"], total["_id"]["semester"]): {
+            **total["_id"], "sum": total["sum"], "count": total["count"]
+        }
+        async for total in db.grades.aggregate([
+            {"$match": {"student_id": {"$in": student_ids}}},
+            {"$group": {
+                "_id": {
+                    "student_id": "$student_id",
+                    "subject_id": "$subject_id",
+                    "semester": {"$ifNull": ["$semester", None]},
+                },
+                "sum": {"$sum": "$value"},
+                "count": {"$sum": 1},
+            }},
+        ])
+    }
+
+
+def _totals(document: Optional[Dict[str, Any]]) -> Tuple[float, int]:
+    return (document["sum"], document["count"]) if document else (0.0, 0)
+
+
+async def _divergent_averages(student_ids: List[str]) -> Dict[str, tuple]:
+    """Agrégats d'un lot d'étudiants qui ne correspondent pas à leurs notes"""
+    # Agrégats lus avant les notes : un $inc postérieur à la lecture des
+    # notes ne peut pas faire paraître un agrégat juste
+    aggregates = {
+        document["_id"]: document
+        async for document in db[AVERAGES_COLLECTION].find(
+            {"student_id": {"$in": student_ids}},
+            {"student_id": 1, "subject_id": 1, "semester": 1, "sum": 1, "count": 1}
+        )
+    }
+    totals = await _grade_totals(student_ids)
+    # Matière ou étudiant supprimés : aucun agrégat attendu
+    existing_subjects = set(await db.subjects.distinct("_id", {"_id": {"$in": list(
+        {total["subject_id"] for total in totals.values()}
+        | {aggregate["subject_id"] for aggregate in aggregates.values()}
+    )}}))
+    existing_students = set(await db.users.distinct(
+        "_id", {"_id": {"$in": student_ids}, "role": "STUDENT"}
+    ))
+    expected = {
+        key: total for key, total in totals.items()
+        if total["subject_id"] in existing_subjects and total["student_id"] in existing_students
+    }
+    divergent = {}
+    for key in expected.keys() | aggregates.keys():
+        (expected_sum, expected_count), (actual_sum, actual_count) = (
+            _totals(expected.get(key)), _totals(aggregates.get(key))
+        )
+        if expected_count != actual_count or abs(expected_sum - actual_sum) > 1e-6:
+            divergent[key] = (expected.get(key), aggregates.get(key))
+    return divergent
+
+
+async def _repair_average(key: str, expected: Optional[Dict[str, Any]],
+                          aggregate: Optional[Dict[str, Any]],
+                          subjects: Dict[str, Dict[str, Any]]) -> bool:
+    """Corriger un agrégat, à condition qu'il n'ait pas changé depuis sa lecture"""
+    if expected is None:
+        result = await db[AVERAGES_COLLECTION].delete_one(
+            {"_id": key, "sum": aggregate["sum"], "count": aggregate["count"]}
+        )
+        return result.deleted_count == 1
+    if aggregate is None:
+        subject = subjects.get(expected["subject_id"])
+        if subject is None:
+            # Matière supprimée depuis la seconde lecture
+            return False
+        try:
+            await db[AVERAGES_COLLECTION].insert_one(average_document(
+                expected["student_id"], subject, expected["sum"], expected["count"], expected["semester"]
+            ))
+        except DuplicateKeyError:
+            return False
+        return True
+    result = await db[AVERAGES_COLLECTION].update_one(
+        {"_id": key, "sum": aggregate["sum"], "count": aggregate["count"]},
+        {"$set": {"sum": expected["sum"], "count": expected["count"]}}
+    )
+    return result.modified_count == 1
+
+
+async def reconcile_student_averages(grace_seconds: Optional[float] = None) -> int:
+    """
+    Corriger les agrégats qui divergent de la collection grades
+
+    Les étudiants sont traités par lots de RECONCILE_BATCH_SIZE ; un lot
+    divergent est relu après grace_seconds et seuls les écarts identiques
+    aux deux lectures sont corrigés. Retourne le nombre d'agrégats corrigés.
+    """
+    if grace_seconds is None:
+        grace_seconds = STUDENT_AVERAGES_RECONCILE_GRACE_SECONDS
+    student_ids = sorted(
+        set(await db.grades.distinct("student_id"))
+        | set(await db[AVERAGES_COLLECTION].distinct("student_id"))
+    )
+    repaired = 0
+    for i in range(0, len(student_ids), RECONCILE_BATCH_SIZE):
+        batch = student_ids[i:i + RECONCILE_BATCH_SIZE]
+        first = await _divergent_averages(batch)
+        if not first:
+            continue
+        await asyncio.sleep(grace_seconds)
+        second = await _divergent_averages(batch)
+        confirmed = {key: values for key, values in second.items() if first.get(key) == values}
+        if not confirmed:
+            continue
+        subjects = {
+            subject["_id"]: subject
+            async for subject in db.subjects.find(
+                {"_id": {"$in": list({key.split(":")[1] for key in confirmed})}},
+                {"name": 1, "coefficient": 1}
+            )
+        }
+        for key, (expected, aggregate) in confirmed.items():
+            repaired += await _repair_average(key, expected, aggregate, subjects)
+    if repaired:
+        logger.warning(f"Moyennes pré-agrégées : {repaired} agrégat(s) divergent(s) corrigé(s)")
+    return repaired
+
+
+async def _reconcile_periodically():
+    while True:
+        try:
+            await reconcile_student_averages()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Échec de la réconciliation des moyennes pré-agrégées")
+        await asyncio.sleep(STUDENT_AVERAGES_RECONCILE_INTERVAL_SECONDS)
+
+
+def start_averages_reconciliation():
+    """Lancer la réconciliation au démarrage puis à intervalle régulier"""
+    global _reconcile_task
+    if STUDENT_AVERAGES_RECONCILE_INTERVAL_SECONDS > 0 and _reconcile_task is None:
+        _reconcile_task = asyncio.create_task(_reconcile_periodically())
+
+
+def stop_averages_reconciliation():
+    """Arrêter la réconciliation périodique"""
+    global _reconcile_task
+    if _reconcile_task is not None:
+        _reconcile_task.cancel()
+        _reconcile_task = None
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fixtures de test : application complète sur une base en mémoire
+
+- client : client httpx de l'application (routes de server.py et des deux
+  routeurs, comme le banc d'essai) sur une base mongomock-motor vide,
+  authentifié en administrateur
+- factory : création rapide d'utilisateurs, matières et notes
+- les commandes exécutées par mongomock sont signalées à l'écouteur de
+  metrics.py comme le ferait pymongo : query_budget (query_diagnostics.py)
+  compte donc les commandes des routes testées
+
+Dépendances : requirements-dev.txt. Les tests asynchrones utilisent le
+greffon pytest d'anyio (@pytest.mark.anyio).
+"""
+
+from contextvars import ContextVar
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+import functools
+import os
+import tempfile
+import uuid
+
+# Avant l'import de l'application : stockage des relevés isolé, pas de
+# pause entre les lots de suppression
+os.environ.setdefault("TRANSCRIPT_STORAGE_DIR", tempfile.mkdtemp(prefix="gestion-notes-tests-"))
+os.environ.setdefault("USER_DELETION_BATCH_PAUSE_SECONDS", "0")
+
+import httpx
+import mongomock.collection
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from backend import server
+from backend.database import db
+from backend.indexes import REQUIRED_INDEXES
+from backend.metrics import mongo_command_listener
+from backend.principal_cache import principal_cache
+from backend.response_cache import InMemoryCache, response_cache, RESPONSE_CACHE_MAX_ENTRIES
+from backend.password_hashing import pwd_context, shutdown_password_pool
+from backend.transcript_jobs import shutdown_render_pool
+
+TEST_PASSWORD = "secret1"
+_TEST_PASSWORD_HASH = pwd_context.handler("bcrypt").using(rounds=4).hash(TEST_PASSWORD)
+
+
+# ===========================
+# COMMANDES MONGOMOCK → ÉCOUTEUR PYMONGO
+# ===========================
+
+# Méthodes de mongomock et commande MongoDB équivalente
+_COMMANDS = {
+    "find": "find", "find_one": "find", "aggregate": "aggregate", "distinct": "distinct",
+    "count_documents": "aggregate", "insert_one": "insert", "insert_many": "insert",
+    "update_one": "update", "update_many": "update", "replace_one": "update",
+    "delete_one": "delete", "delete_many": "delete", "find_one_and_update": "findAndModify",
+    "find_one_and_delete": "findAndModify", "find_one_and_replace": "findAndModify",
+    "bulk_write": "update",
+}
+
+# Appel de méthode en cours (mongomock s'appelle lui-même : find_one → find)
+_in_command: ContextVar[bool] = ContextVar("in_command", default=False)
+
+
+def _command_document(command: str, collection: str, method: str, args, kwargs) -> Dict[str, Any]:
+    filter_ = kwargs.get("filter", args[0] if args else None) or {}
+    if command == "aggregate":
+        pipeline = kwargs.get("pipeline", args[0] if args else [])
+        if method == "count_documents":
+            pipeline = [{"$match": filter_}, {"$group": {}}]
+        return {"aggregate": collection, "pipeline": pipeline}
+    if command == "distinct":
+        return {"distinct": collection, "query": kwargs.get("filter", args[1] if len(args) > 1 else None) or {}}
+    if command in ("update", "delete"):
+        return {command: collection, f"{command}s": [{"q": filter_ if isinstance(filter_, dict) else {}}]}
+    if command == "findAndModify":
+        return {"findAndModify": collection, "query": filter_}
+    if command == "insert":
+        return {"insert": collection}
+    return {"find": collection, "filter": filter_}
+
+
+def _reporting(method: str, command: str):
+    original = getattr(mongomock.collection.Collection, method)
+
+    @functools.wraps(original)
+    def wrapper(self, *args, **kwargs):
+        if _in_command.get():
+            return original(self, *args, **kwargs)
+        event = SimpleNamespace(
+            command_name=command, duration_micros=0,
+            command=_command_document(command, self.name, method, args, kwargs)
+        )
+        mongo_command_listener.started(event)
+        token = _in_command.set(True)
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            _in_command.reset(token)
+            mongo_command_listener.succeeded(event)
+
+    return original, wrapper
+
+
+@pytest.fixture(scope="session", autouse=True)
+def mongomock_command_events():
+    """Signaler les commandes de mongomock à l'écouteur de metrics.py"""
+    originals = {}
+    for method, command in _COMMANDS.items():
+        originals[method], wrapper = _reporting(method, command)
+        setattr(mongomock.collection.Collection, method, wrapper)
+    yield
+    for method, original in originals.items():
+        setattr(mongomock.collection.Collection, method, original)
+    shutdown_password_pool()
+    shutdown_render_pool()
+
+
+# ===========================
+# APPLICATION ET DONNÉES
+# ===========================
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+async def _create_indexes():
+    # mongomock ignore partialFilterExpression : les index partiels
+    # (numéros étudiant / enseignant) rendraient les champs absents uniques
+    for collection, indexes in REQUIRED_INDEXES.items():
+        supported = [index for index in indexes if "partialFilterExpression" not in index.document]
+        if supported:
+            await db[collection].create_indexes(supported)
+
+
+class Factory:
+    """Création de données de test aux formes écrites par les routes"""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self._counter = 0
+
+    def _next(self) -> int:
+        self._counter += 1
+        return self._counter
+
+    async def user(self, role: str = "STUDENT", **fields: Any) -> Dict[str, Any]:
+        """Compte inséré directement (mot de passe TEST_PASSWORD, hachage précalculé)"""
+        number = self._next()
+        document = {
+            "_id": str(uuid.uuid4()),
+            "username": f"{role.lower()}{number}",
+            "firstname": "Prénom",
+            "lastname": f"Nom{number}",
+            "email": f"{role.lower()}{number}@example.com",
+            "password": _TEST_PASSWORD_HASH,
+            "role": role,
+            "created_at": datetime.utcnow(),
+        }
+        if role == "STUDENT":
+            document["student_id_num"] = f"E{number:05d}"
+        elif role == "TEACHER":
+            document["teacher_id_num"] = f"T{number:05d}"
+        document.update(fields)
+        await db.users.insert_one(document)
+        return document
+
+    async def subject(self, coefficient: float = 1.0, **fields: Any) -> Dict[str, Any]:
+        number = self._next()
+        response = await self.client.post("/api/subjects", json={
+            "subject_code": f"SUB{number}", "name": f"Matière {number}",
+            "coefficient": coefficient, **fields
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    async def grade(self, student: Dict[str, Any], subject: Dict[str, Any], value: float,
+                    semester: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        """Note saisie par la route (moyennes pré-agrégées à jour)"""
+        response = await self.client.post("/api/grades", json={
+            "student_id": student["_id"], "subject_id": subject["id"], "value": value,
+            "semester": semester, **fields
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    def token(self, user: Dict[str, Any]) -> Dict[str, str]:
+        """En-têtes d'authentification d'un utilisateur"""
+        return {"Authorization": f"Bearer {server.create_access_token({'sub': user['username']})}"}
+
+
+@pytest.fixture
+async def client():
+    """Client de l'application sur une base vide, authentifié en administrateur"""
+    db.attach(AsyncMongoMockClient())
+    await _create_indexes()
+    principal_cache.clear()
+    response_cache.backend = InMemoryCache(RESPONSE_CACHE_MAX_ENTRIES)
+
+    admin = {
+        "_id": str(uuid.uuid4()), "username": "admin", "password": _TEST_PASSWORD_HASH,
+        "firstname": "Admin", "lastname": "Système", "email": "admin@example.com",
+        "role": "ADMIN", "created_at": datetime.utcnow()
+    }
+    await db.users.insert_one(admin)
+    headers = {"Authorization": f"Bearer {server.create_access_token({'sub': 'admin'})}"}
+    async with httpx.AsyncClient(app=server.app, base_url="http://test", headers=headers) as http:
+        http.admin = admin
+        yield http
+
+
+@pytest.fixture
+def factory(client) -> Factory:
+    return Factory(client)
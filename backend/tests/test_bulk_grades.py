@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saisie groupée de notes : résultat par ligne, mode ordered
+"""
+
+import pytest
+
+from backend.database import db
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def rows(factory):
+    student, subject = await factory.user("STUDENT"), await factory.subject()
+    teacher = await factory.user("TEACHER")
+    return [
+        {"student_id": student["_id"], "subject_id": subject["id"], "value": 12},
+        {"student_id": "inconnu", "subject_id": subject["id"], "value": 8},
+        {"student_id": student["_id"], "subject_id": "inconnue", "value": 9},
+        {"student_id": teacher["_id"], "subject_id": subject["id"], "value": 10},
+        {"student_id": student["_id"], "subject_id": subject["id"], "value": 15, "semester": "S2"},
+    ]
+
+
+async def test_unordered_reports_each_row(client, rows):
+    response = await client.post("/api/grades/bulk", json={"grades": rows})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["inserted"], body["failed"]) == (2, 3)
+    results = body["results"]
+    assert [result["index"] for result in results] == list(range(len(rows)))
+    assert [result["status"] for result in results] == ["created", "error", "error", "error", "created"]
+    assert results[1]["detail"] == "Étudiant non trouvé"
+    assert results[2]["detail"] == "Matière non trouvée"
+    # Un enseignant n'est pas un étudiant
+    assert results[3]["detail"] == "Étudiant non trouvé"
+
+    created = await db.grades.find({"_id": {"$in": [results[0]["grade_id"], results[4]["grade_id"]]}}).to_list(None)
+    assert sorted((grade["value"], grade["semester"]) for grade in created) == [(12, None), (15, "S2")]
+    assert all(grade["recorded_by_teacher_id"] == client.admin["_id"] for grade in created)
+
+
+async def test_ordered_stops_at_first_error(client, rows):
+    response = await client.post("/api/grades/bulk", json={"grades": rows, "ordered": True})
+    body = response.json()
+    assert (body["inserted"], body["failed"]) == (1, 4)
+    assert [result["status"] for result in body["results"]] == ["created", "error", "skipped", "skipped", "skipped"]
+    assert await db.grades.count_documents({}) == 1
+
+
+async def test_empty_and_oversized_batches_are_rejected(client, rows):
+    assert (await client.post("/api/grades/bulk", json={"grades": []})).status_code == 422
+    too_many = {"grades": [rows[0]] * 1001}
+    assert (await client.post("/api/grades/bulk", json=too_many)).status_code == 422
+
+
+async def test_students_cannot_enter_grades(client, factory, rows):
+    student = await factory.user("STUDENT")
+    response = await client.post("/api/grades/bulk", json={"grades": rows}, headers=factory.token(student))
+    assert response.status_code == 403
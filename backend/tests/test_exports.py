@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export des notes (XLSX écrit par lots, CSV diffusé)
+"""
+
+import io
+
+import openpyxl
+import pytest
+
+from backend import api_routes_part2
+
+pytestmark = pytest.mark.anyio
+
+GRADES = 7
+
+
+@pytest.fixture
+async def grades(factory, monkeypatch):
+    # Lots de 3 lignes : premier lot, lots complets et lot final partiel
+    monkeypatch.setattr(api_routes_part2, "EXPORT_BATCH_SIZE", 3)
+    student = await factory.user("STUDENT")
+    subject = await factory.subject(coefficient=2.0)
+    return [await factory.grade(student, subject, 10 + index) for index in range(GRADES)]
+
+
+async def test_excel_export_writes_every_row(client, grades):
+    response = await client.get("/api/admin/export/excel")
+    assert response.status_code == 200
+    assert response.headers["X-Total-Grades"] == str(GRADES)
+
+    sheet = openpyxl.load_workbook(io.BytesIO(response.content))["Notes"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == api_routes_part2.EXPORT_HEADERS
+    assert sorted(row[3] for row in rows[1:]) == [10 + index for index in range(GRADES)]
+
+
+async def test_csv_export_streams_every_row(client, grades):
+    response = await client.get("/api/admin/export/excel", params={"format": "csv"})
+    assert response.status_code == 200
+    lines = response.content.decode("utf-8-sig").splitlines()
+    assert lines[0].split(";") == api_routes_part2.EXPORT_HEADERS
+    assert len(lines) == GRADES + 1
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Téléchargement des relevés : réponses complètes, partielles (206), 416
+et reprises conditionnelles (If-Range)
+"""
+
+import base64
+
+import pytest
+
+from backend.file_responses import content_disposition
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def transcript(client, factory):
+    """Identifiant et contenu d'un relevé généré"""
+    student = await factory.user("STUDENT")
+    await factory.grade(student, await factory.subject(), 13)
+    response = await client.get(f"/api/students/{student['_id']}/transcript/pdf")
+    assert response.status_code == 200
+    return response.headers["X-Transcript-Id"], response.content
+
+
+async def _download(client, transcript_id: str, byte_range: str = None, **headers):
+    if byte_range:
+        headers["Range"] = byte_range
+    return await client.get(f"/api/transcripts/{transcript_id}/file", headers=headers)
+
+
+async def test_full_download(client, transcript):
+    transcript_id, content = transcript
+    response = await _download(client, transcript_id)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Length"] == str(len(content))
+    assert response.headers["Content-Type"] == "application/pdf"
+
+
+def test_content_disposition_encodes_non_ascii_names():
+    assert content_disposition("releve.pdf") == 'attachment; filename="releve.pdf"'
+    assert content_disposition("relevé.pdf", "inline") == "inline; filename*=utf-8''relev%C3%A9.pdf"
+
+
+@pytest.mark.parametrize("byte_range, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=10-", 10, None),
+    ("bytes=-16", -16, None),
+])
+async def test_partial_download(client, transcript, byte_range, start, end):
+    transcript_id, content = transcript
+    response = await _download(client, transcript_id, byte_range)
+    assert response.status_code == 206
+    start = start % len(content)
+    end = len(content) - 1 if end is None else end
+    assert response.content == content[start:end + 1]
+    assert response.headers["Content-Range"] == f"bytes {start}-{end}/{len(content)}"
+    assert response.headers["Content-Length"] == str(end - start + 1)
+
+
+async def test_range_end_is_clamped(client, transcript):
+    transcript_id, content = transcript
+    response = await _download(client, transcript_id, f"bytes=5-{len(content) * 2}")
+    assert response.status_code == 206
+    assert response.content == content[5:]
+
+
+@pytest.mark.parametrize("byte_range", ["bytes=0-1,4-5", "items=0-9", "bytes=-"])
+async def test_unsupported_range_serves_whole_file(client, transcript, byte_range):
+    transcript_id, content = transcript
+    response = await _download(client, transcript_id, byte_range)
+    assert response.status_code == 200
+    assert response.content == content
+
+
+@pytest.mark.parametrize("byte_range", ["bytes={size}-", "bytes=20-10"])
+async def test_unsatisfiable_range(client, transcript, byte_range):
+    transcript_id, content = transcript
+    response = await _download(client, transcript_id, byte_range.format(size=len(content)))
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(content)}"
+
+
+async def test_if_range_matching_validator_serves_range(client, transcript):
+    transcript_id, content = transcript
+    full = await _download(client, transcript_id)
+    for validator in (full.headers["ETag"], full.headers["Last-Modified"]):
+        response = await _download(client, transcript_id, "bytes=10-", **{"If-Range": validator})
+        assert response.status_code == 206, validator
+        assert response.content == content[10:]
+
+
+@pytest.mark.parametrize("if_range", ['"perime"', "W/{etag}", "Thu, 01 Jan 1970 00:00:00 GMT"])
+async def test_if_range_mismatch_serves_whole_file(client, transcript, if_range):
+    transcript_id, content = transcript
+    etag = (await _download(client, transcript_id)).headers["ETag"]
+    response = await _download(client, transcript_id, "bytes=10-", **{"If-Range": if_range.format(etag=etag)})
+    assert response.status_code == 200
+    assert response.content == content
+    assert "Content-Range" not in response.headers
+
+
+async def test_json_format_embeds_pdf(client, factory):
+    student = await factory.user("STUDENT")
+    await factory.grade(student, await factory.subject(), 13)
+    response = await client.get(f"/api/students/{student['_id']}/transcript/pdf", params={"format": "json"})
+    assert response.status_code == 200
+    assert base64.b64decode(response.json()["pdf_base64"]).startswith(b"%PDF")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Flux des changements de notes : abonnements SSE et change stream
+"""
+
+from types import SimpleNamespace
+import asyncio
+
+import pytest
+from pymongo.errors import PyMongoError
+
+from backend import grade_events
+from backend.grade_events import EVENT_CREATED, grade_event_bus, publish_grade_events, stream_grade_events
+
+pytestmark = pytest.mark.anyio
+
+GRADE = {"_id": "note", "student_id": "etudiant", "subject_id": "matiere", "semester": None, "value": 12}
+
+
+class _ChangeStream:
+    """Change stream ouvert jusqu'à ce que le test l'interrompe"""
+
+    def __init__(self):
+        self.alive = True
+        self.opened = asyncio.Event()
+        self.interrupted = asyncio.Event()
+
+    async def __aenter__(self):
+        self.opened.set()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def try_next(self):
+        await self.interrupted.wait()
+        raise PyMongoError("connexion perdue")
+
+
+@pytest.fixture
+def change_stream(monkeypatch):
+    stream = _ChangeStream()
+    monkeypatch.setattr(grade_events, "db", SimpleNamespace(
+        grades=SimpleNamespace(watch=lambda *args, **kwargs: stream)
+    ))
+    return stream
+
+
+async def test_subscription_starts_with_the_stream():
+    subscribers = len(grade_event_bus.subscribers)
+    stream = stream_grade_events(student_id="etudiant")
+    # Réponse jamais démarrée (client déjà déconnecté) : aucun abonné
+    assert len(grade_event_bus.subscribers) == subscribers
+
+    assert await stream.__anext__() == "retry: 5000\n\n"
+    assert len(grade_event_bus.subscribers) == subscribers + 1
+    publish_grade_events(EVENT_CREATED, [GRADE])
+    assert '"grade_id": "note"' in await stream.__anext__()
+
+    await stream.aclose()
+    assert len(grade_event_bus.subscribers) == subscribers
+
+
+async def test_routes_publish_again_after_change_stream_failure(change_stream):
+    subscriber = grade_event_bus.subscribe()
+    watcher = asyncio.create_task(grade_events._watch_grade_changes())
+    try:
+        await change_stream.opened.wait()
+        await asyncio.sleep(0)
+        assert grade_events._change_stream_active
+
+        change_stream.interrupted.set()
+        for _ in range(100):
+            if not grade_events._change_stream_active:
+                break
+            await asyncio.sleep(0.01)
+        # Interruption : resync demandé et publication par les routes rétablie
+        assert subscriber.overflowed
+        subscriber.overflowed = False
+        publish_grade_events(EVENT_CREATED, [GRADE])
+        assert subscriber.queue.get_nowait()["grade_id"] == "note"
+    finally:
+        watcher.cancel()
+        grade_event_bus.unsubscribe(subscriber)
+        grade_events.stop_grade_events()
+
+
+async def test_unavailable_change_stream_is_abandoned(monkeypatch):
+    def watch(*args, **kwargs):
+        raise PyMongoError("replica set requis")
+
+    monkeypatch.setattr(grade_events, "db", SimpleNamespace(grades=SimpleNamespace(watch=watch)))
+    await grade_events._watch_grade_changes()
+    assert not grade_events._change_stream_active
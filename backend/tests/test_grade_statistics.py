@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Statistiques de notes : rangs, percentiles, histogramme, routes de matière et de classe
+"""
+
+import numpy as np
+import pytest
+
+from backend.database import db
+from backend.grade_statistics import compute_statistics
+
+
+def test_ranks_and_percentiles_with_ties():
+    statistics = compute_statistics(["a", "b", "c", "d"], np.array([12.0, 16.0, 12.0, 8.0]))
+    ranking = {entry["student_id"]: entry for entry in statistics["ranking"]}
+
+    assert [entry["student_id"] for entry in statistics["ranking"]][0] == "b"
+    # Rang de compétition : les ex æquo partagent le meilleur rang
+    assert {student: entry["rank"] for student, entry in ranking.items()} == {"b": 1, "a": 2, "c": 2, "d": 4}
+    # Part strictement inférieure, ex æquo comptés pour moitié
+    assert {student: entry["percentile"] for student, entry in ranking.items()} == {
+        "b": 87.5, "a": 50.0, "c": 50.0, "d": 12.5
+    }
+    assert (statistics["mean"], statistics["median"], statistics["min"], statistics["max"]) == (12, 12, 8, 16)
+    assert statistics["std"] == pytest.approx(2.83, abs=0.01)
+
+
+def test_histogram_bins():
+    statistics = compute_statistics(["a", "b", "c", "d"], np.array([0.0, 1.9, 19.5, 20.0]))
+    counts = {bucket["range"]: bucket["count"] for bucket in statistics["histogram"]}
+    assert len(counts) == 10
+    # La dernière tranche inclut 20
+    assert (counts["0-2"], counts["18-20"], sum(counts.values())) == (2, 2, 4)
+
+
+def test_empty_statistics():
+    statistics = compute_statistics([], np.array([]))
+    assert (statistics["count"], statistics["ranking"], statistics["histogram"]) == (0, [], [])
+
+
+@pytest.fixture
+async def cohort(factory):
+    """Trois étudiants : moyennes de matière 10, 14 et 14 ; semestres S1 et S2"""
+    subject = await factory.subject(coefficient=2.0)
+    other = await factory.subject(coefficient=1.0)
+    students = [await factory.user("STUDENT") for _ in range(3)]
+    await factory.grade(students[0], subject, 8, semester="S1")
+    await factory.grade(students[0], subject, 12, semester="S2")
+    await factory.grade(students[1], subject, 14, semester="S1")
+    await factory.grade(students[2], subject, 14, semester="S2")
+    await factory.grade(students[2], other, 20, semester="S2")
+    return {"subject": subject, "students": students}
+
+
+@pytest.mark.anyio
+async def test_subject_statistics_route(client, cohort):
+    subject, students = cohort["subject"], cohort["students"]
+    response = await client.get(f"/api/statistics/subjects/{subject['id']}")
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["count"], body["mean"]) == (3, pytest.approx(12.67, abs=0.01))
+    ranks = {entry["student_id"]: entry["rank"] for entry in body["ranking"]}
+    assert ranks == {students[1]["_id"]: 1, students[2]["_id"]: 1, students[0]["_id"]: 3}
+    assert all(entry["student_name"].startswith("Prénom Nom") for entry in body["ranking"])
+
+    semester = (await client.get(f"/api/statistics/subjects/{subject['id']}", params={"semester": "S1"})).json()
+    assert {entry["student_id"]: entry["average"] for entry in semester["ranking"]} == {
+        students[0]["_id"]: 8, students[1]["_id"]: 14
+    }
+
+
+@pytest.mark.anyio
+async def test_class_statistics_route(client, cohort):
+    students = cohort["students"]
+    await db.classes.insert_one({"_id": "classe", "name": "L3", "academic_year": "2025-2026"})
+    await db.enrollments.insert_many([
+        {"_id": f"inscription-{index}", "class_id": "classe", "student_id": student["_id"], "semester": "S2"}
+        for index, student in enumerate(students[::2])
+    ])
+
+    body = (await client.get("/api/statistics/classes/classe")).json()
+    # Moyennes générales pondérées : 10 et (14 × 2 + 20) / 3 = 16
+    assert {entry["student_id"]: entry["average"] for entry in body["ranking"]} == {
+        students[0]["_id"]: 10, students[2]["_id"]: 16
+    }
+    by_subject = (await client.get(
+        "/api/statistics/classes/classe", params={"subject_id": cohort["subject"]["id"]}
+    )).json()
+    assert [entry["average"] for entry in by_subject["ranking"]] == [14, 10]
+    assert (await client.get("/api/statistics/classes/inconnue")).status_code == 404
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index MongoDB : unicité des comptes garantie par les index et création idempotente
+"""
+
+import asyncio
+
+import pytest
+
+from backend.database import db
+from backend.indexes import REQUIRED_INDEXES, ensure_indexes
+from backend.services import DUPLICATE_USER_MESSAGES
+
+pytestmark = pytest.mark.anyio
+
+
+def _student(number: int, **fields) -> dict:
+    return {
+        "username": f"etudiant{number}", "firstname": "Prénom", "lastname": f"Nom{number}",
+        "email": f"etudiant{number}@example.com", "password": "secret1",
+        "student_id_num": f"E{number:05d}", **fields
+    }
+
+
+@pytest.mark.parametrize("field", ["username", "email"])
+async def test_concurrent_duplicate_is_rejected(client, field):
+    first, second = _student(1), _student(2)
+    second[field] = first[field]
+
+    # Pas de vérification préalable : seule l'une des deux insertions passe l'index
+    responses = await asyncio.gather(
+        client.post("/api/admin/users/students", json=first),
+        client.post("/api/admin/users/students", json=second),
+    )
+    assert sorted(response.status_code for response in responses) == [200, 400]
+    rejected = next(response for response in responses if response.status_code == 400)
+    assert rejected.json()["detail"] == DUPLICATE_USER_MESSAGES[field]
+    assert await db.users.count_documents({field: first[field]}) == 1
+
+
+async def test_ensure_indexes_is_idempotent(client):
+    await ensure_indexes()
+    before = {
+        collection: sorted([index["name"] async for index in db[collection].list_indexes()])
+        for collection in REQUIRED_INDEXES
+    }
+    await ensure_indexes()
+    after = {
+        collection: sorted([index["name"] async for index in db[collection].list_indexes()])
+        for collection in REQUIRED_INDEXES
+    }
+    assert after == before
+    for collection, indexes in REQUIRED_INDEXES.items():
+        assert {index.document["name"] for index in indexes} <= set(after[collection])
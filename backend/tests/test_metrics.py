@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MetricsMiddleware : latence et requêtes en cours, hors flux Server-Sent Events
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from prometheus_client import REGISTRY
+
+from backend.metrics import MetricsMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def stream_app():
+    """Application minimale : une route JSON et un flux SSE piloté par le test"""
+    app = FastAPI()
+    app.state.release = asyncio.Event()
+
+    @app.get("/tests/json")
+    async def json_route():
+        return {"ok": True}
+
+    @app.get("/tests/events")
+    async def events_route():
+        async def events():
+            yield "event: ping\ndata: {}\n\n"
+            await app.state.release.wait()
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+async def _call(app, path: str, sent: list):
+    middleware = MetricsMiddleware(app, app)
+    scope = {
+        "type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+        "root_path": "", "scheme": "http", "query_string": b"", "headers": [],
+        "server": ("test", 80), "client": ("test", 1234), "http_version": "1.1",
+    }
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+
+
+async def test_event_stream_excluded_from_latency_and_in_progress(stream_app):
+    in_progress = _sample("http_requests_in_progress", method="GET")
+    streams = _sample("http_event_streams_open", route="/tests/events")
+    sent = []
+    task = asyncio.create_task(_call(stream_app, "/tests/events", sent))
+    while not any(message.get("body") for message in sent):
+        await asyncio.sleep(0.01)
+
+    # Flux ouvert : compté à part, pas comme requête en cours
+    assert _sample("http_requests_in_progress", method="GET") == in_progress
+    assert _sample("http_event_streams_open", route="/tests/events") == streams + 1
+
+    stream_app.state.release.set()
+    await task
+    assert _sample("http_event_streams_open", route="/tests/events") == streams
+    assert _sample("http_requests_in_progress", method="GET") == in_progress
+    assert _sample(
+        "http_request_duration_seconds_count", method="GET", route="/tests/events", status="200"
+    ) == 0
+
+
+async def test_regular_request_is_measured(stream_app):
+    count = _sample("http_request_duration_seconds_count", method="GET", route="/tests/json", status="200")
+    in_progress = _sample("http_requests_in_progress", method="GET")
+    await _call(stream_app, "/tests/json", [])
+    assert _sample(
+        "http_request_duration_seconds_count", method="GET", route="/tests/json", status="200"
+    ) == count + 1
+    assert _sample("http_requests_in_progress", method="GET") == in_progress
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pagination par curseur (limit / after, en-tête X-Next-Cursor)
+"""
+
+import pytest
+
+from backend.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+
+pytestmark = pytest.mark.anyio
+
+
+async def _all_pages(client, url: str, limit: int, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        query = {"limit": limit, **params, **({"after": cursor} if cursor else {})}
+        response = await client.get(url, params=query)
+        assert response.status_code == 200
+        pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+async def test_grades_pages_cover_every_grade_once(client, factory):
+    student, subject = await factory.user("STUDENT"), await factory.subject()
+    created = {(await factory.grade(student, subject, value))["id"] for value in range(7)}
+
+    pages = await _all_pages(client, f"/api/grades/student/{student['_id']}", limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    ids = [grade["id"] for page in pages for grade in page]
+    assert ids == sorted(ids)
+    assert set(ids) == created
+
+
+async def test_exact_last_page_has_no_cursor(client, factory):
+    student, subject = await factory.user("STUDENT"), await factory.subject()
+    for value in range(4):
+        await factory.grade(student, subject, value)
+
+    pages = await _all_pages(client, f"/api/grades/student/{student['_id']}", limit=2)
+    assert [len(page) for page in pages] == [2, 2]
+
+
+async def test_users_pages_never_expose_password(client, factory):
+    for _ in range(5):
+        await factory.user("STUDENT")
+    pages = await _all_pages(client, "/api/admin/users", limit=2, role="STUDENT")
+    users = [user for page in pages for user in page]
+    assert len(users) == 5
+    assert all(user["role"] == "STUDENT" and "password" not in user for user in users)
+
+
+@pytest.mark.parametrize("limit", [0, MAX_PAGE_SIZE + 1])
+async def test_limit_out_of_bounds_is_rejected(client, limit):
+    response = await client.get("/api/subjects", params={"limit": limit})
+    assert response.status_code == 422
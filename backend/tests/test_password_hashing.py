@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hachage des mots de passe : refus (503) au-delà des demandes en attente tolérées
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from backend import password_hashing
+from backend.password_hashing import pending_hash_count
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_login_rejected_with_retry_after_when_pool_is_full(client, factory, monkeypatch):
+    monkeypatch.setattr(password_hashing, "PASSWORD_HASH_MAX_PENDING", 1)
+    monkeypatch.setattr(password_hashing, "PASSWORD_HASH_RETRY_AFTER", 3)
+    released = threading.Event()
+    verify = password_hashing._timed_verify
+
+    def blocked_verify(plain_password, hashed_password):
+        released.wait(5)
+        return verify(plain_password, hashed_password)
+
+    monkeypatch.setattr(password_hashing, "_timed_verify", blocked_verify)
+    student = await factory.user("STUDENT")
+    credentials = {"username": student["username"], "password": "secret1"}
+
+    # Première connexion : occupe la seule place du pool
+    first = asyncio.create_task(client.post("/api/auth/signin", json=credentials))
+    try:
+        for _ in range(100):
+            if pending_hash_count() == 1:
+                break
+            await asyncio.sleep(0.01)
+        assert pending_hash_count() == 1
+
+        rejected = await client.post("/api/auth/signin", json=credentials)
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == "3"
+    finally:
+        released.set()
+    assert (await first).status_code == 200
+    assert pending_hash_count() == 0
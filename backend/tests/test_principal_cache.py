@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des utilisateurs authentifiés : durée de vie, éviction LRU,
+invalidation et statistiques
+"""
+
+import pytest
+
+from backend import principal_cache as principal_cache_module
+from backend.database import db
+from backend.principal_cache import PrincipalCache, invalidate_principal, principal_cache
+
+
+def _user(number: int) -> dict:
+    return {"_id": f"id{number}", "username": f"user{number}", "role": "STUDENT"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Horloge monotone pilotée par le test"""
+    now = [1000.0]
+    monkeypatch.setattr(principal_cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = PrincipalCache(ttl_seconds=60, max_size=10)
+    cache.put("user1", _user(1))
+    clock[0] += 59
+    assert cache.get("user1") == _user(1)
+    clock[0] += 2
+    assert cache.get("user1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_zero_ttl_disables_cache():
+    cache = PrincipalCache(ttl_seconds=0, max_size=10)
+    cache.put("user1", _user(1))
+    assert cache.get("user1") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PrincipalCache(ttl_seconds=60, max_size=2)
+    cache.put("user1", _user(1))
+    cache.put("user2", _user(2))
+    # user1 relu : user2 devient le moins récemment utilisé
+    assert cache.get("user1") is not None
+    cache.put("user3", _user(3))
+    assert cache.get("user2") is None
+    assert cache.get("user1") is not None and cache.get("user3") is not None
+    # L'entrée évincée n'est plus invalidable par son ID
+    cache.invalidate(user_id="id2")
+    assert cache.stats()["size"] == 2
+
+
+def test_invalidate_by_id_or_username():
+    cache = PrincipalCache(ttl_seconds=60, max_size=10)
+    cache.put("user1", _user(1))
+    cache.put("user2", _user(2))
+    cache.invalidate(user_id="id1")
+    cache.invalidate(username="user2")
+    assert cache.get("user1") is None and cache.get("user2") is None
+
+
+def test_hit_ratio():
+    cache = PrincipalCache(ttl_seconds=60, max_size=10)
+    assert cache.stats()["hit_ratio"] == 0.0
+    cache.put("user1", _user(1))
+    for username in ("user1", "user1", "user1", "absent"):
+        cache.get(username)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (3, 1, 0.75)
+
+
+@pytest.mark.anyio
+async def test_deleted_user_is_rejected_immediately(client, factory):
+    student = await factory.user("STUDENT")
+    headers = factory.token(student)
+    assert (await client.get("/api/auth/me", headers=headers)).status_code == 200
+    assert principal_cache.get(student["username"]) is not None
+
+    assert (await client.delete(f"/api/admin/users/delete/{student['_id']}")).status_code == 200
+    assert principal_cache.get(student["username"]) is None
+    assert (await client.get("/api/auth/me", headers=headers)).status_code == 401
+
+
+@pytest.mark.anyio
+async def test_role_change_applies_after_invalidation(client, factory):
+    user = await factory.user("STUDENT")
+    headers = factory.token(user)
+    assert (await client.get("/api/auth/me", headers=headers)).json()["role"] == "STUDENT"
+
+    await db.users.update_one({"_id": user["_id"]}, {"$set": {"role": "TEACHER"}})
+    # Sans invalidation, l'ancien rôle reste en cache jusqu'à expiration
+    assert (await client.get("/api/auth/me", headers=headers)).json()["role"] == "STUDENT"
+    invalidate_principal(user_id=user["_id"])
+    assert (await client.get("/api/auth/me", headers=headers)).json()["role"] == "TEACHER"
+
+
+@pytest.mark.anyio
+async def test_stats_route(client):
+    principal_cache.clear()
+    principal_cache.hits = principal_cache.misses = 0
+    await client.get("/api/auth/me")
+    stats = (await client.get("/api/admin/cache/principals")).json()
+    # Première requête : lecture en base ; seconde : servie par le cache
+    assert (stats["misses"], stats["hits"], stats["hit_ratio"]) == (1, 1, 0.5)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Budgets de commandes MongoDB des routes de lecture
+
+Chaque route est appelée sur un jeu de données où une lecture par
+élément (N+1) dépasserait nettement le budget : 20 notes réparties sur
+plusieurs étudiants, matières et enseignants.
+"""
+
+import pytest
+
+from backend.query_diagnostics import query_budget
+
+pytestmark = pytest.mark.anyio
+
+ITEMS = 20
+
+
+@pytest.fixture
+async def dataset(factory):
+    subjects = [await factory.subject(coefficient=c) for c in (1.0, 2.0, 3.0)]
+    teachers = [await factory.user("TEACHER") for _ in range(3)]
+    students = [await factory.user("STUDENT") for _ in range(ITEMS)]
+    for index in range(ITEMS):
+        await factory.grade(
+            students[0], subjects[index % 3], 10 + index % 10,
+            recorded_by_teacher_id=teachers[index % 3]["_id"]
+        )
+        await factory.grade(students[index], subjects[0], 12, semester="S1")
+    return {"students": students, "subjects": subjects}
+
+
+async def test_student_grades_budget(client, dataset):
+    student = dataset["students"][0]
+    with query_budget(max_queries=5, max_repeats=1) as reports:
+        response = await client.get(f"/api/grades/student/{student['_id']}")
+    assert response.status_code == 200
+    assert len(response.json()) == ITEMS + 1
+    assert reports[0]["route"] == "/api/grades/student/{student_id}"
+
+
+async def test_subject_grades_budget(client, dataset):
+    subject = dataset["subjects"][0]
+    with query_budget(max_queries=5, max_repeats=1):
+        response = await client.get(f"/api/grades/subject/{subject['id']}")
+    assert response.status_code == 200
+    assert len({grade["student_id"] for grade in response.json()}) == ITEMS
+
+
+async def test_average_budget(client, dataset):
+    student = dataset["students"][0]
+    with query_budget(max_queries=3, max_repeats=1):
+        response = await client.get(f"/api/students/{student['_id']}/average")
+    assert response.status_code == 200
+    assert len(response.json()["subject_averages"]) == 3
+
+
+async def test_transcript_budget(client, dataset):
+    student = dataset["students"][0]
+    with query_budget(max_queries=6, max_repeats=1):
+        response = await client.get(f"/api/students/{student['_id']}/transcript/pdf")
+    assert response.status_code == 200
+    assert response.content.startswith(b"%PDF")
+
+
+async def test_budget_detects_n_plus_one(client, dataset):
+    """Une lecture par élément dans une route fait échouer le budget"""
+    from backend.database import db
+
+    async def per_item_route():
+        async for grade in db.grades.find({"student_id": dataset["students"][0]["_id"]}):
+            await db.users.find_one({"_id": grade["student_id"]})
+        return {}
+
+    server_app = client._transport.app
+    server_app.add_api_route("/api/tests/n-plus-one", per_item_route)
+    try:
+        with pytest.raises(AssertionError, match="forme répétée"):
+            with query_budget(max_repeats=1):
+                await client.get("/api/tests/n-plus-one")
+    finally:
+        server_app.router.routes.pop()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des réponses : ETag et requêtes conditionnelles If-None-Match
+"""
+
+import pytest
+
+from backend.response_cache import etag_matches
+
+ETAG = '"abc"'
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ('"other",W/"abc"', True),
+    ('"x,y", "abc"', True),
+    ("*", True),
+    ('"other"', False),
+    ('"ab"', False),
+    ("abc", False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, ETAG) is expected
+
+
+@pytest.mark.anyio
+async def test_subjects_conditional_request(client, factory):
+    await factory.subject()
+    first = await client.get("/api/subjects")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    for header in (etag, f"W/{etag}", f'"perime", {etag}', "*"):
+        response = await client.get("/api/subjects", headers={"If-None-Match": header})
+        assert response.status_code == 304, header
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    stale = await client.get("/api/subjects", headers={"If-None-Match": '"perime"'})
+    assert stale.status_code == 200
+    assert stale.json() == first.json()
+
+    # Une écriture invalide le cache : l'ancien ETag ne correspond plus
+    await factory.subject()
+    changed = await client.get("/api/subjects", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
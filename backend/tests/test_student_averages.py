@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Moyennes pré-agrégées : mises à jour $inc des routes de notes et
+réconciliation des agrégats divergents
+"""
+
+import asyncio
+
+import pytest
+
+from backend.database import db
+from backend.student_averages import AVERAGES_COLLECTION, _average_id, reconcile_student_averages
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def graded(factory):
+    student = await factory.user("STUDENT")
+    maths = await factory.subject(coefficient=2.0)
+    history = await factory.subject(coefficient=1.0)
+    grades = [
+        await factory.grade(student, maths, 12),
+        await factory.grade(student, maths, 16),
+        await factory.grade(student, history, 9),
+    ]
+    return {"student": student, "maths": maths, "history": history, "grades": grades}
+
+
+async def _aggregate(student, subject, semester=None):
+    return await db[AVERAGES_COLLECTION].find_one({"_id": _average_id(student["_id"], subject["id"], semester)})
+
+
+async def _general_average(client, student) -> float:
+    response = await client.get(f"/api/students/{student['_id']}/average")
+    assert response.status_code == 200
+    return response.json()["general_average"]
+
+
+async def test_create_increments_aggregate(client, graded):
+    aggregate = await _aggregate(graded["student"], graded["maths"])
+    assert (aggregate["sum"], aggregate["count"]) == (28, 2)
+    # (14 × 2 + 9 × 1) / 3
+    assert await _general_average(client, graded["student"]) == pytest.approx(37 / 3, abs=0.01)
+
+
+async def test_update_and_delete_adjust_aggregate(client, graded):
+    first, second = graded["grades"][:2]
+    assert (await client.put(f"/api/grades/{first['id']}", json={"value": 20})).status_code == 200
+    aggregate = await _aggregate(graded["student"], graded["maths"])
+    assert (aggregate["sum"], aggregate["count"]) == (36, 2)
+
+    assert (await client.delete(f"/api/grades/{second['id']}")).status_code == 200
+    aggregate = await _aggregate(graded["student"], graded["maths"])
+    assert (aggregate["sum"], aggregate["count"]) == (20, 1)
+
+    # Dernière note de la matière : l'agrégat disparaît
+    assert (await client.delete(f"/api/grades/{first['id']}")).status_code == 200
+    assert await _aggregate(graded["student"], graded["maths"]) is None
+
+
+async def test_bulk_create_increments_aggregates(client, graded):
+    student, history = graded["student"], graded["history"]
+    response = await client.post("/api/grades/bulk", json={"grades": [
+        {"student_id": student["_id"], "subject_id": history["id"], "value": 11},
+        {"student_id": student["_id"], "subject_id": history["id"], "value": 13, "semester": "S1"},
+        {"student_id": student["_id"], "subject_id": history["id"], "value": 7, "semester": "S1"},
+    ]})
+    assert response.json()["inserted"] == 3
+    aggregate = await _aggregate(student, history)
+    assert (aggregate["sum"], aggregate["count"]) == (20, 2)
+    aggregate = await _aggregate(student, history, "S1")
+    assert (aggregate["sum"], aggregate["count"]) == (20, 2)
+
+
+async def test_consistent_aggregates_are_left_alone(client, graded):
+    assert await reconcile_student_averages(grace_seconds=0) == 0
+
+
+async def test_reconcile_repairs_drift(client, factory, graded):
+    student, maths, history = graded["student"], graded["maths"], graded["history"]
+    expected = await _general_average(client, student)
+
+    # Écart de somme (écriture de la note sans son $inc)
+    await db[AVERAGES_COLLECTION].update_one(
+        {"_id": _average_id(student["_id"], maths["id"], None)}, {"$inc": {"sum": 5, "count": 1}}
+    )
+    # Agrégat perdu
+    await db[AVERAGES_COLLECTION].delete_one({"_id": _average_id(student["_id"], history["id"], None)})
+    # Agrégat orphelin d'un autre étudiant (notes supprimées sans décrément)
+    other = await factory.user("STUDENT")
+    orphan = await factory.grade(other, history, 10)
+    await db.grades.delete_one({"_id": orphan["id"]})
+    assert await _general_average(client, student) != pytest.approx(expected, abs=0.01)
+
+    assert await reconcile_student_averages(grace_seconds=0) == 3
+    assert await _general_average(client, student) == pytest.approx(expected, abs=0.01)
+    assert await _aggregate(other, history) is None
+    assert await reconcile_student_averages(grace_seconds=0) == 0
+
+
+async def test_reconcile_counts_grades_written_without_aggregate(client, graded):
+    student, maths = graded["student"], graded["maths"]
+    await db.grades.insert_one({
+        "_id": "note-directe", "student_id": student["_id"], "subject_id": maths["id"],
+        "value": 20, "semester": None
+    })
+    assert await reconcile_student_averages(grace_seconds=0) == 1
+    aggregate = await _aggregate(student, maths)
+    assert (aggregate["sum"], aggregate["count"]) == (48, 3)
+
+
+async def test_reconcile_skips_grades_of_deleted_subject(client, graded):
+    student, history = graded["student"], graded["history"]
+    await db.subjects.delete_one({"_id": history["id"]})
+    await db[AVERAGES_COLLECTION].delete_one({"_id": _average_id(student["_id"], history["id"], None)})
+    assert await reconcile_student_averages(grace_seconds=0) == 0
+    assert await _aggregate(student, history) is None
+
+
+async def test_reconcile_removes_aggregates_of_deleted_subject_and_student(client, factory, graded):
+    student, maths, history = graded["student"], graded["maths"], graded["history"]
+    other = await factory.user("STUDENT")
+    await factory.grade(other, maths, 10)
+    await db.subjects.delete_one({"_id": history["id"]})
+    await db.users.delete_one({"_id": other["_id"]})
+
+    assert await reconcile_student_averages(grace_seconds=0) == 2
+    assert await _aggregate(student, history) is None
+    assert await _aggregate(other, maths) is None
+    assert await _aggregate(student, maths) is not None
+    # Plus aucun écart : pas de délai de grâce aux passes suivantes
+    assert await asyncio.wait_for(reconcile_student_averages(grace_seconds=30), 1) == 0
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Relevés PDF : rendu, cache adressé par contenu et enregistrements persistants
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import asyncio
+import os
+
+import pytest
+
+from backend.database import db
+from backend.transcript_cache import TRANSCRIPT_CACHE_DIR, enforce_cache_size, invalidate_student_transcripts
+from backend import transcript_jobs, transcript_rendering
+from backend.transcript_jobs import resume_transcript_jobs, transcript_filepath
+from backend.transcript_rendering import write_merged_transcripts, write_transcript_pdf
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def student(factory):
+    student = await factory.user("STUDENT")
+    subject = await factory.subject(coefficient=2.0)
+    await factory.grade(student, subject, 14)
+    return student
+
+
+async def _wait_generated(client, transcript_id: str) -> dict:
+    for _ in range(200):
+        status = (await client.get(f"/api/transcripts/{transcript_id}")).json()
+        if status["status"] != "PENDING":
+            return status
+        await asyncio.sleep(0.05)
+    raise AssertionError("relevé toujours en cours de génération")
+
+
+async def test_repeat_request_reuses_record(client, student):
+    first = await client.get(f"/api/students/{student['_id']}/transcript/pdf")
+    second = await client.get(f"/api/students/{student['_id']}/transcript/pdf")
+    assert first.status_code == second.status_code == 200
+    assert first.content.startswith(b"%PDF")
+    assert first.headers["X-Transcript-Id"] == second.headers["X-Transcript-Id"]
+    assert await db.transcripts.count_documents({"student_id": student["_id"]}) == 1
+
+
+async def test_record_file_survives_cache_eviction(client, student):
+    response = await client.get(f"/api/students/{student['_id']}/transcript/pdf")
+    transcript_id = response.headers["X-Transcript-Id"]
+    record = await db.transcripts.find_one({"_id": transcript_id})
+    assert record["filepath"] == transcript_filepath(transcript_id)
+    assert not record["filepath"].startswith(TRANSCRIPT_CACHE_DIR)
+
+    enforce_cache_size(0)
+    await invalidate_student_transcripts(student["_id"])
+
+    download = await client.get(f"/api/transcripts/{transcript_id}/file")
+    assert download.status_code == 200
+    assert download.content == response.content
+
+
+async def test_missing_record_file_is_rewritten(client, student):
+    response = await client.get(f"/api/students/{student['_id']}/transcript/pdf")
+    transcript_id = response.headers["X-Transcript-Id"]
+    os.remove(transcript_filepath(transcript_id))
+    enforce_cache_size(0)
+
+    again = await client.get(f"/api/students/{student['_id']}/transcript/pdf")
+    assert again.status_code == 200
+    assert again.headers["X-Transcript-Id"] == transcript_id
+    assert os.path.exists(transcript_filepath(transcript_id))
+
+
+async def test_queued_transcript_survives_cache_eviction(client, student):
+    response = await client.post(f"/api/students/{student['_id']}/transcripts")
+    assert response.status_code == 202
+    transcript_id = response.json()["transcript_id"]
+    assert (await _wait_generated(client, transcript_id))["status"] == "GENERATED"
+
+    enforce_cache_size(0)
+    download = await client.get(f"/api/transcripts/{transcript_id}/file")
+    assert download.status_code == 200
+    assert download.content.startswith(b"%PDF")
+
+
+def _expired() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=transcript_jobs.TRANSCRIPT_JOB_LEASE_SECONDS + 1)
+
+
+async def _interrupted_transcript(student_id: str, claimed_at=None) -> str:
+    """Relevé PENDING laissé par un worker arrêté (aucune tâche en cours)"""
+    record = await transcript_jobs.create_transcript_record(student_id, None, content_hash="ancien")
+    if claimed_at is None:
+        await db.transcripts.update_one({"_id": record["_id"]}, {"$unset": {"claimed_at": ""}})
+    else:
+        await db.transcripts.update_one({"_id": record["_id"]}, {"$set": {"claimed_at": claimed_at}})
+    return record["_id"]
+
+
+async def test_interrupted_transcript_is_resumed(client, student):
+    transcript_id = await _interrupted_transcript(student["_id"], _expired())
+    live_id = await _interrupted_transcript(student["_id"], datetime.utcnow())
+
+    assert await resume_transcript_jobs() == 1
+    assert (await _wait_generated(client, transcript_id))["status"] == "GENERATED"
+    download = await client.get(f"/api/transcripts/{transcript_id}/file")
+    assert download.content.startswith(b"%PDF")
+    # Bail encore valide : travail d'un autre worker, laissé en l'état
+    assert (await db.transcripts.find_one({"_id": live_id}))["status"] == "PENDING"
+
+
+async def test_interrupted_transcript_of_deleted_student_fails(client, student):
+    transcript_id = await _interrupted_transcript(student["_id"])
+    await db.users.delete_one({"_id": student["_id"]})
+
+    assert await resume_transcript_jobs() == 1
+    record = await db.transcripts.find_one({"_id": transcript_id})
+    assert (record["status"], record["error"]) == ("ERROR", "Étudiant non trouvé")
+
+
+async def test_interrupted_batch_is_resumed(client, student):
+    batch_id = "lot-interrompu"
+    await db.transcript_batches.insert_one({
+        "_id": batch_id, "scope": {}, "semester": None, "format": "zip", "status": "PENDING",
+        "total": 1, "done": 1, "requested_by": "admin", "student_ids": [student["_id"]],
+        "filepath": os.path.join(transcript_jobs.TRANSCRIPT_STORAGE_DIR, "batches", f"{batch_id}.zip"),
+        "created_at": _expired(), "claimed_at": _expired()
+    })
+    await db.transcript_batches.insert_one({
+        "_id": "lot-ancien", "scope": {}, "semester": None, "format": "zip", "status": "PENDING",
+        "total": 1, "done": 0, "filepath": "inutilise.zip", "created_at": _expired()
+    })
+
+    assert await resume_transcript_jobs() == 1
+    for _ in range(200):
+        status = (await client.get(f"/api/transcripts/bulk/{batch_id}")).json()
+        if status["status"] != "PENDING":
+            break
+        await asyncio.sleep(0.05)
+    assert (status["status"], status["done"]) == ("GENERATED", 1)
+    assert (await db.transcript_batches.find_one({"_id": "lot-ancien"}))["status"] == "ERROR"
+
+
+async def _held_job(student_id: str) -> tuple:
+    """Relevé PENDING détenu par ce worker, en attente dans la file du pool"""
+    record = await transcript_jobs.create_transcript_record(student_id, None, content_hash="en-file")
+    released = asyncio.Event()
+    transcript_jobs._start("transcripts", record["_id"], released.wait())
+    return record, released
+
+
+async def _wait_released(transcript_id: str):
+    for _ in range(100):
+        if ("transcripts", transcript_id) not in transcript_jobs._held_jobs:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("travail toujours détenu")
+
+
+async def test_lease_renewed_while_job_is_queued(client, student, monkeypatch):
+    monkeypatch.setattr(transcript_jobs, "TRANSCRIPT_JOB_LEASE_SECONDS", 0.3)
+    record, released = await _held_job(student["_id"])
+
+    # En file au-delà de la durée du bail : claimed_at est renouvelé
+    await asyncio.sleep(0.5)
+    stored = await db.transcripts.find_one({"_id": record["_id"]})
+    assert stored["claimed_by"] == transcript_jobs.WORKER_ID
+    assert datetime.utcnow() - stored["claimed_at"] < timedelta(seconds=0.3)
+    assert await resume_transcript_jobs() == 0
+
+    released.set()
+    await _wait_released(record["_id"])
+
+
+async def test_job_held_by_this_worker_is_not_reclaimed(client, student):
+    record, released = await _held_job(student["_id"])
+    # Boucle bloquée plus longtemps que le bail : le travail reste à ce worker
+    await db.transcripts.update_one({"_id": record["_id"]}, {"$set": {"claimed_at": _expired()}})
+    assert await resume_transcript_jobs() == 0
+    assert (await db.transcripts.find_one({"_id": record["_id"]}))["content_hash"] == "en-file"
+
+    released.set()
+    await _wait_released(record["_id"])
+    # Travail terminé sans mise à jour : le bail expiré est repris
+    assert await resume_transcript_jobs() == 1
+    assert (await _wait_generated(client, record["_id"]))["status"] == "GENERATED"
+
+
+def test_concurrent_writes_of_same_file(tmp_path):
+    filepath = str(tmp_path / "releve.pdf")
+    student = {"lastname": "Nom", "firstname": "Prénom", "email": "e@example.com", "student_id_num": "E1"}
+    average_data = {"subject_averages": [], "general_average": 0.0, "total_coefficient": 0.0}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sizes = list(executor.map(
+            lambda _: write_transcript_pdf(filepath, student, average_data), range(8)
+        ))
+    assert len(set(sizes)) == 1
+    assert os.listdir(tmp_path) == ["releve.pdf"]
+
+
+def test_merged_transcripts_replace_file_atomically(tmp_path, monkeypatch):
+    filepath = str(tmp_path / "lot.pdf")
+    student = {"lastname": "Nom", "firstname": "Prénom", "email": "e@example.com", "student_id_num": "E1"}
+    average_data = {"subject_averages": [], "general_average": 0.0, "total_coefficient": 0.0}
+    assert write_merged_transcripts(filepath, [("a.pdf", student, average_data)] * 2) == 2
+    with open(filepath, "rb") as f:
+        assert f.read().startswith(b"%PDF")
+
+    # Rendu interrompu : le PDF précédent reste intact, sans fichier temporaire
+    def failing_build(output, story):
+        output.write(b"%PDF-partiel")
+        raise RuntimeError("rendu interrompu")
+
+    monkeypatch.setattr(transcript_rendering, "_build_document", failing_build)
+    with pytest.raises(RuntimeError):
+        write_merged_transcripts(filepath, [("b.pdf", student, average_data)])
+    with open(filepath, "rb") as f:
+        assert not f.read().startswith(b"%PDF-partiel")
+    assert os.listdir(tmp_path) == ["lot.pdf"]
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suppression en cascade des utilisateurs et bail des suppressions en cours
+"""
+
+from datetime import datetime, timedelta
+import asyncio
+import uuid
+
+import pytest
+
+from backend import user_deletion
+from backend.database import db
+from backend.student_averages import AVERAGES_COLLECTION
+from backend.user_deletion import STEPS, resume_user_deletions
+
+pytestmark = pytest.mark.anyio
+
+
+async def _wait_finished(client, deletion_id: str) -> dict:
+    for _ in range(200):
+        deletion = (await client.get(f"/api/admin/deletions/{deletion_id}")).json()
+        if deletion["status"] != "PENDING":
+            return deletion
+        await asyncio.sleep(0.01)
+    raise AssertionError("suppression toujours en cours")
+
+
+async def _pending_deletion(user_ids, claimed_by: str, claimed_at: datetime) -> str:
+    deletion_id = str(uuid.uuid4())
+    await db.user_deletions.insert_one({
+        "_id": deletion_id, "user_ids": user_ids, "scope": {}, "status": "PENDING",
+        "step": STEPS[0], "deleted": {step: 0 for step in STEPS}, "requested_by": "admin",
+        "created_at": claimed_at, "claimed_by": claimed_by, "claimed_at": claimed_at,
+        "updated_at": claimed_at
+    })
+    return deletion_id
+
+
+async def test_student_deletion_cascades(client, factory):
+    student, other = await factory.user("STUDENT"), await factory.user("STUDENT")
+    subject = await factory.subject()
+    for value in (10, 14):
+        await factory.grade(student, subject, value)
+    await factory.grade(other, subject, 12)
+    await db.enrollments.insert_one({"_id": "inscription", "student_id": student["_id"], "subject_id": subject["id"]})
+    assert (await client.get(f"/api/students/{student['_id']}/transcript/pdf")).status_code == 200
+
+    response = await client.delete(f"/api/admin/users/delete/{student['_id']}")
+    assert response.status_code == 200
+    deletion = await _wait_finished(client, response.json()["deletion_id"])
+
+    assert deletion["status"] == "COMPLETED"
+    assert deletion["deleted"]["grades"] == 2
+    assert deletion["deleted"]["transcripts"] == 1
+    for collection in ("grades", AVERAGES_COLLECTION, "enrollments", "transcripts"):
+        assert await db[collection].count_documents({"student_id": student["_id"]}) == 0
+    # Les données des autres étudiants sont intactes
+    assert await db.grades.count_documents({"student_id": other["_id"]}) == 1
+    assert await db[AVERAGES_COLLECTION].count_documents({"student_id": other["_id"]}) == 1
+
+
+async def test_teacher_deletion_keeps_recorded_grades(client, factory):
+    teacher, student = await factory.user("TEACHER"), await factory.user("STUDENT")
+    grade = await factory.grade(student, await factory.subject(), 15, recorded_by_teacher_id=teacher["_id"])
+
+    response = await client.delete(f"/api/admin/users/delete/{teacher['_id']}")
+    deletion = await _wait_finished(client, response.json()["deletion_id"])
+
+    assert deletion["deleted"]["recorded_grades"] == 1
+    stored = await db.grades.find_one({"_id": grade["id"]})
+    assert stored is not None and stored["recorded_by_teacher_id"] is None
+
+
+async def test_bulk_deletion_never_targets_admins(client, factory):
+    student = await factory.user("STUDENT")
+    response = await client.post("/api/admin/users/bulk-delete", json={
+        "user_ids": [student["_id"], client.admin["_id"]]
+    })
+    assert response.status_code == 202
+    assert response.json()["total_users"] == 1
+    await _wait_finished(client, response.json()["deletion_id"])
+    assert await db.users.find_one({"_id": client.admin["_id"]}) is not None
+    assert await db.users.find_one({"_id": student["_id"]}) is None
+
+
+async def test_live_lease_is_not_reclaimed(client, factory):
+    student = await factory.user("STUDENT")
+    deletion_id = await _pending_deletion([student["_id"]], "autre-worker", datetime.utcnow())
+
+    assert await resume_user_deletions() == 0
+    deletion = await db.user_deletions.find_one({"_id": deletion_id})
+    assert deletion["claimed_by"] == "autre-worker"
+    assert await db.users.find_one({"_id": student["_id"]}) is not None
+
+
+async def test_expired_lease_is_resumed(client, factory):
+    student = await factory.user("STUDENT")
+    expired = datetime.utcnow() - timedelta(seconds=user_deletion.USER_DELETION_LEASE_SECONDS + 1)
+    deletion_id = await _pending_deletion([student["_id"]], "worker-arrete", expired)
+
+    assert await resume_user_deletions() == 1
+    deletion = await _wait_finished(client, deletion_id)
+    assert deletion["status"] == "COMPLETED"
+    assert await db.users.find_one({"_id": student["_id"]}) is None
+
+
+async def test_worker_stops_after_losing_lease(client, factory):
+    student = await factory.user("STUDENT")
+    deletion_id = await _pending_deletion([student["_id"]], user_deletion.WORKER_ID, datetime.utcnow())
+    deletion = await db.user_deletions.find_one({"_id": deletion_id})
+    # Bail repris par un autre worker entre la lecture et le premier lot
+    await db.user_deletions.update_one({"_id": deletion_id}, {"$set": {"claimed_by": "autre-worker"}})
+
+    await user_deletion._run_user_deletion(deletion)
+
+    deletion = await db.user_deletions.find_one({"_id": deletion_id})
+    assert (deletion["status"], deletion["claimed_by"]) == ("PENDING", "autre-worker")
+    assert await db.users.find_one({"_id": student["_id"]}) is not None
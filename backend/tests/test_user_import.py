@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Import groupé de comptes : résultats NDJSON par ligne, CSV et XLSX
+"""
+
+import io
+import json
+
+import openpyxl
+import pytest
+
+from backend import user_import
+from backend.database import db
+from backend.password_hashing import pwd_context
+
+pytestmark = pytest.mark.anyio
+
+HEADER = ["username", "firstname", "lastname", "email", "password", "student_id_num"]
+
+
+@pytest.fixture(autouse=True)
+def fast_import(monkeypatch):
+    """Lots de 2 lignes et hachage bcrypt à coût réduit (sans pool de processus)"""
+    monkeypatch.setattr(user_import, "USER_IMPORT_BATCH_SIZE", 2)
+    fast_hash = pwd_context.handler("bcrypt").using(rounds=4).hash
+
+    async def hashes(passwords):
+        return [fast_hash(password) for password in passwords]
+
+    monkeypatch.setattr(user_import, "get_password_hashes", hashes)
+
+
+def _csv(rows, delimiter=";") -> bytes:
+    return "\n".join(delimiter.join(row) for row in [HEADER, *rows]).encode("utf-8")
+
+
+async def _import(client, filename: str, content: bytes, role: str = "STUDENT"):
+    return await client.post(
+        "/api/admin/users/import", params={"role": role},
+        files={"file": (filename, content, "application/octet-stream")}
+    )
+
+
+def _lines(response) -> list:
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_csv_import_reports_each_row(client, factory):
+    existing = await factory.user("STUDENT")
+    response = await _import(client, "etudiants.csv", _csv([
+        ["alice", "Alice", "Martin", "alice@example.com", "secret1", "E100"],
+        ["bob", "Bob", "Durand", "pas-un-email", "secret1", "E101"],
+        [],
+        ["alice", "Alice", "Bis", "alice2@example.com", "secret1", "E102"],
+        [existing["username"], "Déjà", "Là", "deja@example.com", "secret1", "E103"],
+        ["chloe", "Chloé", "Petit", "chloe@example.com", "secret1", "E104"],
+    ]))
+    assert response.status_code == 200
+    *results, summary = _lines(response)
+
+    # Numéros de ligne du fichier (en-tête en ligne 1, ligne vide ignorée)
+    assert [result["row"] for result in results] == [2, 3, 5, 6, 7]
+    assert [result["status"] for result in results] == ["created", "error", "error", "error", "created"]
+    assert results[1]["detail"].startswith("email")
+    assert results[2]["detail"] == "Ce nom d'utilisateur existe déjà"
+    assert results[3]["detail"] == "Ce nom d'utilisateur existe déjà"
+    assert summary == {"summary": {"total": 5, "created": 2, "failed": 3}}
+
+    alice = await db.users.find_one({"username": "alice"})
+    assert alice["_id"] == results[0]["user_id"]
+    assert (alice["role"], alice["student_id_num"]) == ("STUDENT", "E100")
+    assert pwd_context.verify("secret1", alice["password"])
+
+
+async def test_xlsx_teacher_import(client):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append([*HEADER[:5], "teacher_id_num"])
+    sheet.append(["prof", "Paul", "Prof", "prof@example.com", "secret1", 42])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+
+    response = await _import(client, "enseignants.xlsx", buffer.getvalue(), role="TEACHER")
+    *results, summary = _lines(response)
+    assert [result["status"] for result in results] == ["created"]
+    assert summary["summary"]["created"] == 1
+    teacher = await db.users.find_one({"username": "prof"})
+    assert (teacher["role"], teacher["teacher_id_num"]) == ("TEACHER", "42")
+
+
+@pytest.mark.parametrize("filename, content, detail", [
+    ("etudiants.txt", b"username", "Format non pris en charge (CSV ou XLSX attendu)"),
+    ("etudiants.csv", b"username;email\nalice;alice@example.com", "Colonnes manquantes"),
+    ("etudiants.xlsx", b"pas un classeur", "Classeur XLSX illisible"),
+])
+async def test_invalid_files_are_rejected(client, filename, content, detail):
+    response = await _import(client, filename, content)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith(detail)
+
+
+async def test_admins_cannot_be_imported(client):
+    response = await _import(client, "admins.csv", _csv([]), role="ADMIN")
+    assert response.status_code == 400
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des relevés PDF adressé par contenu
+
+La clé d'un relevé est l'empreinte SHA-256 de tout ce qui est imprimé
+dessus : identité de l'étudiant, semestre, moyennes par matière (donc
+l'état de ses notes) et date d'édition. Deux demandes de même clé
+produiraient le même PDF : le fichier déjà rendu est servi tel quel.
+
+Les PDF sont stockés sur disque sous le nom {student_id}_{clé}.pdf, ce
+qui permet d'invalider les relevés d'un seul étudiant lors d'une
+écriture de notes. La taille totale est bornée : au-delà, les fichiers
+les moins récemment servis (date de modification, mise à jour à chaque
+accès) sont supprimés. Le répertoire peut être partagé entre plusieurs
+workers.
+
+Paramètres (variables d'environnement) :
+- TRANSCRIPT_CACHE_DIR : répertoire du cache (défaut TRANSCRIPT_STORAGE_DIR/cache)
+- TRANSCRIPT_CACHE_MAX_BYTES : taille maximale du cache (défaut 256 Mo)
+"""
+
+from typing import Any, Dict, Iterable, Optional
+from datetime import datetime
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_CACHE_DIR = os.getenv(
+    'TRANSCRIPT_CACHE_DIR',
+    os.path.join(os.getenv('TRANSCRIPT_STORAGE_DIR', 'transcripts'), 'cache')
+)
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv('TRANSCRIPT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+
+def transcript_key(student: Dict[str, Any], average_data: Dict[str, Any],
+                   semester: Optional[str] = None) -> str:
+    """Empreinte du contenu d'un relevé (voir _transcript_story)"""
+    content = {
+        "student": [student["lastname"], student["firstname"],
+                    student.get("student_id_num"), student["email"]],
+        "semester": semester,
+        "edition_date": datetime.now().strftime("%d/%m/%Y"),
+        "subjects": [
+            [subject["subject_name"], subject["coefficient"], subject["grade_count"], subject["average"]]
+            for subject in average_data["subject_averages"]
+        ],
+        "general_average": average_data["general_average"],
+    }
+    encoded = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def cached_transcript_path(student_id: str, key: str) -> str:
+    """Emplacement du PDF en cache d'un relevé"""
+    return os.path.join(TRANSCRIPT_CACHE_DIR, f"{student_id}_{key}.pdf")
+
+
+def lookup_transcript(student_id: str, key: str) -> Optional[str]:
+    """Chemin du PDF en cache, ou None ; un succès le marque comme récemment utilisé"""
+    path = cached_transcript_path(student_id, key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def enforce_cache_size(max_bytes: int = TRANSCRIPT_CACHE_MAX_BYTES) -> int:
+    """Supprimer les PDF les moins récemment utilisés au-delà de max_bytes"""
+    entries = []
+    try:
+        with os.scandir(TRANSCRIPT_CACHE_DIR) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        evicted += 1
+    if evicted:
+        logger.info(f"Cache des relevés : {evicted} fichier(s) évincé(s)")
+    return evicted
+
+
+def _remove_student_transcripts(student_ids: Iterable[str]) -> int:
+    removed = 0
+    for student_id in student_ids:
+        for path in glob.glob(os.path.join(TRANSCRIPT_CACHE_DIR, f"{glob.escape(student_id)}_*.pdf")):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+async def invalidate_student_transcripts(*student_ids: str) -> int:
+    """Supprimer les relevés en cache des étudiants dont les notes ont changé"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _remove_student_transcripts, set(student_ids))
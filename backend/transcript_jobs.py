@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Génération asynchrone des relevés de notes
+
+Le rendu ReportLab est exécuté dans un pool de processus : il n'occupe
+ni la boucle d'événements ni le GIL des workers de l'API. Chaque relevé
+demandé est enregistré dans db.transcripts avec le statut PENDING, puis
+passe à GENERATED (PDF écrit à l'emplacement filepath) ou ERROR.
+
+Les relevés individuels passent par le cache adressé par contenu
+(transcript_cache.py) : une demande identique à un relevé déjà rendu
+réutilise son enregistrement db.transcripts, et un contenu déjà en cache
+n'est pas rendu de nouveau. Le PDF d'un enregistrement est toujours à
+transcript_filepath(id), hors du répertoire du cache : c'est un lien
+physique (à défaut une copie) du PDF en cache, que l'éviction ou
+l'invalidation du cache ne supprime pas.
+
+Les travaux ne vivent que dans le processus qui les a lancés. Chacun est
+détenu par un bail (claimed_by = WORKER_ID, claimed_at) que ce worker
+renouvelle toutes les TRANSCRIPT_JOB_LEASE_SECONDS / 3 tant que le travail
+n'est pas terminé, y compris pendant son attente dans la file du pool de
+rendu. Un relevé ou une génération groupée encore PENDING dont le bail a
+expiré a donc été interrompu par l'arrêt de son worker :
+resume_transcript_jobs, lancé au démarrage puis toutes les
+TRANSCRIPT_JOB_LEASE_SECONDS / 2, le reprend avec les données actuelles de
+l'étudiant (ou le passe à ERROR si l'étudiant n'existe plus). Les travaux
+encore détenus par ce worker ne sont jamais repris.
+
+Paramètres (variables d'environnement) :
+- TRANSCRIPT_STORAGE_DIR : répertoire de stockage des PDF (défaut transcripts)
+- TRANSCRIPT_RENDER_WORKERS : nombre de processus de rendu (défaut : nombre de cœurs)
+- TRANSCRIPT_BATCH_CHUNK_SIZE : relevés rendus par tâche lors d'une génération groupée
+- TRANSCRIPT_JOB_LEASE_SECONDS : durée sans renouvellement du bail au-delà de
+  laquelle un travail PENDING est repris (défaut 600)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+
+from .database import db
+from .metrics import RENDER_DURATION
+from .student_averages import get_average_report, get_average_reports
+from .transcript_rendering import (
+    write_transcript_pdf, render_transcript_batch, write_merged_transcripts
+)
+from .transcript_cache import (
+    transcript_key, cached_transcript_path, lookup_transcript, enforce_cache_size
+)
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_STORAGE_DIR = os.getenv('TRANSCRIPT_STORAGE_DIR', 'transcripts')
+TRANSCRIPT_RENDER_WORKERS = int(os.getenv('TRANSCRIPT_RENDER_WORKERS', str(os.cpu_count() or 2)))
+TRANSCRIPT_BATCH_CHUNK_SIZE = int(os.getenv('TRANSCRIPT_BATCH_CHUNK_SIZE', '25'))
+TRANSCRIPT_JOB_LEASE_SECONDS = float(os.getenv('TRANSCRIPT_JOB_LEASE_SECONDS', '600'))
+
+# Statuts (valeurs de TranscriptStatusEnum, défini dans server.py)
+STATUS_PENDING = "PENDING"
+STATUS_GENERATED = "GENERATED"
+STATUS_ERROR = "ERROR"
+
+WORKER_ID = str(uuid.uuid4())
+_executor: Optional[ProcessPoolExecutor] = None
+# Références des tâches en cours (évite leur destruction prématurée)
+_running_jobs = set()
+# Travaux détenus par ce worker : (collection, _id)
+_held_jobs = set()
+_recovery_task: Optional[asyncio.Task] = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Pool de processus de rendu, créé à la première utilisation"""
+    global _executor
+    if _executor is None:
+        # "spawn" : les processus ne doivent pas hériter des threads et
+        # connexions du serveur
+        _executor = ProcessPoolExecutor(
+            max_workers=TRANSCRIPT_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_render_pool():
+    """Arrêter le pool de rendu"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def transcript_filepath(transcript_id: str) -> str:
+    """Emplacement du PDF d'un relevé"""
+    return os.path.join(TRANSCRIPT_STORAGE_DIR, f"{transcript_id}.pdf")
+
+
+async def render_transcript_file(filepath: str, student: Dict[str, Any],
+                                 average_data: Dict[str, Any], semester: Optional[str]) -> int:
+    """Rendre un relevé dans le pool de processus et l'écrire à filepath"""
+    loop = asyncio.get_running_loop()
+    with RENDER_DURATION.labels(kind="transcript_pdf").time():
+        return await loop.run_in_executor(
+            get_render_pool(), write_transcript_pdf, filepath, student, average_data, semester
+        )
+
+
+async def create_transcript_record(student_id: str, semester: Optional[str],
+                                   status: str = STATUS_PENDING,
+                                   transcript_id: Optional[str] = None,
+                                   content_hash: Optional[str] = None) -> Dict[str, Any]:
+    """Enregistrer un relevé dans db.transcripts (PDF à transcript_filepath)"""
+    transcript_id = transcript_id or str(uuid.uuid4())
+    now = datetime.utcnow()
+    transcript_data = {
+        "_id": transcript_id,
+        "student_id": student_id,
+        "generation_date": now,
+        "status": status,
+        "filepath": transcript_filepath(transcript_id),
+        "semester": semester,
+        "content_hash": content_hash
+    }
+    if status == STATUS_PENDING:
+        transcript_data["claimed_by"] = WORKER_ID
+        transcript_data["claimed_at"] = now
+    await db.transcripts.insert_one(transcript_data)
+    return transcript_data
+
+
+def _link_or_copy(source: str, destination: str):
+    """Placer source à destination (lien physique, sinon copie), par renommage atomique"""
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    tmp_path = f"{destination}.{uuid.uuid4().hex}.tmp"
+    try:
+        try:
+            os.link(source, tmp_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # Liens physiques non pris en charge (autre système de fichiers...)
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+async def _enforce_cache_size():
+    """Borner la taille du cache des relevés (parcours du répertoire hors boucle)"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, enforce_cache_size)
+
+
+async def _find_generated_transcript(student_id: str, key: str) -> Optional[Dict[str, Any]]:
+    """Relevé déjà généré pour ce contenu"""
+    return await db.transcripts.find_one(
+        {"student_id": student_id, "content_hash": key, "status": STATUS_GENERATED}
+    )
+
+
+async def _write_transcript_file(filepath: str, key: str, student: Dict[str, Any],
+                                 average_data: Dict[str, Any], semester: Optional[str]):
+    """Écrire le PDF d'un relevé à filepath depuis le cache (rendu s'il en est absent)"""
+    student_id = str(student["_id"])
+    cache_path = lookup_transcript(student_id, key)
+    if cache_path is None:
+        cache_path = cached_transcript_path(student_id, key)
+        await render_transcript_file(cache_path, student, average_data, semester)
+        await _enforce_cache_size()
+
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, _link_or_copy, cache_path, filepath)
+    except FileNotFoundError:
+        # Évincé ou invalidé entre-temps : rendu direct
+        await render_transcript_file(filepath, student, average_data, semester)
+
+
+async def get_or_render_transcript(student: Dict[str, Any], average_data: Dict[str, Any],
+                                   semester: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Relevé correspondant aux données actuelles de l'étudiant
+
+    L'enregistrement db.transcripts n'est créé qu'à la première génération
+    de ce contenu ; si son PDF a disparu, il est réécrit (depuis le cache
+    ou par un nouveau rendu).
+    """
+    student_id = str(student["_id"])
+    key = transcript_key(student, average_data, semester)
+    transcript = await _find_generated_transcript(student_id, key)
+    if transcript is not None and os.path.exists(transcript["filepath"]):
+        return transcript
+
+    transcript_id = transcript["_id"] if transcript is not None else str(uuid.uuid4())
+    filepath = transcript_filepath(transcript_id)
+    await _write_transcript_file(filepath, key, student, average_data, semester)
+
+    if transcript is None:
+        return await create_transcript_record(
+            student_id, semester, STATUS_GENERATED, transcript_id, content_hash=key
+        )
+    await db.transcripts.update_one(
+        {"_id": transcript_id},
+        {"$set": {"filepath": filepath, "generation_date": datetime.utcnow()}}
+    )
+    return {**transcript, "filepath": filepath}
+
+
+async def _run_transcript_job(transcript: Dict[str, Any], student: Dict[str, Any],
+                              average_data: Dict[str, Any]):
+    """Exécuter un travail de génération et enregistrer son résultat"""
+    try:
+        await _write_transcript_file(
+            transcript["filepath"], transcript["content_hash"], student, average_data,
+            transcript["semester"]
+        )
+    except Exception as exc:
+        logger.exception(f"Échec de génération du relevé {transcript['_id']}")
+        await db.transcripts.update_one(
+            {"_id": transcript["_id"], "claimed_by": WORKER_ID},
+            {"$set": {"status": STATUS_ERROR, "error": str(exc)}}
+        )
+        return
+
+    await db.transcripts.update_one(
+        {"_id": transcript["_id"], "claimed_by": WORKER_ID},
+        {"$set": {"status": STATUS_GENERATED, "generation_date": datetime.utcnow()}}
+    )
+
+
+async def enqueue_transcript(student: Dict[str, Any], average_data: Dict[str, Any],
+                             semester: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Mettre en file la génération d'un relevé
+
+    Retourne immédiatement le document db.transcripts (statut PENDING) ;
+    le client suit l'avancement par son identifiant. Si le même contenu
+    a déjà été généré (et son PDF est présent), le relevé existant
+    (GENERATED) est retourné.
+    """
+    student_id = str(student["_id"])
+    key = transcript_key(student, average_data, semester)
+    transcript = await _find_generated_transcript(student_id, key)
+    if transcript is not None and os.path.exists(transcript["filepath"]):
+        return transcript
+
+    transcript = await create_transcript_record(student_id, semester, content_hash=key)
+    _start("transcripts", transcript["_id"], _run_transcript_job(transcript, student, average_data))
+    return transcript
+
+
+async def _renew_lease_periodically(collection: str, job_id: str):
+    """Renouveler le bail d'un travail tant qu'il est détenu par ce worker"""
+    while True:
+        await asyncio.sleep(TRANSCRIPT_JOB_LEASE_SECONDS / 3)
+        try:
+            result = await db[collection].update_one(
+                {"_id": job_id, "claimed_by": WORKER_ID, "status": STATUS_PENDING},
+                {"$set": {"claimed_at": datetime.utcnow()}}
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Échec du renouvellement du bail de {collection}/{job_id}")
+            continue
+        if result.matched_count == 0:
+            logger.warning(f"Bail de {collection}/{job_id} perdu")
+            return
+
+
+async def _run_with_lease(collection: str, job_id: str, job):
+    heartbeat = asyncio.create_task(_renew_lease_periodically(collection, job_id))
+    try:
+        await job
+    finally:
+        heartbeat.cancel()
+        _held_jobs.discard((collection, job_id))
+
+
+def _start(collection: str, job_id: str, job):
+    """Lancer un travail détenu par ce worker (bail renouvelé jusqu'à sa fin)"""
+    _held_jobs.add((collection, job_id))
+    task = asyncio.create_task(_run_with_lease(collection, job_id, job))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+
+# ===========================
+# GÉNÉRATION GROUPÉE (CLASSE / ANNÉE)
+# ===========================
+
+def _write_zip_entries(zip_path: str, files: List[tuple]):
+    """Ajouter des PDF à l'archive ZIP (les PDF sont déjà compressés)"""
+    with zipfile.ZipFile(zip_path, "a", compression=zipfile.ZIP_STORED) as archive:
+        for filename, content in files:
+            archive.writestr(filename, content)
+
+
+async def _run_transcript_batch(batch: Dict[str, Any], student_ids: List[str]):
+    """Charger les données en quelques requêtes puis rendre les relevés en parallèle"""
+    loop = asyncio.get_running_loop()
+    semester = batch["semester"]
+    try:
+        students = await db.users.find(
+            {"_id": {"$in": student_ids}, "role": "STUDENT"}, {"password": 0}
+        ).sort([("lastname", 1), ("firstname", 1)]).to_list(length=None)
+        reports = await get_average_reports([student["_id"] for student in students], semester)
+
+        items = [
+            (
+                f"releve_notes_{student['lastname']}_{student['firstname']}_"
+                f"{student.get('student_id_num', student['_id'])}.pdf",
+                student,
+                reports[student["_id"]]
+            )
+            for student in students
+        ]
+        await db.transcript_batches.update_one(
+            {"_id": batch["_id"]}, {"$set": {"total": len(items), "done": 0}}
+        )
+
+        os.makedirs(os.path.dirname(batch["filepath"]), exist_ok=True)
+        started = time.perf_counter()
+        if batch["format"] == "pdf":
+            # Un seul document : rendu d'un seul tenant dans un processus, écrit
+            # dans un fichier temporaire puis renommé ; le bail est renouvelé
+            # (voir _start) tant que le rendu est en file ou en cours
+            await loop.run_in_executor(
+                get_render_pool(), write_merged_transcripts, batch["filepath"], items, semester
+            )
+            await db.transcript_batches.update_one(
+                {"_id": batch["_id"]}, {"$set": {"done": len(items)}}
+            )
+        else:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(batch["filepath"]), prefix=f"{batch['_id']}.", suffix=".tmp"
+            )
+            os.close(fd)
+            zipfile.ZipFile(tmp_path, "w").close()
+            chunks = [
+                items[i:i + TRANSCRIPT_BATCH_CHUNK_SIZE]
+                for i in range(0, len(items), TRANSCRIPT_BATCH_CHUNK_SIZE)
+            ]
+            futures = [
+                loop.run_in_executor(get_render_pool(), render_transcript_batch, chunk, semester)
+                for chunk in chunks
+            ]
+            for future in asyncio.as_completed(futures):
+                files = await future
+                await loop.run_in_executor(None, _write_zip_entries, tmp_path, files)
+                await db.transcript_batches.update_one(
+                    {"_id": batch["_id"]}, {"$inc": {"done": len(files)}}
+                )
+            os.replace(tmp_path, batch["filepath"])
+        RENDER_DURATION.labels(kind=f"transcript_batch_{batch['format']}").observe(
+            time.perf_counter() - started
+        )
+    except Exception as exc:
+        logger.exception(f"Échec de la génération groupée {batch['_id']}")
+        await db.transcript_batches.update_one(
+            {"_id": batch["_id"], "claimed_by": WORKER_ID},
+            {"$set": {"status": STATUS_ERROR, "error": str(exc)}}
+        )
+        return
+
+    await db.transcript_batches.update_one(
+        {"_id": batch["_id"], "claimed_by": WORKER_ID},
+        {"$set": {"status": STATUS_GENERATED, "completed_at": datetime.utcnow()}}
+    )
+    logger.info(f"Génération groupée terminée : {batch['_id']} ({len(items)} relevés)")
+
+
+async def enqueue_transcript_batch(student_ids: List[str], scope: Dict[str, Any],
+                                   semester: Optional[str], output_format: str,
+                                   requested_by: str) -> Dict[str, Any]:
+    """
+    Mettre en file la génération groupée des relevés d'un ensemble d'étudiants
+
+    output_format : "zip" (un PDF par étudiant) ou "pdf" (document unique).
+    L'avancement (done / total) est tenu à jour dans db.transcript_batches.
+    """
+    batch_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    batch = {
+        "_id": batch_id,
+        "scope": scope,
+        "semester": semester,
+        "format": output_format,
+        "status": STATUS_PENDING,
+        "total": len(student_ids),
+        "done": 0,
+        "filepath": os.path.join(TRANSCRIPT_STORAGE_DIR, "batches", f"{batch_id}.{output_format}"),
+        "requested_by": requested_by,
+        "student_ids": list(student_ids),
+        "created_at": now,
+        "claimed_by": WORKER_ID,
+        "claimed_at": now
+    }
+    await db.transcript_batches.insert_one(batch)
+    _start("transcript_batches", batch_id, _run_transcript_batch(batch, student_ids))
+    return batch
+
+
+# ===========================
+# REPRISE DES TRAVAUX INTERROMPUS
+# ===========================
+
+def _expired_lease(collection: str) -> Dict[str, Any]:
+    """Travaux PENDING dont le bail n'est plus renouvelé, hors travaux de ce worker"""
+    cutoff = datetime.utcnow() - timedelta(seconds=TRANSCRIPT_JOB_LEASE_SECONDS)
+    held = [job_id for held_collection, job_id in _held_jobs if held_collection == collection]
+    # Sans claimed_at : travail créé avant l'introduction du bail
+    return {
+        "_id": {"$nin": held},
+        "status": STATUS_PENDING,
+        "$or": [{"claimed_at": {"$lt": cutoff}}, {"claimed_at": {"$exists": False}}]
+    }
+
+
+async def _claim(collection: str) -> Optional[Dict[str, Any]]:
+    return await db[collection].find_one_and_update(
+        _expired_lease(collection),
+        {"$set": {"claimed_by": WORKER_ID, "claimed_at": datetime.utcnow()}}
+    )
+
+
+async def _resume_transcript(transcript: Dict[str, Any]):
+    student = await db.users.find_one(
+        {"_id": transcript["student_id"], "role": "STUDENT"}, {"password": 0}
+    )
+    if student is None:
+        await db.transcripts.update_one(
+            {"_id": transcript["_id"]},
+            {"$set": {"status": STATUS_ERROR, "error": "Étudiant non trouvé"}}
+        )
+        return
+    # Relevé rendu avec les données actuelles (celles de la demande sont perdues)
+    average_data = await get_average_report(transcript["student_id"], transcript["semester"])
+    key = transcript_key(student, average_data, transcript["semester"])
+    await db.transcripts.update_one({"_id": transcript["_id"]}, {"$set": {"content_hash": key}})
+    _start(
+        "transcripts", transcript["_id"],
+        _run_transcript_job({**transcript, "content_hash": key}, student, average_data)
+    )
+
+
+async def resume_transcript_jobs() -> int:
+    """Reprendre les relevés et générations groupées dont le bail a expiré"""
+    resumed = 0
+    while True:
+        transcript = await _claim("transcripts")
+        if transcript is None:
+            break
+        await _resume_transcript(transcript)
+        resumed += 1
+    while True:
+        batch = await _claim("transcript_batches")
+        if batch is None:
+            break
+        if "student_ids" not in batch:
+            # Demande antérieure à l'enregistrement de la liste des étudiants
+            await db.transcript_batches.update_one(
+                {"_id": batch["_id"]},
+                {"$set": {"status": STATUS_ERROR, "error": "Génération interrompue, à redemander"}}
+            )
+            continue
+        _start("transcript_batches", batch["_id"], _run_transcript_batch(batch, batch["student_ids"]))
+        resumed += 1
+    if resumed:
+        logger.info(f"{resumed} génération(s) de relevés reprise(s)")
+    return resumed
+
+
+async def _recover_periodically():
+    while True:
+        try:
+            await resume_transcript_jobs()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Échec de la reprise des générations de relevés")
+        await asyncio.sleep(TRANSCRIPT_JOB_LEASE_SECONDS / 2)
+
+
+def start_transcript_recovery():
+    """Reprendre les travaux abandonnés au démarrage puis régulièrement"""
+    global _recovery_task
+    if _recovery_task is None:
+        _recovery_task = asyncio.create_task(_recover_periodically())
+
+
+def stop_transcript_recovery():
+    """Arrêter la reprise périodique"""
+    global _recovery_task
+    if _recovery_task is not None:
+        _recovery_task.cancel()
+        _recovery_task = None
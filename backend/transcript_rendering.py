@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rendu PDF des relevés de notes (ReportLab)
+
+Fonctions pures, sans accès à la base : elles sont exécutées dans les
+processus du pool de génération (voir transcript_jobs.py).
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import io
+import os
+import tempfile
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+
+
+@lru_cache(maxsize=1)
+def _title_style() -> ParagraphStyle:
+    """Style du titre (construit une seule fois par processus)"""
+    styles = getSampleStyleSheet()
+    return ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1  # Center
+    )
+
+
+def _transcript_story(student: Dict[str, Any], average_data: Dict[str, Any],
+                      semester: Optional[str] = None) -> list:
+    """Contenu (flowables ReportLab) du relevé d'un étudiant"""
+    story = []
+
+    # Titre
+    story.append(Paragraph("RELEVÉ DE NOTES", _title_style()))
+    story.append(Spacer(1, 12))
+
+    # Informations étudiant
+    student_info = [
+        ["Nom :", f"{student['lastname']} {student['firstname']}"],
+        ["N° Étudiant :", student.get('student_id_num', 'N/A')],
+        ["Email :", student['email']],
+        ["Date d'édition :", datetime.now().strftime("%d/%m/%Y")]
+    ]
+
+    if semester:
+        student_info.append(["Semestre :", semester])
+
+    student_table = Table(student_info, colWidths=[2*inch, 3*inch])
+    student_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('BACKGROUND', (1, 0), (1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+
+    story.append(student_table)
+    story.append(Spacer(1, 20))
+
+    # Tableau des notes par matière
+    notes_data = [["Matière", "Coefficient", "Nombre de notes", "Moyenne"]]
+
+    for subject in average_data["subject_averages"]:
+        notes_data.append([
+            subject["subject_name"],
+            str(subject["coefficient"]),
+            str(subject["grade_count"]),
+            f"{subject['average']}/20"
+        ])
+
+    # Ligne de moyenne générale
+    notes_data.append(["", "", "", ""])  # Ligne vide
+    notes_data.append(["MOYENNE GÉNÉRALE", "", "", f"{average_data['general_average']}/20"])
+
+    notes_table = Table(notes_data, colWidths=[3*inch, 1*inch, 1.5*inch, 1.5*inch])
+    notes_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -3), colors.beige),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightblue),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+
+    story.append(notes_table)
+    return story
+
+
+def _build_document(output, story: list):
+    """Mettre en page un contenu au format A4"""
+    doc = SimpleDocTemplate(output, pagesize=A4, rightMargin=72, leftMargin=72,
+                           topMargin=72, bottomMargin=18)
+    doc.build(story)
+
+
+def render_transcript_pdf(student: Dict[str, Any], average_data: Dict[str, Any],
+                          semester: Optional[str] = None) -> bytes:
+    """Construire le PDF du relevé de notes d'un étudiant"""
+    buffer = io.BytesIO()
+    _build_document(buffer, _transcript_story(student, average_data, semester))
+    pdf_content = buffer.getvalue()
+    buffer.close()
+    return pdf_content
+
+
+def render_transcript_batch(items: List[Tuple[str, Dict[str, Any], Dict[str, Any]]],
+                            semester: Optional[str] = None) -> List[Tuple[str, bytes]]:
+    """
+    Construire les PDF d'un lot de relevés
+
+    items : liste de (nom de fichier, étudiant, moyennes) ; retourne la
+    liste des (nom de fichier, contenu PDF).
+    """
+    return [
+        (filename, render_transcript_pdf(student, average_data, semester))
+        for filename, student, average_data in items
+    ]
+
+
+def _write_atomically(filepath: str, write):
+    """
+    Écrire filepath par write(fichier) dans un fichier temporaire propre à
+    cet appel, puis renommage : un lecteur ne voit jamais de PDF partiellement
+    écrit, et deux rendus simultanés n'écrivent pas dans le même fichier
+    """
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(filepath) or ".", prefix=os.path.basename(filepath) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_merged_transcripts(filepath: str, items: List[Tuple[str, Dict[str, Any], Dict[str, Any]]],
+                             semester: Optional[str] = None) -> int:
+    """Écrire les relevés d'un lot dans un seul PDF (un relevé par page)"""
+    story = []
+    for _, student, average_data in items:
+        if story:
+            story.append(PageBreak())
+        story.extend(_transcript_story(student, average_data, semester))
+    _write_atomically(filepath, lambda f: _build_document(f, story))
+    return len(items)
+
+
+def write_transcript_pdf(filepath: str, student: Dict[str, Any], average_data: Dict[str, Any],
+                         semester: Optional[str] = None) -> int:
+    """Construire le PDF et l'écrire sur disque ; retourne sa taille en octets"""
+    pdf_content = render_transcript_pdf(student, average_data, semester)
+    _write_atomically(filepath, lambda f: f.write(pdf_content))
+    return len(pdf_content)
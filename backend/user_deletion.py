@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Suppression en cascade des utilisateurs
+
+Les documents dépendants d'un utilisateur (ou d'une promotion entière)
+sont supprimés en tâche de fond, par lots bornés séparés d'une courte
+pause : la requête de suppression n'attend pas la fin du nettoyage et la
+base ne subit pas de pic d'écritures. Étapes, dans l'ordre :
+- comptes utilisateurs (le cache des utilisateurs authentifiés est invalidé)
+- notes des étudiants et moyennes pré-agrégées
+- inscriptions
+- relevés (enregistrements, PDF et relevés en cache)
+- notes saisies par un enseignant : conservées, recorded_by_teacher_id
+  est remis à null
+
+L'avancement (étape courante, documents traités par collection) est tenu
+à jour dans db.user_deletions. Chaque lot est idempotent : une
+suppression interrompue par l'arrêt de son worker est reprise par un autre.
+
+Un worker détient une suppression par un bail (claimed_by, claimed_at) :
+claimed_at est renouvelé après chaque lot, et une suppression n'est reprise
+(resume_user_deletions, au démarrage puis toutes les
+USER_DELETION_LEASE_SECONDS / 2) que si son bail a expiré. Un worker qui a
+perdu son bail s'arrête au lot suivant.
+
+Paramètres (variables d'environnement) :
+- USER_DELETION_BATCH_SIZE : documents traités par lot (défaut 1000)
+- USER_DELETION_BATCH_PAUSE_SECONDS : pause entre deux lots (défaut 0.05)
+- USER_DELETION_LEASE_SECONDS : durée du bail d'une suppression, à garder
+  bien au-dessus de la durée d'un lot (défaut 60)
+"""
+
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import uuid
+
+from .database import db
+from .principal_cache import invalidate_principal
+from .student_averages import AVERAGES_COLLECTION
+from .transcript_cache import invalidate_student_transcripts
+
+logger = logging.getLogger(__name__)
+
+USER_DELETION_BATCH_SIZE = int(os.getenv('USER_DELETION_BATCH_SIZE', '1000'))
+USER_DELETION_BATCH_PAUSE_SECONDS = float(os.getenv('USER_DELETION_BATCH_PAUSE_SECONDS', '0.05'))
+USER_DELETION_LEASE_SECONDS = float(os.getenv('USER_DELETION_LEASE_SECONDS', '60'))
+
+STATUS_PENDING = "PENDING"
+STATUS_COMPLETED = "COMPLETED"
+STATUS_ERROR = "ERROR"
+
+STEPS = ("users", "grades", AVERAGES_COLLECTION, "enrollments", "transcripts", "recorded_grades")
+
+# Identifiant de ce worker dans les baux (claimed_by)
+WORKER_ID = str(uuid.uuid4())
+# Références des tâches en cours (évite leur destruction prématurée)
+_running_jobs = set()
+_recovery_task: Optional[asyncio.Task] = None
+
+
+class LeaseLost(Exception):
+    """Le bail de la suppression a expiré et un autre worker l'a reprise"""
+
+
+async def _renew_lease(deletion_id: str, update: Optional[Dict[str, Any]] = None):
+    """Renouveler le bail (et appliquer update) ; LeaseLost s'il n'est plus détenu"""
+    now = datetime.utcnow()
+    update = dict(update or {})
+    update["$set"] = {**update.get("$set", {}), "claimed_at": now, "updated_at": now}
+    result = await db.user_deletions.update_one(
+        {"_id": deletion_id, "claimed_by": WORKER_ID, "status": STATUS_PENDING}, update
+    )
+    if result.matched_count == 0:
+        raise LeaseLost(deletion_id)
+
+
+async def _batches(collection: str, query: Dict[str, Any]):
+    """
+    Identifiants des documents correspondant à query, par lots successifs
+
+    Chaque lot doit être traité de sorte que ses documents ne
+    correspondent plus à query (suppression ou mise à jour).
+    """
+    while True:
+        ids = [
+            document["_id"] async for document in
+            db[collection].find(query, {"_id": 1}).limit(USER_DELETION_BATCH_SIZE)
+        ]
+        if not ids:
+            return
+        yield ids
+        await asyncio.sleep(USER_DELETION_BATCH_PAUSE_SECONDS)
+
+
+async def _progress(deletion_id: str, step: str, count: int):
+    """Compter un lot traité ; renouvelle le bail"""
+    await _renew_lease(deletion_id, {"$inc": {f"deleted.{step}": count}})
+
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except (FileNotFoundError, TypeError):
+            pass
+
+
+async def _delete_step(deletion_id: str, step: str, user_ids: List[str]):
+    """Traiter une étape par lots"""
+    loop = asyncio.get_running_loop()
+    chunks = [
+        user_ids[i:i + USER_DELETION_BATCH_SIZE]
+        for i in range(0, len(user_ids), USER_DELETION_BATCH_SIZE)
+    ]
+    for chunk in chunks:
+        if step == "users":
+            result = await db.users.delete_many({"_id": {"$in": chunk}})
+            for user_id in chunk:
+                invalidate_principal(user_id=user_id)
+            await _progress(deletion_id, step, result.deleted_count)
+            await asyncio.sleep(USER_DELETION_BATCH_PAUSE_SECONDS)
+        elif step == "recorded_grades":
+            async for ids in _batches("grades", {"recorded_by_teacher_id": {"$in": chunk}}):
+                result = await db.grades.update_many(
+                    {"_id": {"$in": ids}}, {"$set": {"recorded_by_teacher_id": None}}
+                )
+                await _progress(deletion_id, step, result.modified_count)
+        elif step == "transcripts":
+            async for ids in _batches("transcripts", {"student_id": {"$in": chunk}}):
+                paths = await db.transcripts.distinct("filepath", {"_id": {"$in": ids}})
+                await loop.run_in_executor(None, _remove_files, paths)
+                result = await db.transcripts.delete_many({"_id": {"$in": ids}})
+                await _progress(deletion_id, step, result.deleted_count)
+            await invalidate_student_transcripts(*chunk)
+        else:
+            async for ids in _batches(step, {"student_id": {"$in": chunk}}):
+                result = await db[step].delete_many({"_id": {"$in": ids}})
+                await _progress(deletion_id, step, result.deleted_count)
+
+
+async def _run_user_deletion(deletion: Dict[str, Any]):
+    """Enchaîner les étapes à partir de l'étape courante"""
+    deletion_id = deletion["_id"]
+    try:
+        for step in STEPS[STEPS.index(deletion["step"]):]:
+            await _renew_lease(deletion_id, {"$set": {"step": step}})
+            await _delete_step(deletion_id, step, deletion["user_ids"])
+    except LeaseLost:
+        logger.warning(f"Suppression en cascade {deletion_id} reprise par un autre worker")
+        return
+    except Exception as exc:
+        logger.exception(f"Échec de la suppression en cascade {deletion_id}")
+        await db.user_deletions.update_one(
+            {"_id": deletion_id, "claimed_by": WORKER_ID},
+            {"$set": {"status": STATUS_ERROR, "error": str(exc)}}
+        )
+        return
+
+    await db.user_deletions.update_one(
+        {"_id": deletion_id, "claimed_by": WORKER_ID},
+        {"$set": {"status": STATUS_COMPLETED, "step": None, "completed_at": datetime.utcnow()}}
+    )
+    logger.info(f"Suppression en cascade terminée : {deletion_id} ({len(deletion['user_ids'])} utilisateurs)")
+
+
+def _start(deletion: Dict[str, Any]):
+    task = asyncio.create_task(_run_user_deletion(deletion))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+
+async def enqueue_user_deletion(user_ids: List[str], scope: Dict[str, Any],
+                                requested_by: str) -> Dict[str, Any]:
+    """
+    Mettre en file la suppression en cascade d'un ensemble d'utilisateurs
+
+    L'avancement se lit dans db.user_deletions (deleted : documents traités
+    par collection).
+    """
+    now = datetime.utcnow()
+    deletion = {
+        "_id": str(uuid.uuid4()),
+        "user_ids": list(user_ids),
+        "scope": scope,
+        "status": STATUS_PENDING,
+        "step": STEPS[0],
+        "deleted": {step: 0 for step in STEPS},
+        "requested_by": requested_by,
+        "created_at": now,
+        "claimed_by": WORKER_ID,
+        "claimed_at": now,
+        "updated_at": now
+    }
+    await db.user_deletions.insert_one(deletion)
+    _start(deletion)
+    return deletion
+
+
+async def resume_user_deletions() -> int:
+    """Reprendre les suppressions dont le bail a expiré (worker arrêté)"""
+    resumed = 0
+    while True:
+        now = datetime.utcnow()
+        deletion = await db.user_deletions.find_one_and_update(
+            {
+                "status": STATUS_PENDING,
+                "claimed_at": {"$lt": now - timedelta(seconds=USER_DELETION_LEASE_SECONDS)}
+            },
+            {"$set": {"claimed_by": WORKER_ID, "claimed_at": now}}
+        )
+        if deletion is None:
+            break
+        _start(deletion)
+        resumed += 1
+    if resumed:
+        logger.info(f"{resumed} suppression(s) en cascade reprise(s)")
+    return resumed
+
+
+async def _recover_periodically():
+    while True:
+        try:
+            await resume_user_deletions()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Échec de la reprise des suppressions en cascade")
+        await asyncio.sleep(USER_DELETION_LEASE_SECONDS / 2)
+
+
+def start_deletion_recovery():
+    """Reprendre les suppressions abandonnées au démarrage puis régulièrement"""
+    global _recovery_task
+    if _recovery_task is None:
+        _recovery_task = asyncio.create_task(_recover_periodically())
+
+
+def stop_deletion_recovery():
+    """Arrêter la reprise périodique"""
+    global _recovery_task
+    if _recovery_task is not None:
+        _recovery_task.cancel()
+        _recovery_task = None
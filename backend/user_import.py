@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Import groupé d'étudiants ou d'enseignants depuis un fichier CSV ou XLSX
+
+Le fichier est lu par lots (lecture hors de la boucle d'événements,
+classeur XLSX en lecture seule). Pour chaque lot :
+- validation des lignes (mêmes règles que StudentCreate / TeacherCreate)
+  et détection des doublons internes au fichier
+- vérification d'unicité par une seule requête $in sur les champs indexés
+  (nom d'utilisateur, email, numéro étudiant ou enseignant)
+- hachage des mots de passe dans le pool de processus d'import
+  (password_hashing.get_password_hashes)
+- écriture par un insert_many non ordonné ; les doublons apparus entre
+  la vérification et l'écriture sont rapportés par ligne
+
+Le résultat de chaque ligne est produit dès que son lot est traité, ce
+qui permet de le diffuser au fil de l'import.
+
+Paramètres (variables d'environnement) :
+- USER_IMPORT_BATCH_SIZE : lignes traitées par lot (défaut 500)
+"""
+
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Tuple
+from datetime import datetime
+import csv
+import io
+import itertools
+import os
+
+import openpyxl
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+
+from .database import db
+from .password_hashing import get_password_hashes
+from .models import RoleEnum, StudentCreate, TeacherCreate
+from .services import DUPLICATE_USER_MESSAGES, duplicate_key_detail, user_document
+
+USER_IMPORT_BATCH_SIZE = int(os.getenv('USER_IMPORT_BATCH_SIZE', '500'))
+
+IMPORT_MODELS = {
+    RoleEnum.STUDENT: (StudentCreate, "student_id_num"),
+    RoleEnum.TEACHER: (TeacherCreate, "teacher_id_num"),
+}
+
+
+class ImportFileError(ValueError):
+    """Fichier d'import illisible ou colonnes manquantes"""
+
+
+def _csv_rows(fileobj) -> Tuple[List[str], Iterator[List[Any]], Callable[[], None]]:
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=";,\t") if sample else csv.excel
+    except csv.Error:
+        dialect = csv.excel
+    except UnicodeDecodeError:
+        raise ImportFileError("Le fichier CSV doit être encodé en UTF-8")
+    reader = csv.reader(text, dialect)
+    return next(reader, []), reader, text.detach
+
+
+def _xlsx_rows(fileobj) -> Tuple[List[str], Iterator[List[Any]], Callable[[], None]]:
+    try:
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError("Classeur XLSX illisible")
+    rows = workbook.active.iter_rows(values_only=True)
+    return list(next(rows, [])), rows, workbook.close
+
+
+def open_import_file(fileobj, filename: str, role: RoleEnum):
+    """
+    Ouvrir le fichier et vérifier ses en-têtes
+
+    Retourne (lignes, fermeture) : lignes itère sur des couples (numéro de
+    ligne dans le fichier, valeurs par colonne) ; les lignes vides sont
+    ignorées. Lève ImportFileError si le fichier est illisible ou s'il
+    manque une colonne requise.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        header, rows, close = _csv_rows(fileobj)
+    elif extension == ".xlsx":
+        header, rows, close = _xlsx_rows(fileobj)
+    else:
+        raise ImportFileError("Format non pris en charge (CSV ou XLSX attendu)")
+
+    columns = [str(name or "").strip().lower() for name in header]
+    model, _ = IMPORT_MODELS[role]
+    missing = [field for field in model.model_fields if field not in columns]
+    if missing:
+        close()
+        raise ImportFileError(f"Colonnes manquantes : {', '.join(missing)}")
+
+    def records():
+        for line, values in enumerate(rows, start=2):
+            record = {
+                column: str(value).strip()
+                for column, value in zip(columns, values)
+                if column and value is not None and str(value).strip()
+            }
+            if record:
+                yield line, record
+
+    return records(), close
+
+
+def _validation_detail(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])} : {error['msg']}" for error in exc.errors()
+    )
+
+
+async def _existing_values(users: List[Dict[str, Any]], unique_fields: List[str]) -> Dict[str, set]:
+    """Valeurs déjà présentes en base pour les champs uniques (une requête $in)"""
+    existing: Dict[str, set] = {field: set() for field in unique_fields}
+    async for user in db.users.find(
+        {"$or": [{field: {"$in": [user[field] for user in users]}} for field in unique_fields]},
+        {field: 1 for field in unique_fields}
+    ):
+        for field in unique_fields:
+            if field in user:
+                existing[field].add(user[field])
+    return existing
+
+
+def _write_error_detail(write_error: Dict[str, Any]) -> str:
+    if write_error.get("code") == 11000:
+        return duplicate_key_detail(write_error.get("keyPattern", {}))
+    return write_error.get("errmsg", "Erreur d'écriture")
+
+
+async def _import_batch(batch: List[Tuple[int, Dict[str, str]]], role: RoleEnum,
+                        seen: Dict[str, set]) -> List[Dict[str, Any]]:
+    """Valider, vérifier, hacher et écrire un lot ; un résultat par ligne"""
+    model, id_field = IMPORT_MODELS[role]
+    unique_fields = ["username", "email", id_field]
+    results: Dict[int, Dict[str, Any]] = {}
+
+    valid = []  # (ligne, requête validée)
+    for line, record in batch:
+        try:
+            request = model.model_validate(record)
+        except ValidationError as exc:
+            results[line] = {"row": line, "status": "error", "detail": _validation_detail(exc)}
+            continue
+        valid.append((line, request))
+
+    existing = await _existing_values(
+        [request.model_dump() for _, request in valid], unique_fields
+    ) if valid else {}
+
+    accepted = []
+    for line, request in valid:
+        values = request.model_dump()
+        duplicate = next(
+            (field for field in unique_fields
+             if values[field] in existing[field] or values[field] in seen[field]),
+            None
+        )
+        if duplicate:
+            results[line] = {"row": line, "status": "error", "detail": DUPLICATE_USER_MESSAGES[duplicate]}
+            continue
+        for field in unique_fields:
+            seen[field].add(values[field])
+        accepted.append((line, request))
+
+    hashes = await get_password_hashes([request.password for _, request in accepted])
+    now = datetime.utcnow()
+    documents = [
+        user_document(request, role, password_hash, now)
+        for (_, request), password_hash in zip(accepted, hashes)
+    ]
+
+    failed: Dict[int, str] = {}
+    if documents:
+        try:
+            await db.users.insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            for write_error in exc.details.get("writeErrors", []):
+                failed[write_error["index"]] = _write_error_detail(write_error)
+
+    for position, ((line, _), document) in enumerate(zip(accepted, documents)):
+        if position in failed:
+            results[line] = {"row": line, "status": "error", "detail": failed[position]}
+        else:
+            results[line] = {"row": line, "status": "created", "user_id": document["_id"]}
+
+    return [results[line] for line, _ in batch]
+
+
+async def import_users(records: Iterator[Tuple[int, Dict[str, str]]], close: Callable[[], None],
+                       role: RoleEnum) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Importer les lignes par lots et produire le résultat de chaque ligne,
+    puis un résumé ({"summary": {...}})
+    """
+    seen: Dict[str, set] = {field: set() for field in ["username", "email", IMPORT_MODELS[role][1]]}
+    total = created = 0
+    try:
+        while True:
+            try:
+                batch = await run_in_threadpool(
+                    lambda: list(itertools.islice(records, USER_IMPORT_BATCH_SIZE))
+                )
+            except (UnicodeDecodeError, csv.Error) as exc:
+                # Lecture interrompue : les lots précédents restent importés
+                yield {"error": f"Fichier illisible après la ligne {total + 1} : {exc}"}
+                break
+            if not batch:
+                break
+            for result in await _import_batch(batch, role, seen):
+                total += 1
+                created += result["status"] == "created"
+                yield result
+    finally:
+        close()
+
+    yield {"summary": {"total": total, "created": created, "failed": total - created}}
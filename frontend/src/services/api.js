@@ -147,9 +147,10 @@ export const userService = {
 
   /**
    * Obtenir tous les utilisateurs (admin seulement)
+   * @param {object} params - Pagination { limit, after } (after = en-tête X-Next-Cursor de la page précédente) et filtre { role }
    */
-  getAllUsers: () => 
-    api.get('/api/admin/users'),
+  getAllUsers: (params = {}) => 
+    api.get('/api/admin/users', { params }),
 
   /**
    * Obtenir un utilisateur par ID (admin seulement)
@@ -177,8 +178,23 @@ export const userService = {
    * Supprimer un utilisateur (admin seulement)
    * @param {string} userId - ID de l'utilisateur
    */
-  deleteUser: (userId) => 
+  deleteUser: (userId) =>
     api.delete(`/api/admin/users/delete/${userId}`),
+
+  /**
+   * Importer des étudiants ou des enseignants depuis un fichier CSV ou XLSX (admin seulement)
+   * @param {File} file - Fichier (colonnes username, firstname, lastname, email, password, student_id_num / teacher_id_num)
+   * @param {string} role - STUDENT ou TEACHER
+   * @returns Réponse NDJSON : une ligne de résultat par ligne du fichier, puis un résumé
+   */
+  importUsers: (file, role = 'STUDENT') => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return api.post('/api/admin/users/import', formData, {
+      params: { role },
+      responseType: 'text',
+    });
+  },
 };
 
 // ===========================
@@ -194,9 +210,10 @@ export const subjectService = {
 
   /**
    * Obtenir toutes les matières
+   * @param {object} params - Pagination { limit, after } (after = en-tête X-Next-Cursor de la page précédente)
    */
-  getAllSubjects: () => 
-    api.get('/api/subjects'),
+  getAllSubjects: (params = {}) => 
+    api.get('/api/subjects', { params }),
 
   /**
    * Obtenir une matière par ID
@@ -234,9 +251,10 @@ export const classService = {
 
   /**
    * Obtenir toutes les classes
+   * @param {object} params - Pagination { limit, after } (after = en-tête X-Next-Cursor de la page précédente) et filtre { academic_year }
    */
-  getAllClasses: () => 
-    api.get('/api/classes'),
+  getAllClasses: (params = {}) => 
+    api.get('/api/classes', { params }),
 
   /**
    * Obtenir une classe par ID
@@ -272,19 +290,29 @@ export const gradeService = {
   createGrade: (gradeData) => 
     api.post('/api/grades', gradeData),
 
+  /**
+   * Saisir un lot de notes en une requête (enseignant/admin)
+   * @param {object[]} grades - Notes à créer
+   * @param {boolean} ordered - Arrêter à la première ligne en erreur
+   */
+  createGradesBulk: (grades, ordered = false) => 
+    api.post('/api/grades/bulk', { grades, ordered }),
+
   /**
    * Obtenir toutes les notes d'un étudiant
    * @param {string} studentId - ID de l'étudiant
+   * @param {object} params - Pagination { limit, after } (after = en-tête X-Next-Cursor de la page précédente)
    */
-  getStudentGrades: (studentId) => 
-    api.get(`/api/grades/student/${studentId}`),
+  getStudentGrades: (studentId, params = {}) => 
+    api.get(`/api/grades/student/${studentId}`, { params }),
 
   /**
    * Obtenir toutes les notes d'une matière
    * @param {string} subjectId - ID de la matière
+   * @param {object} params - Pagination { limit, after } (after = en-tête X-Next-Cursor de la page précédente)
    */
-  getSubjectGrades: (subjectId) => 
-    api.get(`/api/grades/subject/${subjectId}`),
+  getSubjectGrades: (subjectId, params = {}) => 
+    api.get(`/api/grades/subject/${subjectId}`, { params }),
 
   /**
    * Mettre à jour une note (enseignant/admin)
@@ -310,6 +338,69 @@ export const gradeService = {
     const params = semester ? { semester } : {};
     return api.get(`/api/students/${studentId}/average`, { params });
   },
+
+  /**
+   * S'abonner aux changements de notes (Server-Sent Events) plutôt que d'interroger
+   * périodiquement les notes et moyennes ; reconnexion automatique après coupure
+   * @param {function} onEvent - Appelée avec chaque delta { type, grade_id, student_id, subject_id, semester, value }
+   *   ou { type: 'resync' } (changements perdus : recharger les données)
+   * @param {object} filters - { student_id, subject_id } (enseignant/admin ; un étudiant ne reçoit que ses notes)
+   * @returns {function} Fonction de désabonnement
+   */
+  subscribeGradeEvents: (onEvent, filters = {}) => {
+    const controller = new AbortController();
+    const query = new URLSearchParams(
+      Object.entries(filters).filter(([, value]) => value != null)
+    ).toString();
+    const url = `${BASE_URL}/api/grades/events${query ? `?${query}` : ''}`;
+
+    // EventSource ne permet pas d'envoyer l'en-tête Authorization : lecture du flux par fetch
+    const connect = async () => {
+      const response = await fetch(url, {
+        headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+        signal: controller.signal,
+      });
+      if (!response.ok) {
+        throw new Error(`Flux des notes indisponible (${response.status})`);
+      }
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) return;
+        buffer += value;
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        messages.forEach((message) => {
+          let event = 'message';
+          let data = '';
+          message.split('\n').forEach((line) => {
+            if (line.startsWith('event: ')) event = line.slice(7);
+            else if (line.startsWith('data: ')) data += line.slice(6);
+          });
+          if (event === 'grade') onEvent(JSON.parse(data));
+          else if (event === 'resync') onEvent({ type: 'resync' });
+        });
+      }
+    };
+
+    const run = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          await connect();
+        } catch (error) {
+          if (controller.signal.aborted) return;
+          console.error('❌ Flux des notes interrompu:', error);
+        }
+        // Les changements survenus pendant la coupure sont perdus
+        await new Promise((resolve) => setTimeout(resolve, 5000));
+        if (!controller.signal.aborted) onEvent({ type: 'resync' });
+      }
+    };
+    run();
+
+    return () => controller.abort();
+  },
 };
 
 // ===========================
@@ -318,19 +409,45 @@ export const gradeService = {
 export const documentService = {
   /**
    * Générer un relevé de notes PDF
+   * Le PDF est reçu en binaire : utiliser downloadBlobFile
    * @param {string} studentId - ID de l'étudiant
    * @param {string} semester - Semestre (optionnel)
    */
   generateTranscriptPDF: (studentId, semester = null) => {
     const params = semester ? { semester } : {};
-    return api.get(`/api/students/${studentId}/transcript/pdf`, { params });
+    return api.get(`/api/students/${studentId}/transcript/pdf`, {
+      params,
+      responseType: 'blob',
+    });
   },
 
   /**
    * Exporter toutes les notes en Excel (admin seulement)
+   * Le fichier est reçu en binaire : utiliser downloadBlobFile
+   * @param {string} format - 'xlsx' (défaut) ou 'csv'
    */
-  exportGradesToExcel: () => 
-    api.get('/api/admin/export/excel'),
+  exportGradesToExcel: (format = 'xlsx') => 
+    api.get('/api/admin/export/excel', {
+      params: { format },
+      responseType: 'blob',
+      timeout: 0,
+    }),
+
+  /**
+   * Télécharger un fichier binaire (Blob) reçu de l'API
+   * @param {Blob} blob - Contenu du fichier
+   * @param {string} filename - Nom du fichier
+   */
+  downloadBlobFile: (blob, filename) => {
+    const url = window.URL.createObjectURL(blob);
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = filename;
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+    window.URL.revokeObjectURL(url);
+  },
 
   /**
    * Télécharger un fichier à partir de données base64